@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Alert Limiter for IDS/IPS System
+Fixed-memory duplicate suppression and per-key rate limiting for detections
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List
+
+
+class DedupCache:
+    """
+    Remembers keys for ``ttl`` seconds, in at most ``max_entries`` slots.
+
+    Entries are kept in insertion order, which is also expiry order since
+    every key lives for the same ``ttl``: expired keys are popped from the
+    front as time advances (O(1) amortized per call), and when the cache is
+    full the oldest key is evicted early.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self.suppressed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def recent(self, key: Hashable, now: float) -> bool:
+        """True if ``key`` was added less than ``ttl`` seconds ago"""
+        self._expire(now)
+        added = self._entries.get(key)
+        if added is not None and now - added < self.ttl:
+            self.suppressed += 1
+            return True
+        return False
+
+    def add(self, key: Hashable, now: float):
+        """Remember ``key`` as of ``now``"""
+        entries = self._entries
+        if key in entries:
+            del entries[key]
+        elif len(entries) >= self.max_entries:
+            entries.popitem(last=False)
+            self.evicted += 1
+        entries[key] = now
+
+    def _expire(self, now: float):
+        entries = self._entries
+        cutoff = now - self.ttl
+        while entries:
+            key, added = next(iter(entries.items()))
+            if added > cutoff:
+                break
+            entries.popitem(last=False)
+            self.expired += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'suppressed': self.suppressed,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+
+class RateLimiter:
+    """
+    Allows at most ``limit`` events per key per ``window`` seconds.
+
+    Each key has a ring of ``buckets`` counters covering the window, so a
+    check costs O(buckets) regardless of the event rate; the window slides
+    in steps of ``window / buckets`` seconds. Keys are kept in order of
+    last use: idle keys whose counters have all aged out are dropped from
+    the front, and the least recently used key is evicted once
+    ``max_keys`` are tracked.
+    """
+
+    def __init__(self, window: float, limit: int, buckets: int = 6, max_keys: int = 100000):
+        self.window = window
+        self.limit = limit
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self.max_keys = max_keys
+        # key -> [bucket number of the last event, per-bucket counts]
+        self._keys: 'OrderedDict[Hashable, List]' = OrderedDict()
+        self.limited = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def allow(self, key: Hashable, now: float) -> bool:
+        """Count an event for ``key`` unless it already reached the limit in the current window"""
+        bucket = int(now // self.bucket_width)
+        self._expire(bucket)
+
+        keys = self._keys
+        entry = keys.get(key)
+        if entry is None:
+            if len(keys) >= self.max_keys:
+                keys.popitem(last=False)
+                self.evicted += 1
+            entry = keys[key] = [bucket, [0] * self.buckets]
+        else:
+            keys.move_to_end(key)
+            self._advance(entry, bucket)
+
+        counts = entry[1]
+        if sum(counts) >= self.limit:
+            self.limited += 1
+            return False
+        counts[bucket % self.buckets] += 1
+        return True
+
+    def _advance(self, entry: List, bucket: int):
+        """Zero the buckets that went by since the key's last event"""
+        last, counts = entry
+        if bucket <= last:
+            return  # same bucket (or the clock stepped back)
+        if bucket - last >= self.buckets:
+            counts[:] = [0] * self.buckets
+        else:
+            for passed in range(last + 1, bucket + 1):
+                counts[passed % self.buckets] = 0
+        entry[0] = bucket
+
+    def _expire(self, bucket: int):
+        keys = self._keys
+        while keys:
+            key, entry = next(iter(keys.items()))
+            if bucket - entry[0] < self.buckets:
+                break
+            keys.popitem(last=False)
+            self.expired += 1
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'keys': len(self._keys),
+            'max_keys': self.max_keys,
+            'window': self.window,
+            'limit': self.limit,
+            'limited': self.limited,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
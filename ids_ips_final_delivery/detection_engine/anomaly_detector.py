@@ -4,17 +4,47 @@ Anomaly-Based Detection Engine for IDS/IPS System
 Detects threats using statistical analysis and behavioral patterns
 """
 
+import os
 import time
 import json
+import zlib
+import pickle
 import logging
 import threading
-import statistics
+from array import array
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
 import math
 
+try:
+    from detection_engine.clock import EventClock
+    from detection_engine.streaming_stats import SlidingWindowStats
+    from detection_engine.source_rates import SourceRateCounter
+    from detection_engine.sketches import BoundedTable, CountMinSketch, HyperLogLog
+except ImportError:
+    from clock import EventClock
+    from streaming_stats import SlidingWindowStats
+    from source_rates import SourceRateCounter
+    from sketches import BoundedTable, CountMinSketch, HyperLogLog
+
+# How port scan and connection tracking remember what each source touched
+TRACKING_MODES = ("exact", "sketch")
+
+# Baseline snapshot files: magic, then a zlib-compressed pickle of NetworkBaseline.snapshot()
+BASELINE_SNAPSHOT_MAGIC = b"IDSBASE1"
+BASELINE_SNAPSHOT_VERSION = 1
+
+
+def _pack(values: List) -> array:
+    """Compact array of window values (int64 when they are all integers)"""
+    try:
+        return array('q', values)
+    except TypeError:
+        return array('d', values)
+
 @dataclass
 class AnomalyResult:
     """Data class representing an anomaly detection result"""
@@ -38,17 +68,26 @@ class AnomalyResult:
             self.additional_info = {}
 
 class NetworkBaseline:
-    """Maintains baseline statistics for network behavior"""
+    """
+    Maintains baseline statistics for network behavior
     
-    def __init__(self, window_size: int = 1000, learning_period: int = 3600):
+    Volume series are SlidingWindowStats over the last ``window_size``
+    values, so updating them and querying mean/std/min/max costs O(1)
+    whatever the window size. Times come from ``clock`` (packet event time
+    by default); the learning period starts with the first packet.
+    """
+    
+    def __init__(self, window_size: int = 1000, learning_period: int = 3600, clock=None):
         self.window_size = window_size
         self.learning_period = learning_period  # seconds
-        self.start_time = time.time()
+        self.clock = clock or EventClock()
+        self.start_time: Optional[float] = None  # first packet of this run
+        self.learned_before = 0.0  # seconds learned by previous runs (restored snapshot)
         
         # Traffic volume baselines
-        self.packet_counts = deque(maxlen=window_size)
-        self.byte_counts = deque(maxlen=window_size)
-        self.connection_counts = deque(maxlen=window_size)
+        self.packet_counts = SlidingWindowStats(window_size)
+        self.byte_counts = SlidingWindowStats(window_size)
+        self.connection_counts = SlidingWindowStats(window_size)
         
         # Protocol distribution baselines
         self.protocol_stats = defaultdict(lambda: deque(maxlen=window_size))
@@ -56,34 +95,47 @@ class NetworkBaseline:
         # Port usage baselines
         self.port_stats = defaultdict(lambda: deque(maxlen=window_size))
         
-        # IP address baselines
+        # IP address baselines (counts and sums only: no min/max per address)
         self.ip_stats = defaultdict(lambda: {
-            'packet_counts': deque(maxlen=window_size),
-            'byte_counts': deque(maxlen=window_size),
-            'connection_counts': deque(maxlen=window_size),
-            'first_seen': time.time(),
-            'last_seen': time.time()
+            'packet_counts': SlidingWindowStats(window_size, track_extremes=False),
+            'byte_counts': SlidingWindowStats(window_size, track_extremes=False),
+            'connection_counts': SlidingWindowStats(window_size, track_extremes=False),
+            'first_seen': self.clock.now(),
+            'last_seen': self.clock.now()
         })
         
         # Time-based patterns
         self.hourly_stats = defaultdict(lambda: {
-            'packet_counts': [],
-            'byte_counts': [],
-            'connection_counts': []
+            'packet_counts': SlidingWindowStats(window_size, track_extremes=False),
+            'byte_counts': SlidingWindowStats(window_size, track_extremes=False),
+            'connection_counts': SlidingWindowStats(window_size, track_extremes=False)
         })
         
         self.logger = logging.getLogger(__name__)
         self._lock = threading.RLock()
+        
+        # Snapshot writer process (fork) still running, and snapshot/restore history
+        self._snapshot_pid: Optional[int] = None
+        self.snapshot_stats = {
+            'written': 0,
+            'failed': 0,
+            'skipped': 0,  # the previous snapshot was still being written
+            'last_saved_at': None,
+            'restored_from': None,
+            'restored_age': None
+        }
     
     def update(self, packet_info):
         """Update baseline statistics with new packet information"""
         with self._lock:
-            current_time = time.time()
+            current_time = self.clock.observe(packet_info.timestamp)
+            if self.start_time is None:
+                self.start_time = current_time
             current_hour = datetime.fromtimestamp(current_time).hour
             
             # Update traffic volume baselines
-            self.packet_counts.append(1)
-            self.byte_counts.append(packet_info.packet_size)
+            self.packet_counts.add(1)
+            self.byte_counts.add(packet_info.packet_size)
             
             # Update protocol statistics
             self.protocol_stats[packet_info.protocol].append(1)
@@ -98,40 +150,26 @@ class NetworkBaseline:
             for ip in [packet_info.src_ip, packet_info.dst_ip]:
                 if ip != "Unknown":
                     ip_stat = self.ip_stats[ip]
-                    ip_stat['packet_counts'].append(1)
-                    ip_stat['byte_counts'].append(packet_info.packet_size)
+                    ip_stat['packet_counts'].add(1)
+                    ip_stat['byte_counts'].add(packet_info.packet_size)
                     ip_stat['last_seen'] = current_time
             
             # Update hourly statistics
             hour_stat = self.hourly_stats[current_hour]
-            hour_stat['packet_counts'].append(1)
-            hour_stat['byte_counts'].append(packet_info.packet_size)
+            hour_stat['packet_counts'].add(1)
+            hour_stat['byte_counts'].add(packet_info.packet_size)
     
     def get_packet_rate_stats(self) -> Dict[str, float]:
         """Get packet rate statistics"""
         if len(self.packet_counts) < 10:
             return {'mean': 0, 'std': 0, 'min': 0, 'max': 0}
-        
-        counts = list(self.packet_counts)
-        return {
-            'mean': statistics.mean(counts),
-            'std': statistics.stdev(counts) if len(counts) > 1 else 0,
-            'min': min(counts),
-            'max': max(counts)
-        }
+        return self.packet_counts.summary()
     
     def get_byte_rate_stats(self) -> Dict[str, float]:
         """Get byte rate statistics"""
         if len(self.byte_counts) < 10:
             return {'mean': 0, 'std': 0, 'min': 0, 'max': 0}
-        
-        counts = list(self.byte_counts)
-        return {
-            'mean': statistics.mean(counts),
-            'std': statistics.stdev(counts) if len(counts) > 1 else 0,
-            'min': min(counts),
-            'max': max(counts)
-        }
+        return self.byte_counts.summary()
     
     def get_protocol_distribution(self) -> Dict[str, float]:
         """Get protocol distribution statistics"""
@@ -159,57 +197,279 @@ class NetworkBaseline:
             return None
         
         ip_stat = self.ip_stats[ip]
-        packet_counts = list(ip_stat['packet_counts'])
-        byte_counts = list(ip_stat['byte_counts'])
+        packet_counts = ip_stat['packet_counts']
+        byte_counts = ip_stat['byte_counts']
         
         if not packet_counts:
             return None
         
         return {
             'packet_count': len(packet_counts),
-            'byte_count': sum(byte_counts),
-            'avg_packet_size': sum(byte_counts) / len(packet_counts),
+            'byte_count': byte_counts.total,
+            'avg_packet_size': byte_counts.total / len(packet_counts),
             'first_seen': ip_stat['first_seen'],
             'last_seen': ip_stat['last_seen'],
             'duration': ip_stat['last_seen'] - ip_stat['first_seen']
         }
     
+    def learned_seconds(self) -> float:
+        """Event time spent learning, including restored snapshots"""
+        if self.start_time is None:
+            return self.learned_before
+        return self.learned_before + max(0.0, self.clock.now() - self.start_time)
+    
     def is_learning_complete(self) -> bool:
         """Check if the learning period is complete"""
-        return (time.time() - self.start_time) >= self.learning_period
+        return self.learned_seconds() >= self.learning_period
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Plain-data copy of the baseline state
+        
+        Call with the lock held (or in a forked child). Protocol and port
+        windows only hold 1s, so their lengths are stored.
+        """
+        now = time.time()
+        return {
+            'version': BASELINE_SNAPSHOT_VERSION,
+            'saved_at': now,
+            'learned_seconds': self.learned_seconds(),
+            'window_size': self.window_size,
+            'packet_counts': _pack(self.packet_counts.values()),
+            'byte_counts': _pack(self.byte_counts.values()),
+            'connection_counts': _pack(self.connection_counts.values()),
+            'protocol_stats': {protocol: len(counts) for protocol, counts in self.protocol_stats.items()},
+            'port_stats': {port: len(counts) for port, counts in self.port_stats.items()},
+            'ip_stats': {ip: (_pack(stat['packet_counts'].values()), _pack(stat['byte_counts'].values()),
+                              _pack(stat['connection_counts'].values()), stat['first_seen'], stat['last_seen'])
+                         for ip, stat in self.ip_stats.items()},
+            'hourly_stats': {hour: tuple(_pack(stat[key].values())
+                                         for key in ('packet_counts', 'byte_counts', 'connection_counts'))
+                             for hour, stat in self.hourly_stats.items()}
+        }
+    
+    def save_snapshot(self, path: str, use_fork: bool = True) -> bool:
+        """
+        Write the baseline state to ``path`` (temporary file, then rename)
+        
+        Where os.fork is available and the process runs no other threads,
+        updates wait only for the fork itself: the child process serializes
+        its copy-on-write image of the state and exits, and the parent picks
+        up its exit status on the next call (or reap_snapshot). Returns
+        False if the previous snapshot is still being written. Otherwise
+        the state is copied under the lock and written by the calling
+        thread: a child forked while other threads run (capture, detection,
+        the snapshot thread) inherits any lock they held, allocator and
+        import locks included, and can deadlock on it; Python 3.12+ also
+        warns about such forks.
+        """
+        path = Path(path)
+        if self._snapshot_pid is not None and not self.reap_snapshot():
+            self.snapshot_stats['skipped'] += 1
+            return False
+        
+        if use_fork and hasattr(os, 'fork') and threading.active_count() == 1:
+            with self._lock:
+                pid = os.fork()
+                if pid == 0:
+                    # Child: no logging or other locks, another thread may have held them at fork time
+                    status = 1
+                    try:
+                        self._write_snapshot(path, self.snapshot())
+                        status = 0
+                    finally:
+                        os._exit(status)
+            self._snapshot_pid = pid
+            return True
+        
+        with self._lock:
+            state = self.snapshot()
+        try:
+            self._write_snapshot(path, state)
+        except Exception as e:
+            self.snapshot_stats['failed'] += 1
+            self.logger.error(f"Error writing baseline snapshot {path}: {e}")
+            return False
+        self.snapshot_stats['written'] += 1
+        self.snapshot_stats['last_saved_at'] = state['saved_at']
+        return True
+    
+    def reap_snapshot(self, block: bool = False) -> bool:
+        """Collect the snapshot child's exit status; False while it is still running"""
+        pid = self._snapshot_pid
+        if pid is None:
+            return True
+        try:
+            finished, status = os.waitpid(pid, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            finished, status = pid, 0  # already reaped elsewhere; assume it completed
+        if finished == 0:
+            return False
+        self._snapshot_pid = None
+        if os.waitstatus_to_exitcode(status) == 0:
+            self.snapshot_stats['written'] += 1
+            self.snapshot_stats['last_saved_at'] = time.time()
+        else:
+            self.snapshot_stats['failed'] += 1
+            self.logger.error(f"Baseline snapshot process {pid} failed (status {status})")
+        return True
+    
+    @staticmethod
+    def _write_snapshot(path: Path, state: Dict[str, Any]):
+        data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(BASELINE_SNAPSHOT_MAGIC)
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+    
+    def load_snapshot(self, path: str, max_age: float) -> bool:
+        """
+        Warm-start from a snapshot written by save_snapshot
+        
+        Snapshots older than ``max_age`` seconds are ignored. The learning
+        time recorded in the snapshot counts towards learning_period, so a
+        baseline that had finished learning is ready immediately. The
+        snapshot is a pickle and gets the same trust as the signature files.
+        """
+        path = Path(path)
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(BASELINE_SNAPSHOT_MAGIC)) != BASELINE_SNAPSHOT_MAGIC:
+                    self.logger.warning(f"Ignoring baseline snapshot {path}: not a snapshot file")
+                    return False
+                state = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable baseline snapshot {path}: {e}")
+            return False
+        if not isinstance(state, dict) or state.get('version') != BASELINE_SNAPSHOT_VERSION:
+            self.logger.warning(f"Ignoring baseline snapshot {path}: unsupported version")
+            return False
+        
+        age = time.time() - state['saved_at']
+        if age > max_age:
+            self.logger.info(f"Ignoring stale baseline snapshot {path} ({age / 3600:.1f}h old, limit {max_age / 3600:.1f}h)")
+            return False
+        
+        with self._lock:
+            self.packet_counts.load(state['packet_counts'])
+            self.byte_counts.load(state['byte_counts'])
+            self.connection_counts.load(state['connection_counts'])
+            
+            self.protocol_stats.clear()
+            for protocol, count in state['protocol_stats'].items():
+                self.protocol_stats[protocol].extend([1] * count)
+            self.port_stats.clear()
+            for port, count in state['port_stats'].items():
+                self.port_stats[port].extend([1] * count)
+            
+            self.ip_stats.clear()
+            for ip, (packet_counts, byte_counts, connection_counts, first_seen, last_seen) in state['ip_stats'].items():
+                ip_stat = self.ip_stats[ip]
+                ip_stat['packet_counts'].load(packet_counts)
+                ip_stat['byte_counts'].load(byte_counts)
+                ip_stat['connection_counts'].load(connection_counts)
+                ip_stat['first_seen'] = first_seen
+                ip_stat['last_seen'] = last_seen
+            
+            self.hourly_stats.clear()
+            for hour, windows in state['hourly_stats'].items():
+                hour_stat = self.hourly_stats[hour]
+                for key, values in zip(('packet_counts', 'byte_counts', 'connection_counts'), windows):
+                    hour_stat[key].load(values)
+            
+            self.learned_before = state['learned_seconds']
+            self.start_time = None  # counting resumes at the next packet
+        
+        self.snapshot_stats['restored_from'] = str(path)
+        self.snapshot_stats['restored_age'] = age
+        self.logger.info(f"Restored baseline from {path} ({age / 60:.0f} min old, "
+                         f"{state['learned_seconds'] / 60:.0f} min learned, {len(self.ip_stats)} addresses)")
+        return True
 
 class AnomalyDetector:
-    """Main anomaly detection engine"""
+    """
+    Main anomaly detection engine
+    
+    Port scan and connection tracking keep, per source, the ports or
+    destinations it touched in the current window. In "exact" mode those
+    are sets, which grow with the traffic: a distributed scan or flood can
+    take gigabytes. "sketch" mode keeps memory bounded instead: each source
+    gets a HyperLogLog of 2^hll_precision bytes (standard error
+    1.04/sqrt(2^hll_precision), 6.5% by default), scan packet counts go to
+    one shared Count-Min sketch (over-count at most e/cms_width of the
+    packets counted since its hourly reset, with probability
+    1 - e^-cms_depth), and each table keeps at most max_tracked_sources
+    sources, least recently seen evicted first (about 0.7 KB per source and
+    table with the defaults). Counts in alerts are then estimates, and the
+    count thresholds (port_scan, excessive_connections) are compared against
+    them lowered by one standard error, rounded up: a HyperLogLog
+    under-counts small sets when items share a register, and 10 ports read
+    as 9 would otherwise miss a scan exact mode reports. Sources just under
+    a threshold can alert in sketch mode instead.
+    
+    With a ``baseline_path``, the learned baseline is restored from it at
+    startup (unless older than ``max_snapshot_age`` seconds) and saved to it
+    every ``snapshot_interval`` seconds and on stop_snapshots(), so a
+    restart does not begin another learning period.
     
-    def __init__(self, learning_period: int = 3600):
-        self.baseline = NetworkBaseline(learning_period=learning_period)
+    Windows, tracking and its cleanup run on ``clock`` (packet event time
+    unless given; see detection_engine.clock).
+    """
+    
+    def __init__(self, learning_period: int = 3600, tracking_mode: str = "exact",
+                 sketch_config: Optional[Dict[str, int]] = None, baseline_path: Optional[str] = None,
+                 snapshot_interval: float = 300.0, max_snapshot_age: float = 86400.0, clock=None):
+        if tracking_mode not in TRACKING_MODES:
+            raise ValueError(f"Unknown tracking mode {tracking_mode!r}, expected one of {', '.join(TRACKING_MODES)}")
+        self.clock = clock or EventClock()
+        self.baseline = NetworkBaseline(learning_period=learning_period, clock=self.clock)
         self.logger = logging.getLogger(__name__)
         
+        # Baseline persistence
+        self.baseline_path = baseline_path
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_stop = threading.Event()
+        self.snapshot_thread = None
+        if baseline_path:
+            self.baseline.load_snapshot(baseline_path, max_snapshot_age)
+        
+        # Sketch mode sizing (ignored in exact mode)
+        self.tracking_mode = tracking_mode
+        self.sketch_config = {
+            'hll_precision': 8,  # 256 registers per source
+            'cms_width': 2048,
+            'cms_depth': 4,
+            'max_tracked_sources': 50000  # per table
+        }
+        if sketch_config:
+            self.sketch_config.update(sketch_config)
+        self.packet_counts: Optional[CountMinSketch] = None  # per (source, scan window), sketch mode
+        self._packet_counts_cleared: Optional[float] = None
+        
         # Detection thresholds (in standard deviations)
         self.thresholds = {
             'packet_rate': {'medium': 2.0, 'high': 3.0, 'critical': 4.0},
             'byte_rate': {'medium': 2.0, 'high': 3.0, 'critical': 4.0},
             'connection_rate': {'medium': 2.5, 'high': 3.5, 'critical': 5.0},
             'port_scan': {'medium': 10, 'high': 20, 'critical': 50},  # unique ports
+            'excessive_connections': {'medium': 25, 'high': 50, 'critical': 100},  # unique destinations
             'protocol_anomaly': {'medium': 0.1, 'high': 0.05, 'critical': 0.01}  # deviation
         }
         
         # Detection state tracking
+        port_scan_tracking, connection_tracking = self._create_tracking_tables()
         self.detection_state = {
-            'port_scan_tracking': defaultdict(lambda: {
-                'ports': set(),
-                'start_time': time.time(),
-                'packet_count': 0
-            }),
-            'connection_tracking': defaultdict(lambda: {
-                'connections': set(),
-                'start_time': time.time()
-            }),
-            'rate_tracking': defaultdict(lambda: {
-                'packets': deque(maxlen=100),
-                'bytes': deque(maxlen=100),
-                'timestamps': deque(maxlen=100)
-            })
+            'port_scan_tracking': port_scan_tracking,
+            'connection_tracking': connection_tracking,
+            # Packets and bytes per source over the last minute, in 1s buckets; idle sources expire
+            'rate_tracking': SourceRateCounter(window=60, buckets=60)
         }
         
         # Statistics
@@ -220,12 +480,55 @@ class AnomalyDetector:
             'start_time': time.time()
         }
         
-        # Cleanup thread
-        self.cleanup_thread = threading.Thread(target=self._cleanup_worker, daemon=True)
-        self.cleanup_thread.start()
+        self.stats['learning_mode'] = not self.baseline.is_learning_complete()
+        
+        # Tracking cleanup every 5 minutes of clock time
+        self.clock.call_every(300, self._cleanup_tracking)
+        
+        # Snapshot thread
+        if baseline_path and snapshot_interval > 0:
+            self.snapshot_thread = threading.Thread(target=self._snapshot_worker, daemon=True)
+            self.snapshot_thread.start()
+    
+    def _create_tracking_tables(self):
+        """Per-source port scan and connection tracking tables for the tracking mode"""
+        if self.tracking_mode == "exact":
+            return (
+                defaultdict(lambda: {
+                    'ports': set(),
+                    'start_time': self.clock.now(),
+                    'packet_count': 0
+                }),
+                defaultdict(lambda: {
+                    'connections': set(),
+                    'start_time': self.clock.now()
+                })
+            )
+        
+        config = self.sketch_config
+        precision = config['hll_precision']
+        self.packet_counts = CountMinSketch(config['cms_width'], config['cms_depth'])
+        return (
+            BoundedTable(lambda: {
+                'ports': HyperLogLog(precision),
+                'start_time': self.clock.now()
+            }, config['max_tracked_sources']),
+            BoundedTable(lambda: {
+                'connections': HyperLogLog(precision),
+                'start_time': self.clock.now()
+            }, config['max_tracked_sources'])
+        )
+    
+    def _count_scan_packet(self, src_ip: str, scan_data: Dict[str, Any]) -> int:
+        """Count a SYN packet in the source's current scan window; returns the window's count"""
+        if self.packet_counts is None:
+            scan_data['packet_count'] += 1
+            return scan_data['packet_count']
+        return self.packet_counts.add(f"{src_ip}/{scan_data['start_time']!r}")
     
     def analyze_packet(self, packet_info) -> List[AnomalyResult]:
         """Analyze a packet for anomalies"""
+        self.clock.observe(packet_info.timestamp)
         self.stats['packets_analyzed'] += 1
         anomalies = []
         
@@ -249,81 +552,85 @@ class AnomalyDetector:
         self.stats['anomalies_detected'] += len(anomalies)
         return anomalies
     
+    def analyze_batch(self, packets: List) -> List[List[AnomalyResult]]:
+        """
+        Analyze a batch of packets for anomalies
+        
+        Packets are applied to the baseline in order, so results match
+        calling analyze_packet on each one. Returns one list per packet.
+        """
+        return [self.analyze_packet(packet_info) for packet_info in packets]
+    
     def _check_traffic_volume_anomalies(self, packet_info) -> List[AnomalyResult]:
         """Check for traffic volume anomalies"""
         anomalies = []
-        current_time = time.time()
+        current_time = self.clock.now()
         
         # Update rate tracking
         src_ip = packet_info.src_ip
-        rate_data = self.detection_state['rate_tracking'][src_ip]
-        rate_data['packets'].append(1)
-        rate_data['bytes'].append(packet_info.packet_size)
-        rate_data['timestamps'].append(current_time)
-        
-        # Calculate current rates (packets/second, bytes/second)
-        if len(rate_data['timestamps']) >= 10:
-            time_window = 60  # 1 minute window
-            recent_timestamps = [t for t in rate_data['timestamps'] if current_time - t <= time_window]
+        rate_tracking = self.detection_state['rate_tracking']
+        recent_packets, recent_bytes = rate_tracking.add(src_ip, current_time, packet_info.packet_size)
+        
+        # Calculate current rates (packets/second, bytes/second) over the tracking window
+        if recent_packets >= 5:
+            time_window = rate_tracking.window
+            packet_rate = recent_packets / time_window
+            byte_rate = recent_bytes / time_window
             
-            if len(recent_timestamps) >= 5:
-                packet_rate = len(recent_timestamps) / time_window
-                byte_rate = sum(rate_data['bytes'][-len(recent_timestamps):]) / time_window
-                
-                # Get baseline statistics
-                packet_stats = self.baseline.get_packet_rate_stats()
-                byte_stats = self.baseline.get_byte_rate_stats()
+            # Get baseline statistics
+            packet_stats = self.baseline.get_packet_rate_stats()
+            byte_stats = self.baseline.get_byte_rate_stats()
+            
+            # Check packet rate anomaly
+            if packet_stats['std'] > 0:
+                packet_z_score = abs(packet_rate - packet_stats['mean']) / packet_stats['std']
+                severity = self._get_severity_from_zscore(packet_z_score, self.thresholds['packet_rate'])
                 
-                # Check packet rate anomaly
-                if packet_stats['std'] > 0:
-                    packet_z_score = abs(packet_rate - packet_stats['mean']) / packet_stats['std']
-                    severity = self._get_severity_from_zscore(packet_z_score, self.thresholds['packet_rate'])
-                    
-                    if severity:
-                        anomalies.append(AnomalyResult(
-                            anomaly_type="HIGH_PACKET_RATE",
-                            severity=severity,
-                            timestamp=current_time,
-                            src_ip=src_ip,
-                            dst_ip=packet_info.dst_ip,
-                            src_port=packet_info.src_port,
-                            dst_port=packet_info.dst_port,
-                            protocol=packet_info.protocol,
-                            anomaly_score=packet_z_score,
-                            baseline_value=packet_stats['mean'],
-                            observed_value=packet_rate,
-                            description=f"Unusually high packet rate: {packet_rate:.2f} pps (baseline: {packet_stats['mean']:.2f} pps)",
-                            confidence=min(packet_z_score / 5.0, 1.0)
-                        ))
+                if severity:
+                    anomalies.append(AnomalyResult(
+                        anomaly_type="HIGH_PACKET_RATE",
+                        severity=severity,
+                        timestamp=current_time,
+                        src_ip=src_ip,
+                        dst_ip=packet_info.dst_ip,
+                        src_port=packet_info.src_port,
+                        dst_port=packet_info.dst_port,
+                        protocol=packet_info.protocol,
+                        anomaly_score=packet_z_score,
+                        baseline_value=packet_stats['mean'],
+                        observed_value=packet_rate,
+                        description=f"Unusually high packet rate: {packet_rate:.2f} pps (baseline: {packet_stats['mean']:.2f} pps)",
+                        confidence=min(packet_z_score / 5.0, 1.0)
+                    ))
+            
+            # Check byte rate anomaly
+            if byte_stats['std'] > 0:
+                byte_z_score = abs(byte_rate - byte_stats['mean']) / byte_stats['std']
+                severity = self._get_severity_from_zscore(byte_z_score, self.thresholds['byte_rate'])
                 
-                # Check byte rate anomaly
-                if byte_stats['std'] > 0:
-                    byte_z_score = abs(byte_rate - byte_stats['mean']) / byte_stats['std']
-                    severity = self._get_severity_from_zscore(byte_z_score, self.thresholds['byte_rate'])
-                    
-                    if severity:
-                        anomalies.append(AnomalyResult(
-                            anomaly_type="HIGH_BYTE_RATE",
-                            severity=severity,
-                            timestamp=current_time,
-                            src_ip=src_ip,
-                            dst_ip=packet_info.dst_ip,
-                            src_port=packet_info.src_port,
-                            dst_port=packet_info.dst_port,
-                            protocol=packet_info.protocol,
-                            anomaly_score=byte_z_score,
-                            baseline_value=byte_stats['mean'],
-                            observed_value=byte_rate,
-                            description=f"Unusually high byte rate: {byte_rate:.2f} Bps (baseline: {byte_stats['mean']:.2f} Bps)",
-                            confidence=min(byte_z_score / 5.0, 1.0)
-                        ))
+                if severity:
+                    anomalies.append(AnomalyResult(
+                        anomaly_type="HIGH_BYTE_RATE",
+                        severity=severity,
+                        timestamp=current_time,
+                        src_ip=src_ip,
+                        dst_ip=packet_info.dst_ip,
+                        src_port=packet_info.src_port,
+                        dst_port=packet_info.dst_port,
+                        protocol=packet_info.protocol,
+                        anomaly_score=byte_z_score,
+                        baseline_value=byte_stats['mean'],
+                        observed_value=byte_rate,
+                        description=f"Unusually high byte rate: {byte_rate:.2f} Bps (baseline: {byte_stats['mean']:.2f} Bps)",
+                        confidence=min(byte_z_score / 5.0, 1.0)
+                    ))
         
         return anomalies
     
     def _check_port_scan_anomalies(self, packet_info) -> List[AnomalyResult]:
         """Check for port scanning anomalies"""
         anomalies = []
-        current_time = time.time()
+        current_time = self.clock.now()
         
         # Only check TCP SYN packets for port scans
         if packet_info.protocol != "TCP" or not packet_info.flags or "SYN" not in packet_info.flags:
@@ -338,7 +645,7 @@ class AnomalyDetector:
         # Update port scan tracking
         scan_data = self.detection_state['port_scan_tracking'][src_ip]
         scan_data['ports'].add(dst_port)
-        scan_data['packet_count'] += 1
+        packet_count = self._count_scan_packet(src_ip, scan_data)
         
         # Check if this looks like a port scan
         time_window = 60  # 1 minute window
@@ -346,15 +653,17 @@ class AnomalyDetector:
             unique_ports = len(scan_data['ports'])
             
             # Determine severity based on number of unique ports
-            severity = None
-            if unique_ports >= self.thresholds['port_scan']['critical']:
-                severity = "CRITICAL"
-            elif unique_ports >= self.thresholds['port_scan']['high']:
-                severity = "HIGH"
-            elif unique_ports >= self.thresholds['port_scan']['medium']:
-                severity = "MEDIUM"
+            severity = self._get_severity_from_count(unique_ports, self.thresholds['port_scan'])
             
             if severity:
+                scan_info = {
+                    'scan_duration': current_time - scan_data['start_time'],
+                    'total_packets': packet_count
+                }
+                if self.tracking_mode == "exact":
+                    scan_info['scanned_ports'] = list(scan_data['ports'])
+                else:
+                    scan_info['estimated'] = True
                 anomalies.append(AnomalyResult(
                     anomaly_type="PORT_SCAN",
                     severity=severity,
@@ -369,17 +678,14 @@ class AnomalyDetector:
                     observed_value=unique_ports,
                     description=f"Port scan detected: {unique_ports} unique ports scanned in {time_window}s",
                     confidence=min(unique_ports / 100.0, 1.0),
-                    additional_info={
-                        'scanned_ports': list(scan_data['ports']),
-                        'scan_duration': current_time - scan_data['start_time'],
-                        'total_packets': scan_data['packet_count']
-                    }
+                    additional_info=scan_info
                 ))
             
             # Reset tracking for next window
             scan_data['ports'].clear()
             scan_data['start_time'] = current_time
-            scan_data['packet_count'] = 0
+            if self.packet_counts is None:
+                scan_data['packet_count'] = 0
         
         return anomalies
     
@@ -429,7 +735,7 @@ class AnomalyDetector:
     def _check_connection_anomalies(self, packet_info) -> List[AnomalyResult]:
         """Check for connection-based anomalies"""
         anomalies = []
-        current_time = time.time()
+        current_time = self.clock.now()
         
         # Track unique connections per source IP
         src_ip = packet_info.src_ip
@@ -444,13 +750,8 @@ class AnomalyDetector:
             unique_connections = len(conn_data['connections'])
             
             # Determine severity based on number of unique connections
-            severity = None
-            if unique_connections >= 100:
-                severity = "CRITICAL"
-            elif unique_connections >= 50:
-                severity = "HIGH"
-            elif unique_connections >= 25:
-                severity = "MEDIUM"
+            severity = self._get_severity_from_count(unique_connections,
+                                                     self.thresholds['excessive_connections'])
             
             if severity:
                 anomalies.append(AnomalyResult(
@@ -463,13 +764,14 @@ class AnomalyDetector:
                     dst_port=packet_info.dst_port,
                     protocol=packet_info.protocol,
                     anomaly_score=unique_connections,
-                    baseline_value=25,
+                    baseline_value=self.thresholds['excessive_connections']['medium'],
                     observed_value=unique_connections,
                     description=f"Excessive connections: {unique_connections} unique connections in {time_window}s",
                     confidence=min(unique_connections / 200.0, 1.0),
                     additional_info={
                         'connection_count': unique_connections,
-                        'time_window': time_window
+                        'time_window': time_window,
+                        'estimated': self.tracking_mode == "sketch"
                     }
                 ))
             
@@ -519,37 +821,58 @@ class AnomalyDetector:
             return "MEDIUM"
         return None
     
-    def _cleanup_worker(self):
-        """Background worker to clean up old tracking data"""
-        while True:
+    def _get_severity_from_count(self, count: int, thresholds: Dict[str, int]) -> Optional[str]:
+        """Convert a unique count to severity level (sketch estimates get one standard error of margin)"""
+        if self.tracking_mode == "exact":
+            return self._get_severity_from_zscore(count, thresholds)
+        error = 1.04 / math.sqrt(1 << self.sketch_config['hll_precision'])
+        return self._get_severity_from_zscore(count, {
+            level: threshold - math.ceil(threshold * error) for level, threshold in thresholds.items()
+        })
+    
+    def _cleanup_tracking(self, current_time: float):
+        """Clean up old tracking data (clock callback, on the packet path with an EventClock)"""
+        cleanup_threshold = 3600  # 1 hour
+        
+        # Clean up port scan and connection tracking (get() neither creates nor reorders)
+        for table in ('port_scan_tracking', 'connection_tracking'):
+            tracking = self.detection_state[table]
+            for src_ip in list(tracking.keys()):
+                data = tracking.get(src_ip)
+                if data is not None and current_time - data['start_time'] > cleanup_threshold:
+                    tracking.pop(src_ip, None)
+        
+        # Restart the packet count sketch so its error bound does not grow forever
+        if self.packet_counts is not None:
+            if self._packet_counts_cleared is None:
+                self._packet_counts_cleared = current_time
+            elif current_time - self._packet_counts_cleared > cleanup_threshold:
+                self.packet_counts.clear()
+                self._packet_counts_cleared = current_time
+        
+        # Rate tracking expires idle sources itself
+    
+    def _snapshot_worker(self):
+        """Save the baseline every snapshot_interval seconds"""
+        while not self._snapshot_stop.wait(self.snapshot_interval):
             try:
-                current_time = time.time()
-                cleanup_threshold = 3600  # 1 hour
-                
-                # Clean up port scan tracking
-                for src_ip in list(self.detection_state['port_scan_tracking'].keys()):
-                    scan_data = self.detection_state['port_scan_tracking'][src_ip]
-                    if current_time - scan_data['start_time'] > cleanup_threshold:
-                        del self.detection_state['port_scan_tracking'][src_ip]
-                
-                # Clean up connection tracking
-                for src_ip in list(self.detection_state['connection_tracking'].keys()):
-                    conn_data = self.detection_state['connection_tracking'][src_ip]
-                    if current_time - conn_data['start_time'] > cleanup_threshold:
-                        del self.detection_state['connection_tracking'][src_ip]
-                
-                # Clean up rate tracking
-                for src_ip in list(self.detection_state['rate_tracking'].keys()):
-                    rate_data = self.detection_state['rate_tracking'][src_ip]
-                    if (rate_data['timestamps'] and 
-                        current_time - rate_data['timestamps'][-1] > cleanup_threshold):
-                        del self.detection_state['rate_tracking'][src_ip]
-                
-                time.sleep(300)  # Run cleanup every 5 minutes
-                
+                self.save_baseline()
             except Exception as e:
-                self.logger.error(f"Error in cleanup worker: {e}")
-                time.sleep(60)
+                self.logger.error(f"Error in snapshot worker: {e}")
+    
+    def save_baseline(self, use_fork: bool = True) -> bool:
+        """Snapshot the baseline to baseline_path (in a forked child where possible)"""
+        if not self.baseline_path:
+            return False
+        return self.baseline.save_snapshot(self.baseline_path, use_fork=use_fork)
+    
+    def stop_snapshots(self):
+        """Stop periodic snapshots and save the baseline one last time, waiting for the write"""
+        self._snapshot_stop.set()
+        if not self.baseline_path:
+            return
+        self.baseline.reap_snapshot(block=True)
+        self.save_baseline(use_fork=False)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get anomaly detection statistics"""
@@ -573,9 +896,33 @@ class AnomalyDetector:
         stats['active_port_scans'] = len(self.detection_state['port_scan_tracking'])
         stats['active_connections'] = len(self.detection_state['connection_tracking'])
         stats['active_rate_tracking'] = len(self.detection_state['rate_tracking'])
+        stats['tracking'] = self._get_tracking_stats()
+        
+        if self.baseline_path:
+            self.baseline.reap_snapshot()
+            stats['baseline_snapshots'] = dict(self.baseline.snapshot_stats, path=self.baseline_path)
         
         return stats
     
+    def _get_tracking_stats(self) -> Dict[str, Any]:
+        """Tracking mode, and in sketch mode the sketch sizes, error bounds and evictions"""
+        if self.tracking_mode == "exact":
+            return {'mode': "exact"}
+        port_scans = self.detection_state['port_scan_tracking']
+        connections = self.detection_state['connection_tracking']
+        registers = 1 << self.sketch_config['hll_precision']
+        return {
+            'mode': "sketch",
+            'hll_precision': self.sketch_config['hll_precision'],
+            'hll_relative_error': 1.04 / math.sqrt(registers),
+            'max_tracked_sources': self.sketch_config['max_tracked_sources'],
+            'port_scan_sources': len(port_scans),
+            'connection_sources': len(connections),
+            'evicted_sources': port_scans.evicted + connections.evicted,
+            'sketch_bytes': registers * (len(port_scans) + len(connections)) + self.packet_counts.memory_bytes,
+            'packet_counts': self.packet_counts.get_stats()
+        }
+    
     def reset_stats(self):
         """Reset detection statistics"""
         self.stats = {
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Detection Clocks for IDS/IPS System
+The time detectors window on: packet event time, or the wall clock
+
+Components that window, rate-limit, expire or timestamp on a clock take it
+as ``clock`` (an EventClock unless given). On event time a capture file
+replayed at any speed gives the same detections, scores and verdicts as
+the live capture did, since nothing depends on when packets are processed.
+"""
+
+import heapq
+import time
+import logging
+import threading
+from typing import Callable, List, Optional
+
+# Periodic callbacks receive the clock's time when they fire
+TimerCallback = Callable[[float], None]
+
+
+class EventClock:
+    """
+    Time driven by packet timestamps.
+
+    Detectors call observe() with each packet's timestamp and window on
+    now(), which is the timestamp of the packet being handled. Timestamps
+    that are missing or 0 leave the clock where it is; before the first
+    packet, now() is the wall clock.
+
+    call_every() replaces cleanup threads: callbacks run on the thread that
+    observes the first packet at or after their due time (so they do not
+    race the packet path), once however much time that packet skipped, and
+    are then due ``interval`` seconds later. Due times follow the latest
+    timestamp seen, so slightly out-of-order packets do not rerun them.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._current: Optional[float] = None  # timestamp of the packet being handled
+        self._latest: Optional[float] = None  # latest timestamp seen
+        self._timers: List[list] = []  # heap of [due, sequence, interval, callback]
+        self._pending: List[list] = []  # registered before the first packet, scheduled from it
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.stats = {'timers_fired': 0, 'timer_errors': 0}
+
+    def now(self) -> float:
+        current = self._current
+        return time.time() if current is None else current
+
+    def observe(self, timestamp: Optional[float]) -> float:
+        """Move the clock to a packet's timestamp, running any callbacks that came due; returns now()"""
+        if not timestamp:
+            return self.now()
+        self._current = timestamp
+        latest = self._latest
+        if latest is not None and timestamp <= latest:
+            return timestamp
+        self._latest = timestamp
+        if latest is None:
+            self._schedule_pending(timestamp)
+        elif self._timers and self._timers[0][0] <= timestamp:
+            self._run_due(timestamp)
+        return timestamp
+
+    def call_every(self, interval: float, callback: TimerCallback):
+        """Run ``callback(now)`` every ``interval`` seconds of event time"""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        with self._lock:
+            timer = [0.0, self._sequence, interval, callback]
+            self._sequence += 1
+            if self._latest is None:
+                self._pending.append(timer)
+            else:
+                timer[0] = self._latest + interval
+                heapq.heappush(self._timers, timer)
+
+    def _schedule_pending(self, now: float):
+        with self._lock:
+            for timer in self._pending:
+                timer[0] = now + timer[2]
+                heapq.heappush(self._timers, timer)
+            self._pending = []
+
+    def _run_due(self, now: float):
+        due = []
+        with self._lock:
+            timers = self._timers
+            while timers and timers[0][0] <= now:
+                due.append(heapq.heappop(timers))
+            for timer in due:
+                timer[0] = now + timer[2]
+                heapq.heappush(timers, timer)
+
+        for timer in due:
+            try:
+                timer[3](now)
+                self.stats['timers_fired'] += 1
+            except Exception as e:
+                self.stats['timer_errors'] += 1
+                self.logger.error(f"Error in clock callback {getattr(timer[3], '__qualname__', timer[3])}: {e}")
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, mode="event", now=self._current, latest=self._latest,
+                    timers=len(self._timers) + len(self._pending))
+
+
+class WallClock:
+    """
+    Time from time.time(), whatever the packets say.
+
+    Same interface as EventClock; call_every() runs each callback on its
+    own daemon thread. Windows then depend on when packets are processed,
+    so replays are only meaningful at 1x speed.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.stats = {'timers_fired': 0, 'timer_errors': 0}
+        self._threads: List[threading.Thread] = []
+
+    def now(self) -> float:
+        return time.time()
+
+    def observe(self, timestamp: Optional[float]) -> float:
+        return time.time()
+
+    def call_every(self, interval: float, callback: TimerCallback):
+        """Run ``callback(now)`` every ``interval`` seconds, on a daemon thread"""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        thread = threading.Thread(target=self._timer_worker, args=(interval, callback), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _timer_worker(self, interval: float, callback: TimerCallback):
+        while True:
+            time.sleep(interval)
+            try:
+                callback(time.time())
+                self.stats['timers_fired'] += 1
+            except Exception as e:
+                self.stats['timer_errors'] += 1
+                self.logger.error(f"Error in clock callback {getattr(callback, '__qualname__', callback)}: {e}")
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, mode="wall", now=time.time(), timers=len(self._threads))
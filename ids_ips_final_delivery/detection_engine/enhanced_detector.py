@@ -22,6 +22,11 @@ import ipaddress
 import socket
 import struct
 
+try:
+    from detection_engine.clock import EventClock
+except ImportError:
+    from clock import EventClock
+
 # Enhanced packet structure for better analysis
 @dataclass
 class EnhancedPacket:
@@ -54,10 +59,16 @@ class ThreatDetection:
     metadata: Dict[str, Any]
 
 class EnhancedDetectionEngine:
-    """Unified detection engine combining all detection methods"""
+    """
+    Unified detection engine combining all detection methods
+    
+    Behavioral windows, packet rates and state cleanup run on ``clock``
+    (packet event time unless given).
+    """
     
-    def __init__(self, config: Dict[str, Any] = None):
+    def __init__(self, config: Dict[str, Any] = None, clock=None):
         self.config = config or self._default_config()
+        self.clock = clock or EventClock()
         self.running = False
         self.packet_queue = queue.Queue(maxsize=10000)
         self.detection_queue = queue.Queue(maxsize=1000)
@@ -79,6 +90,9 @@ class EnhancedDetectionEngine:
         self._init_behavioral_detection()
         self._init_threat_intelligence()
         
+        # Behavioral state cleanup every minute of clock time
+        self.clock.call_every(60, self._cleanup_behavioral_state)
+        
         # Worker threads
         self.workers = []
         self.detection_callbacks = []
@@ -358,6 +372,7 @@ class EnhancedDetectionEngine:
     
     def _analyze_packet(self, packet: EnhancedPacket) -> List[ThreatDetection]:
         """Analyze packet using all detection methods"""
+        self.clock.observe(packet.timestamp)
         detections = []
         
         # Signature-based detection
@@ -659,7 +674,7 @@ class EnhancedDetectionEngine:
     
     def _calculate_packet_rate(self, src_ip: str) -> float:
         """Calculate packet rate for source IP"""
-        current_time = time.time()
+        current_time = self.clock.now()
         recent_packets = [t for t in self.behavioral_state['packet_times'].get(src_ip, [])
                          if current_time - t < 60]
         return len(recent_packets) / 60.0
@@ -754,8 +769,7 @@ class EnhancedDetectionEngine:
             self.behavioral_state['data_volumes'] = defaultdict(int)
         self.behavioral_state['data_volumes'][src_ip] += packet.payload_size
         
-        # Clean old entries
-        self._cleanup_behavioral_state(current_time)
+        # Old entries are dropped by _cleanup_behavioral_state, which the clock runs every minute
     
     def _cleanup_behavioral_state(self, current_time: float):
         """Clean up old behavioral state entries"""
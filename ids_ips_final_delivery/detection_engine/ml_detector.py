@@ -34,6 +34,11 @@ except ImportError:
     ML_AVAILABLE = False
     print("Warning: scikit-learn not available. Install with: pip install scikit-learn")
 
+try:
+    from detection_engine.clock import EventClock
+except ImportError:
+    from clock import EventClock
+
 @dataclass
 class MLDetectionResult:
     """Data class representing ML detection result"""
@@ -376,9 +381,15 @@ class IsolationForestModel(MLModel):
         return binary_predictions, confidence
 
 class MLDetectionEngine:
-    """Main ML-based detection engine"""
+    """
+    Main ML-based detection engine
+    
+    Per-source context is reset every ``time_window`` seconds of ``clock``
+    time (packet event time unless given).
+    """
     
-    def __init__(self, models_dir: str = "ml_models"):
+    def __init__(self, models_dir: str = "ml_models", clock=None):
+        self.clock = clock or EventClock()
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
         
@@ -391,9 +402,9 @@ class MLDetectionEngine:
             'connection_counts': defaultdict(int),
             'port_diversity': defaultdict(set),
             'protocol_diversity': defaultdict(set),
-            'time_window': 300,  # 5 minutes
-            'last_cleanup': time.time()
+            'time_window': 300  # 5 minutes
         }
+        self.clock.call_every(self.context['time_window'], self._cleanup_context)
         
         # Statistics
         self.stats = {
@@ -485,18 +496,28 @@ class MLDetectionEngine:
     
     def analyze_packet(self, packet_info) -> List[MLDetectionResult]:
         """Analyze packet using ML models"""
-        if not ML_AVAILABLE:
-            return []
+        return self.analyze_batch([packet_info])[0]
+    
+    def analyze_batch(self, packets: List) -> List[List[MLDetectionResult]]:
+        """
+        Analyze a batch of packets using ML models
         
-        self.stats['packets_analyzed'] += 1
-        results = []
+        Context is updated packet by packet so each feature vector matches
+        what analyze_packet would have seen, then every model predicts on the
+        whole feature matrix in one call. Returns one list per packet.
+        """
+        results = [[] for _ in packets]
+        if not ML_AVAILABLE or not packets:
+            return results
         
-        # Update context
-        self._update_context(packet_info)
+        self.stats['packets_analyzed'] += len(packets)
         
-        # Extract features
-        features = self.feature_extractor.extract_features(packet_info, self.context)
-        feature_array = np.array([list(features.values())]).reshape(1, -1)
+        # Update context and extract features
+        packet_features = []
+        for packet_info in packets:
+            self._update_context(packet_info)
+            packet_features.append(self.feature_extractor.extract_features(packet_info, self.context))
+        feature_matrix = np.array([list(features.values()) for features in packet_features])
         
         # Run through all trained models
         for model_name, model in self.models.items():
@@ -504,47 +525,56 @@ class MLDetectionEngine:
                 continue
             
             try:
-                predictions, confidence = model.predict(feature_array)
-                prediction = predictions[0]
-                conf_score = confidence[0]
-                
-                # Create result
-                result = MLDetectionResult(
-                    model_name=model_name,
-                    prediction=prediction,
-                    confidence=conf_score,
-                    timestamp=packet_info.timestamp,
-                    src_ip=packet_info.src_ip,
-                    dst_ip=packet_info.dst_ip,
-                    src_port=packet_info.src_port,
-                    dst_port=packet_info.dst_port,
-                    protocol=packet_info.protocol,
-                    features=features
-                )
-                
-                # Add model-specific information
-                if model.model_type == "supervised":
-                    result.feature_importance = model.training_stats.get('feature_importance', {})
-                elif model.model_type == "unsupervised":
-                    result.anomaly_score = conf_score
-                
-                # Only report significant detections
-                if (prediction in ['MALICIOUS', 'ANOMALY'] and conf_score > 0.5) or conf_score > 0.8:
-                    results.append(result)
-                    
-                    if prediction in ['MALICIOUS', 'ANOMALY']:
-                        self.stats['detections'] += 1
-                        if prediction == 'ANOMALY':
-                            self.stats['anomalies'] += 1
-                
+                predictions, confidence = model.predict(feature_matrix)
             except Exception as e:
                 self.logger.error(f"Error in model {model_name}: {e}")
+                continue
+            
+            for i, packet_info in enumerate(packets):
+                result = self._build_result(model_name, model, packet_info, packet_features[i],
+                                            predictions[i], confidence[i])
+                if result:
+                    results[i].append(result)
         
         return results
     
+    def _build_result(self, model_name: str, model: MLModel, packet_info, features: Dict[str, float],
+                      prediction, conf_score) -> Optional[MLDetectionResult]:
+        """Create a result for one model prediction, or None if it is not significant"""
+        # Only report significant detections
+        if not ((prediction in ['MALICIOUS', 'ANOMALY'] and conf_score > 0.5) or conf_score > 0.8):
+            return None
+        
+        # Create result
+        result = MLDetectionResult(
+            model_name=model_name,
+            prediction=prediction,
+            confidence=conf_score,
+            timestamp=packet_info.timestamp,
+            src_ip=packet_info.src_ip,
+            dst_ip=packet_info.dst_ip,
+            src_port=packet_info.src_port,
+            dst_port=packet_info.dst_port,
+            protocol=packet_info.protocol,
+            features=features
+        )
+        
+        # Add model-specific information
+        if model.model_type == "supervised":
+            result.feature_importance = model.training_stats.get('feature_importance', {})
+        elif model.model_type == "unsupervised":
+            result.anomaly_score = conf_score
+        
+        if prediction in ['MALICIOUS', 'ANOMALY']:
+            self.stats['detections'] += 1
+            if prediction == 'ANOMALY':
+                self.stats['anomalies'] += 1
+        
+        return result
+    
     def _update_context(self, packet_info):
         """Update context information for feature extraction"""
-        current_time = time.time()
+        self.clock.observe(packet_info.timestamp)  # may run the context cleanup first
         src_ip = packet_info.src_ip
         
         # Update connection counts
@@ -556,14 +586,9 @@ class MLDetectionEngine:
         
         # Update protocol diversity
         self.context['protocol_diversity'][src_ip].add(packet_info.protocol)
-        
-        # Cleanup old context data periodically
-        if current_time - self.context['last_cleanup'] > self.context['time_window']:
-            self._cleanup_context()
-            self.context['last_cleanup'] = current_time
     
-    def _cleanup_context(self):
-        """Clean up old context data"""
+    def _cleanup_context(self, current_time: Optional[float] = None):
+        """Clean up old context data (clock callback, once per time window)"""
         # Reset counters (in a real implementation, you'd want to decay rather than reset)
         self.context['connection_counts'].clear()
         for ip_set in self.context['port_diversity'].values():
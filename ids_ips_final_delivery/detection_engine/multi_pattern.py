@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Multi-Pattern Matcher for IDS/IPS System
+Aho-Corasick automaton that finds every literal pattern in a payload in one pass
+"""
+
+from typing import Any, Dict, Iterable, List, Set, Tuple, Union
+
+# Patterns and texts are str (elements are characters) or bytes-like (elements are ints)
+Pattern = Union[str, bytes]
+
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _ascii_lower(pattern: Pattern) -> Pattern:
+    # bytes.lower() only folds ASCII; str.lower() would fold everything
+    return pattern.lower() if isinstance(pattern, (bytes, bytearray)) else pattern.translate(_ASCII_LOWER)
+
+
+def _ascii_upper(element):
+    if isinstance(element, int):
+        return element - 32 if 97 <= element <= 122 else element
+    return element.upper() if 'a' <= element <= 'z' else element
+
+
+class MultiPatternMatcher:
+    """
+    Aho-Corasick automaton over literal string or byte patterns.
+
+    Each pattern carries a value (e.g. a signature ID); search() scans the
+    text once and returns the values of every pattern that occurs in it,
+    however many patterns there are. Several values may share a pattern.
+    Patterns and texts are either all str or all bytes-like; bytes texts
+    may be memoryview slices, which are scanned without copying. Matching
+    is exact unless ``ascii_case_insensitive`` is set, in which case ASCII
+    letters match either case (both cases get transitions, so the scan
+    itself does no folding). The pattern set is fixed once built: build a
+    new matcher when it changes.
+
+    Transitions resolved through failure links during a search are cached
+    in the state's transition dict (up to ``cache_limit`` entries in total),
+    so steady-state scanning costs one dict lookup per character.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[Pattern, Any]] = (), cache_limit: int = 1 << 20,
+                 ascii_case_insensitive: bool = False):
+        """
+        Build the automaton
+
+        Args:
+            patterns: (pattern, value) pairs; an empty pattern matches any text
+            cache_limit: Max number of resolved failure transitions to cache
+            ascii_case_insensitive: Match ASCII letters regardless of case
+        """
+        self._values: List[List[Any]] = []  # pattern id -> values
+        self._always: List[Any] = []  # values of empty patterns
+        self._goto: List[Dict[Any, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        pattern_ids: Dict[Pattern, int] = {}
+
+        # Trie of all patterns
+        for pattern, value in patterns:
+            if ascii_case_insensitive:
+                pattern = _ascii_lower(pattern)
+            if not pattern:
+                self._always.append(value)
+                continue
+            pattern_id = pattern_ids.get(pattern)
+            if pattern_id is not None:
+                self._values[pattern_id].append(value)
+                continue
+            pattern_id = pattern_ids[pattern] = len(self._values)
+            self._values.append([value])
+
+            state = 0
+            for char in pattern:
+                child = self._goto[state].get(char)
+                if child is None:
+                    child = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = child
+            self._out[state] = (pattern_id,)
+
+        # Failure links in breadth-first order, merging the outputs of each
+        # state's longest proper suffix so search() never follows output chains
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                if target == child:
+                    target = 0
+                self._fail[child] = target
+                if self._out[target]:
+                    self._out[child] = self._out[child] + self._out[target]
+                queue.append(child)
+
+        if ascii_case_insensitive:
+            # Uppercase aliases of every lowercase transition (the trie only holds lowercase)
+            for transitions in self._goto:
+                for char, child in list(transitions.items()):
+                    alias = _ascii_upper(char)
+                    if alias != char:
+                        transitions[alias] = child
+
+        self.pattern_count = len(self._values)
+        self.state_count = len(self._goto)
+        self._cache_limit = cache_limit
+        self._cached = 0
+
+    def __len__(self) -> int:
+        return self.pattern_count + (1 if self._always else 0)
+
+    def search(self, text) -> Set[Any]:
+        """Return the values of all patterns that occur in ``text``"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        cache_room = self._cache_limit - self._cached
+        cached = 0
+
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            child = goto[state].get(char)
+            if child is None:
+                # Resolve through failure links, then remember the result
+                origin = state
+                while state:
+                    state = fail[state]
+                    child = goto[state].get(char)
+                    if child is not None:
+                        break
+                else:
+                    child = 0
+                if cached < cache_room:
+                    goto[origin][char] = child
+                    cached += 1
+            state = child
+            if out[state]:
+                found.update(out[state])
+        self._cached += cached
+
+        values = set(self._always)
+        for pattern_id in found:
+            values.update(self._values[pattern_id])
+        return values
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get automaton size"""
+        return {
+            'patterns': self.pattern_count,
+            'empty_patterns': len(self._always),
+            'states': self.state_count,
+            'cached_transitions': self._cached
+        }
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Payload Normalization for IDS/IPS System
+Lazily built, memoized normalized views of a packet payload
+"""
+
+import re
+from typing import Callable, Dict, Tuple, Union
+from urllib.parse import unquote_to_bytes
+
+Buffer = Union[bytes, memoryview]
+
+_WHITESPACE_RUN = re.compile(rb"\s+")
+_URL_ESCAPE = re.compile(rb"%[0-9A-Fa-f]{2}")  # searches memoryviews too, unlike ``in``
+
+
+def url_decode(data: Buffer) -> Buffer:
+    """Decode %XX escapes once (invalid escapes are kept as they are)"""
+    if not _URL_ESCAPE.search(data):
+        return data
+    return unquote_to_bytes(bytes(data))
+
+
+def lowercase(data: Buffer) -> Buffer:
+    """Fold ASCII letters to lower case"""
+    return bytes(data).lower()
+
+
+def collapse_whitespace(data: Buffer) -> Buffer:
+    """Replace every run of ASCII whitespace with a single space"""
+    return _WHITESPACE_RUN.sub(b" ", data)
+
+
+TRANSFORMS: Dict[str, Callable[[Buffer], Buffer]] = {
+    'url_decode': url_decode,
+    'lowercase': lowercase,
+    'collapse_whitespace': collapse_whitespace,
+}
+
+# View name -> transforms applied to the raw payload, in order. Views sharing
+# a prefix share its buffer: "normalized" starts from "url_decoded".
+PAYLOAD_VIEWS: Dict[str, Tuple[str, ...]] = {
+    'raw': (),
+    'url_decoded': ('url_decode',),
+    'lowercase': ('lowercase',),
+    'collapsed': ('collapse_whitespace',),
+    'normalized': ('url_decode', 'lowercase', 'collapse_whitespace'),
+}
+
+
+class PayloadViews:
+    """
+    The normalized views of one payload, each built on first use.
+
+    Buffers are memoized per transform chain, so however many signatures
+    match against a view, each transform runs at most once per packet. A
+    transform with nothing to do returns its input, so a payload without
+    escapes costs no copy for "url_decoded".
+    """
+    __slots__ = ('raw', '_buffers')
+
+    def __init__(self, raw: Buffer):
+        self.raw = raw
+        self._buffers: Dict[Tuple[str, ...], Buffer] = {(): raw}
+
+    def get(self, view: str) -> Buffer:
+        """Buffer for a view name from PAYLOAD_VIEWS (KeyError for unknown names)"""
+        chain = PAYLOAD_VIEWS[view]
+        buffer = self._buffers.get(chain)
+        if buffer is None:
+            buffer = self._build(chain)
+        return buffer
+
+    def _build(self, chain: Tuple[str, ...]) -> Buffer:
+        parent = self._buffers.get(chain[:-1])
+        if parent is None:
+            parent = self._build(chain[:-1])
+        buffer = self._buffers[chain] = TRANSFORMS[chain[-1]](parent)
+        return buffer
+
+    @property
+    def built(self) -> int:
+        """Number of transforms run so far"""
+        return len(self._buffers) - 1
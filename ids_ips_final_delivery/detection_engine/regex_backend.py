@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Regex Backends for IDS/IPS System
+Pluggable regex compilation for signatures, with an optional linear-time RE2 engine
+"""
+
+import re
+import logging
+from typing import Optional, Union
+
+# Optional RE2 binding (pip install google-re2): linear-time matching, no backtracking
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    re2 = None
+    RE2_AVAILABLE = False
+
+REGEX_BACKENDS = ("auto", "re", "re2")
+
+
+class RegexBackend:
+    """
+    Compiles signature regexes with the stdlib ``re`` module.
+
+    Backtracking: a crafted payload can make a search take exponential
+    time, so the detector runs patterns from this backend under a scan
+    budget. Subclasses compile with other engines and mark the patterns
+    they produce as safe to run unguarded.
+    """
+    name = "re"
+    linear_time = False
+
+    def compile(self, pattern: Union[str, bytes], flags: int = 0):
+        """Compile ``pattern``; raises re.error if it is invalid"""
+        return re.compile(pattern, flags)
+
+
+class RE2Pattern:
+    """RE2 regex with the subset of the re.Pattern interface the detector uses"""
+    __slots__ = ('_regex', 'pattern')
+    linear_time = True
+
+    def __init__(self, regex, pattern):
+        self._regex = regex
+        self.pattern = pattern
+
+    def search(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()  # the binding takes str/bytes
+        return self._regex.search(data)
+
+
+class RE2Backend(RegexBackend):
+    """
+    Compiles signature regexes with RE2 where it supports them.
+
+    RE2 matches in time linear in the payload, so its patterns need no
+    scan budget. Patterns it rejects (backreferences, lookarounds) and
+    flagged literal patterns fall back to the stdlib ``re`` module.
+    """
+    name = "re2"
+    linear_time = True
+
+    def __init__(self):
+        if not RE2_AVAILABLE:
+            raise ImportError("RE2 backend requires the google-re2 package")
+
+    def compile(self, pattern: Union[str, bytes], flags: int = 0):
+        if not flags:
+            try:
+                return RE2Pattern(re2.compile(pattern), pattern)
+            except Exception:
+                pass
+        return re.compile(pattern, flags)
+
+
+def is_linear(compiled) -> bool:
+    """True for patterns compiled by a linear-time engine"""
+    return type(compiled) is not re.Pattern
+
+
+def get_regex_backend(name: str = "auto", logger: Optional[logging.Logger] = None) -> RegexBackend:
+    """
+    Get a regex backend by name
+
+    "auto" picks RE2 when it is installed; asking for "re2" without it
+    logs a warning and falls back to the stdlib backend.
+    """
+    if name not in REGEX_BACKENDS:
+        raise ValueError(f"Unknown regex backend {name!r}, expected one of {', '.join(REGEX_BACKENDS)}")
+    if name in ("auto", "re2") and RE2_AVAILABLE:
+        return RE2Backend()
+    if name == "re2":
+        (logger or logging.getLogger(__name__)).warning(
+            "RE2 regex backend requested but google-re2 is not installed, using re with scan budgets")
+    return RegexBackend()
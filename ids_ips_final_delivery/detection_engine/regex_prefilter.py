@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Regex Literal Prefilter for IDS/IPS System
+Extracts the literal factors a regular expression cannot match without
+"""
+
+from typing import FrozenSet, List, Optional, Set, Tuple
+
+try:
+    # Python 3.11+
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# Largest set of alternative strings tracked for one factor
+MAX_FACTOR_ALTERNATIVES = 64
+# Largest fixed repeat count expanded into literals (e.g. a{3} -> "aaa")
+MAX_EXPANDED_REPEAT = 8
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+_ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+# (exact, required): every string the node can match when it is a small
+# literal set, and the best set of alternatives one of which every match contains
+_Analysis = Tuple[Optional[Set[str]], Optional[Set[str]]]
+
+
+def extract_literal_factors(pattern: str, flags: int = 0) -> Optional[FrozenSet[str]]:
+    """
+    Extract required literal factors from a regular expression
+
+    Returns a set of lowercase strings such that any text the regex can
+    match, lowercased, contains at least one of them. None means no such
+    set was found and the regex must always run. Factors are lowercased
+    regardless of case sensitivity, so the result is only used as a
+    prefilter on lowercased ASCII content; non-ASCII factors are rejected
+    because case folding outside ASCII is not length- or context-free.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return None
+
+    _, required = _analyze_sequence(list(parsed))
+    if not required or any(not factor or not factor.isascii() for factor in required):
+        return None
+    return frozenset(required)
+
+
+def _minimize(factors: Set[str]) -> Set[str]:
+    """Drop alternatives that contain another alternative (finding the shorter one is enough)"""
+    kept: List[str] = []
+    for factor in sorted(factors, key=len):
+        if not any(shorter in factor for shorter in kept):
+            kept.append(factor)
+    return set(kept)
+
+
+def _best(candidates: List[Set[str]]) -> Optional[Set[str]]:
+    """Pick the most selective factor set: longest shortest alternative, then fewest alternatives"""
+    candidates = [_minimize(c) for c in candidates if c and '' not in c]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (min(len(s) for s in c), -len(c)))
+
+
+def _analyze_sequence(items) -> _Analysis:
+    run = {''}  # literal strings the current run of exact items can match
+    exact = True
+    candidates: List[Set[str]] = []
+
+    for op, av in items:
+        if op in _REPEATS and av[0] >= 1 and av[0] != av[1]:
+            # x{n,m} with a literal x: the run continues into the first copy
+            # and a new run starts from the last one
+            sub_exact, _ = _analyze_sequence(list(av[2]))
+            if sub_exact is not None and len(run) * len(sub_exact) <= MAX_FACTOR_ALTERNATIVES:
+                candidates.append({prefix + suffix for prefix in run for suffix in sub_exact})
+                run = set(sub_exact)
+                exact = False
+                continue
+
+        item_exact, item_required = _analyze_item(op, av)
+        if item_exact is not None:
+            if len(run) * len(item_exact) <= MAX_FACTOR_ALTERNATIVES:
+                run = {prefix + suffix for prefix in run for suffix in item_exact}
+            else:
+                candidates.append(run)
+                run = set(item_exact)
+                exact = False
+        else:
+            candidates.append(run)
+            run = {''}
+            exact = False
+            if item_required:
+                candidates.append(item_required)
+
+    candidates.append(run)
+    return (run if exact else None), _best(candidates)
+
+
+def _analyze_item(op, av) -> _Analysis:
+    if op is sre_constants.LITERAL:
+        return {chr(av).lower()}, None
+
+    if op is sre_constants.AT:
+        # Anchors and word boundaries consume nothing
+        return {''}, None
+
+    if op is sre_constants.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is not sre_constants.LITERAL:
+                return None, None
+            chars.add(chr(item_av).lower())
+        if len(chars) > MAX_FACTOR_ALTERNATIVES:
+            return None, None
+        return chars, _best([chars])
+
+    if op is sre_constants.SUBPATTERN:
+        return _analyze_sequence(list(av[-1]))
+
+    if _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+        return _analyze_sequence(list(av))
+
+    if op is sre_constants.BRANCH:
+        alternatives = [_analyze_sequence(list(branch)) for branch in av[1]]
+
+        exact: Optional[Set[str]] = set()
+        for alt_exact, _ in alternatives:
+            if alt_exact is None or exact is None:
+                exact = None
+            else:
+                exact |= alt_exact
+        if exact is not None and len(exact) > MAX_FACTOR_ALTERNATIVES:
+            exact = None
+
+        required: Optional[Set[str]] = set()
+        for _, alt_required in alternatives:
+            if not alt_required:
+                required = None
+                break
+            required |= alt_required
+        if required is not None and len(required) > MAX_FACTOR_ALTERNATIVES:
+            required = None
+        return exact, required
+
+    if op in _REPEATS:
+        low, high, item = av
+        sub_exact, sub_required = _analyze_sequence(list(item))
+        if sub_exact is not None and low == high and low <= MAX_EXPANDED_REPEAT:
+            repeated = {''}
+            for _ in range(low):
+                repeated = {prefix + suffix for prefix in repeated for suffix in sub_exact}
+                if len(repeated) > MAX_FACTOR_ALTERNATIVES:
+                    break
+            else:
+                return repeated, _best([repeated])
+        if low >= 1:
+            return None, _best([sub_exact]) if sub_exact is not None else sub_required
+        return None, None
+
+    # ANY, NOT_LITERAL, CATEGORY, lookarounds, group references, ...
+    return None, None
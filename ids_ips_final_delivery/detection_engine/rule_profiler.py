@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Rule Profiler for IDS/IPS System
+Per-signature cost accounting and "top costly rules" reports
+"""
+
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+# Report columns that can rank rules
+SORT_KEYS = ('total_time', 'avg_time', 'max_time', 'evaluations', 'matches', 'bytes_scanned')
+
+
+@dataclass
+class RuleProfile:
+    """Accumulated cost of one signature"""
+    signature_id: str
+    name: str = ""
+    pattern_type: str = ""
+    evaluations: int = 0
+    matches: int = 0
+    total_time: float = 0.0  # seconds
+    max_time: float = 0.0  # seconds
+    bytes_scanned: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = asdict(self)
+        entry['avg_time'] = self.total_time / self.evaluations if self.evaluations else 0.0
+        entry['match_rate'] = self.matches / self.evaluations if self.evaluations else 0.0
+        return entry
+
+
+class RuleProfiler:
+    """
+    Per-signature instrumentation for SignatureDetector, after Snort's rule profiling.
+
+    Every pattern evaluation records its wall time, whether it matched and
+    how many payload bytes it had to scan. The shared literal-matcher scan
+    is accounted separately, as it serves all rules at once. The detector
+    only holds a profiler while profiling is enabled, so the disabled cost
+    is one ``is None`` test per evaluation.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def record(self, signature, elapsed: float, matched: bool, bytes_scanned: int):
+        """Record one evaluation of ``signature``"""
+        profile = self.rules.get(signature.id)
+        if profile is None:
+            profile = self.rules[signature.id] = RuleProfile(signature.id, signature.name,
+                                                             signature.pattern_type)
+        profile.evaluations += 1
+        profile.total_time += elapsed
+        if elapsed > profile.max_time:
+            profile.max_time = elapsed
+        profile.bytes_scanned += bytes_scanned
+        if matched:
+            profile.matches += 1
+
+    def record_literal_scan(self, elapsed: float, bytes_scanned: int):
+        """Record one literal-matcher scan of a payload"""
+        self.literal_scans += 1
+        self.literal_scan_time += elapsed
+        self.literal_bytes_scanned += bytes_scanned
+
+    def top(self, limit: Optional[int] = 10, sort_by: str = 'total_time') -> List[Dict[str, Any]]:
+        """The ``limit`` most costly rules by ``sort_by`` (one of SORT_KEYS), most costly first"""
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+        entries = [profile.to_dict() for profile in list(self.rules.values())]
+        entries.sort(key=lambda entry: entry[sort_by], reverse=True)
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        """Drop all recorded data"""
+        self.rules: Dict[str, RuleProfile] = {}
+        self.literal_scans = 0
+        self.literal_scan_time = 0.0
+        self.literal_bytes_scanned = 0
+        self.started = time.time()
+
+    def get_stats(self, limit: int = 10, sort_by: str = 'total_time') -> Dict[str, Any]:
+        """Get profiling summary with the top costly rules"""
+        rule_time = sum(profile.total_time for profile in list(self.rules.values()))
+        return {
+            'enabled': True,
+            'profiling_seconds': time.time() - self.started,
+            'rules_profiled': len(self.rules),
+            'rule_time_ms': rule_time * 1000,
+            'literal_scans': self.literal_scans,
+            'literal_scan_time_ms': self.literal_scan_time * 1000,
+            'literal_bytes_scanned': self.literal_bytes_scanned,
+            'top_rules': self.top(limit, sort_by)
+        }
+
+    def dump(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Write the full profile as JSON, for ``rule_profiler.py <path>``"""
+        data = self.get_stats(limit=None)
+        data['generated'] = time.time()
+        if extra:
+            data.update(extra)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def format_report(entries: List[Dict[str, Any]], sort_by: str = 'total_time') -> str:
+    """Render rule profiles as a ranked text table"""
+    lines = [f"Rule profile (sorted by {sort_by})",
+             f"{'Num':>4}  {'Signature':<14} {'Type':<6} {'Evals':>10} {'Matches':>9} "
+             f"{'Total ms':>10} {'Avg us':>9} {'Max us':>9} {'Bytes':>12}  Name"]
+    for number, entry in enumerate(entries, 1):
+        lines.append(
+            f"{number:>4}  {entry['signature_id']:<14} {entry['pattern_type']:<6} "
+            f"{entry['evaluations']:>10} {entry['matches']:>9} "
+            f"{entry['total_time'] * 1e3:>10.2f} {entry['avg_time'] * 1e6:>9.2f} "
+            f"{entry['max_time'] * 1e6:>9.1f} {entry['bytes_scanned']:>12}  {entry['name']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the most costly rules from a rule profile dump')
+    parser.add_argument('profile', help='JSON file written by SignatureDetector.dump_rule_profile()')
+    parser.add_argument('--top', type=int, default=20, help='Number of rules to show (0 for all)')
+    parser.add_argument('--sort', choices=SORT_KEYS, default='total_time', help='Ranking column')
+    args = parser.parse_args()
+
+    with open(args.profile) as f:
+        data = json.load(f)
+
+    entries = sorted(data.get('top_rules', []), key=lambda entry: entry[args.sort], reverse=True)
+    if args.top:
+        entries = entries[:args.top]
+    print(format_report(entries, args.sort))
+    print(f"\n{data.get('rules_profiled', 0)} rules profiled over "
+          f"{data.get('profiling_seconds', 0):.1f}s: {data.get('rule_time_ms', 0):.1f} ms in rules, "
+          f"{data.get('literal_scan_time_ms', 0):.1f} ms in {data.get('literal_scans', 0)} literal scans")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Ruleset Generations for IDS/IPS System
+Immutable compiled snapshots of the signature set, published by reference swap
+"""
+
+import os
+import re
+import sys
+import time
+import pickle
+import hashlib
+import dataclasses
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+try:
+    from detection_engine.multi_pattern import MultiPatternMatcher
+    from detection_engine.regex_prefilter import extract_literal_factors
+    from detection_engine.signature_index import SignatureIndex
+    from detection_engine.regex_backend import RegexBackend, is_linear
+    from detection_engine.payload_views import PAYLOAD_VIEWS
+except ImportError:
+    from multi_pattern import MultiPatternMatcher
+    from regex_prefilter import extract_literal_factors
+    from signature_index import SignatureIndex
+    from regex_backend import RegexBackend, is_linear
+    from payload_views import PAYLOAD_VIEWS
+
+# Pattern types matched as literals by the multi-pattern automaton
+LITERAL_PATTERN_TYPES = ("STRING", "HEX")
+
+# FLAGS signatures name TCP flags ("SYN", "PSH|ACK") that must all be set on the packet
+TCP_FLAG_NAMES = frozenset(("FIN", "SYN", "RST", "PSH", "ACK", "URG", "ECE", "CWR"))
+
+# Bump whenever compiled artifacts change shape or meaning; older cache files are ignored
+CACHE_VERSION = 3
+
+# Used when no backend is given
+STDLIB_BACKEND = RegexBackend()
+
+
+def compile_bytes_regex(pattern: str) -> Optional[re.Pattern]:
+    """
+    Compile a regex for matching payload bytes directly
+
+    Only ASCII patterns are compiled (\\w, \\s and (?i) then use ASCII
+    rules); others return None and run on decoded payload text.
+    """
+    if not pattern.isascii():
+        return None
+    try:
+        return re.compile(pattern.encode('ascii'))
+    except re.error:
+        return None
+
+
+@dataclass(frozen=True)
+class CompiledSignature:
+    """
+    A signature with everything the detector needs to match it
+
+    Regexes are kept as (pattern, flags) sources; ``compiled`` holds the
+    (text, bytes) pattern objects when they were compiled up front. Entries
+    loaded from the cache carry only the sources, and the generation built
+    from them compiles what the packet path needs (see precompile()).
+    """
+    signature: Any
+    text_regex: Optional[Tuple[str, int]] = None  # REGEX on decoded text
+    byte_regex: Optional[Tuple[bytes, int]] = None  # REGEX/STRING/HEX on payload bytes
+    factors: Optional[frozenset] = None  # required literal factors of a bytes REGEX
+    required_flags: Optional[frozenset] = None  # FLAGS
+    compiled: Tuple[Optional[re.Pattern], Optional[re.Pattern]] = field(
+        default=(None, None), compare=False, repr=False)
+
+    def to_cache(self) -> Tuple:
+        return (self.signature, self.text_regex, self.byte_regex, self.factors, self.required_flags)
+
+
+def compile_signature(signature, backend: Optional[RegexBackend] = None) -> CompiledSignature:
+    """
+    Compile one signature
+
+    Older databases wrote TCP flag checks as STRING patterns matched against
+    header text; those come back as a FLAGS copy of the signature (the
+    original is left untouched). Raises re.error or ValueError for patterns
+    that cannot be compiled or an unknown payload view; the stdlib ``re``
+    syntax is the reference whatever ``backend`` the patterns are then
+    compiled with.
+    """
+    backend = backend or STDLIB_BACKEND
+    if signature.view not in PAYLOAD_VIEWS:
+        raise ValueError(f"unknown payload view {signature.view!r}, expected one of {', '.join(PAYLOAD_VIEWS)}")
+    if (signature.pattern_type == "STRING" and signature.pattern
+            and set(signature.pattern.upper().split("|")) <= TCP_FLAG_NAMES):
+        signature = dataclasses.replace(signature, pattern_type="FLAGS")
+
+    if signature.pattern_type == "REGEX":
+        re.compile(signature.pattern)
+        text_pattern = backend.compile(signature.pattern)
+        byte_pattern = compile_bytes_regex(signature.pattern)
+        if byte_pattern is None:
+            return CompiledSignature(signature, text_regex=(signature.pattern, 0),
+                                     compiled=(text_pattern, None))
+        return CompiledSignature(signature, text_regex=(signature.pattern, 0),
+                                 byte_regex=(byte_pattern.pattern, 0),
+                                 factors=extract_literal_factors(signature.pattern) or None,
+                                 compiled=(text_pattern, backend.compile(byte_pattern.pattern)))
+
+    if signature.pattern_type in LITERAL_PATTERN_TYPES:
+        # STRING ignores ASCII case, HEX is exact
+        flags = re.IGNORECASE if signature.pattern_type == "STRING" else 0
+        byte_regex = (re.escape(signature.literal_bytes()), flags)
+        return CompiledSignature(signature, byte_regex=byte_regex, compiled=(None, re.compile(*byte_regex)))
+
+    if signature.pattern_type == "FLAGS":
+        flags = frozenset(signature.pattern.upper().split("|"))
+        if not flags <= TCP_FLAG_NAMES:
+            raise ValueError(f"unknown TCP flags {sorted(flags - TCP_FLAG_NAMES)}")
+        return CompiledSignature(signature, required_flags=flags)
+
+    return CompiledSignature(signature)
+
+
+class LazyPatterns(Mapping):
+    """
+    Read-only {signature_id: compiled regex} that compiles each pattern on first lookup.
+
+    Patterns compiled up front or by precompile() are seeded in; the rest
+    cost nothing until a packet reaches them, and are compiled with
+    ``backend``. Concurrent first lookups may both compile; the results are
+    equivalent.
+    """
+
+    def __init__(self, sources: Dict[str, Tuple[Any, int]], compiled: Dict[str, re.Pattern],
+                 backend: Optional[RegexBackend] = None):
+        self._sources = sources
+        self._compiled = compiled
+        self._compile = (backend or STDLIB_BACKEND).compile
+
+    def get(self, signature_id, default=None):
+        pattern = self._compiled.get(signature_id)
+        if pattern is None:
+            source = self._sources.get(signature_id)
+            if source is None:
+                return default
+            pattern = self._compiled[signature_id] = self._compile(*source)
+        return pattern
+
+    def __getitem__(self, signature_id) -> re.Pattern:
+        pattern = self.get(signature_id)
+        if pattern is None:
+            raise KeyError(signature_id)
+        return pattern
+
+    def __contains__(self, signature_id) -> bool:
+        return signature_id in self._sources
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sources)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def precompile(self, signature_ids: Iterable[str]) -> int:
+        """Compile the given patterns now (before the table is published); returns how many were compiled"""
+        compiled = 0
+        for signature_id in signature_ids:
+            if signature_id not in self._compiled and signature_id in self._sources:
+                self._compiled[signature_id] = self._compile(*self._sources[signature_id])
+                compiled += 1
+        return compiled
+
+    @property
+    def compiled_count(self) -> int:
+        return len(self._compiled)
+
+    @property
+    def linear_count(self) -> int:
+        """Patterns compiled so far by a linear-time engine"""
+        return sum(1 for pattern in list(self._compiled.values()) if is_linear(pattern))
+
+
+@dataclass(frozen=True)
+class RulesetGeneration:
+    """
+    One compiled, read-only version of the signature set.
+
+    A generation is fully built (literal matcher, dispatch index, prefilter
+    tables) before it is published, and never changes afterwards: the
+    database swaps in a new generation instead, so a detector that took a
+    reference sees one consistent ruleset for as long as it holds it. Only
+    the regex tables may fill in lazily, which does not change their contents.
+    There is one literal matcher per payload view that signatures use;
+    "raw" is always present.
+    """
+    generation: int
+    signatures: Mapping[str, Any]
+    compiled: Mapping[str, CompiledSignature]
+    compiled_patterns: LazyPatterns
+    byte_patterns: LazyPatterns
+    regex_factors: Mapping[str, frozenset]
+    required_flags: Mapping[str, frozenset]
+    literal_matchers: Mapping[str, MultiPatternMatcher]
+    dispatch_index: SignatureIndex
+    compile_seconds: float
+    built_at: float
+    source: str = ""
+
+    def precompile(self) -> int:
+        """
+        Compile every regex the packet path evaluates: the bytes (else text)
+        regex of REGEX signatures and the HEX regexes. STRING regexes are
+        left lazy, as the literal matcher already decides those signatures.
+        Returns how many patterns were compiled.
+        """
+        text_ids, byte_ids = [], []
+        for signature_id, entry in self.compiled.items():
+            pattern_type = entry.signature.pattern_type
+            if pattern_type == "REGEX":
+                (byte_ids if entry.byte_regex is not None else text_ids).append(signature_id)
+            elif pattern_type == "HEX":
+                byte_ids.append(signature_id)
+        return self.compiled_patterns.precompile(text_ids) + self.byte_patterns.precompile(byte_ids)
+
+    @property
+    def literal_matcher(self) -> MultiPatternMatcher:
+        """Literal matcher of the raw payload"""
+        return self.literal_matchers['raw']
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get generation summary"""
+        return {
+            'generation': self.generation,
+            'signatures': len(self.signatures),
+            'compile_ms': round(self.compile_seconds * 1000, 3),
+            'built_at': self.built_at,
+            'source': self.source,
+            'literal_patterns': sum(matcher.pattern_count for matcher in self.literal_matchers.values()),
+            'payload_views': sorted(self.literal_matchers),
+            'indexed_signatures': self.dispatch_index.signature_count,
+            'regexes': len(self.compiled_patterns) + len(self.byte_patterns),
+            'regexes_compiled': self.compiled_patterns.compiled_count + self.byte_patterns.compiled_count,
+            'regexes_linear': self.compiled_patterns.linear_count + self.byte_patterns.linear_count
+        }
+
+
+def _column(compiled, attribute: str) -> Mapping[str, Any]:
+    """Read-only {signature_id: value} of one CompiledSignature field, skipping unset values"""
+    column = {}
+    for signature_id, entry in compiled.items():
+        value = getattr(entry, attribute)
+        if value is not None:
+            column[signature_id] = value
+    return MappingProxyType(column)
+
+
+def _patterns(compiled, attribute: str, position: int, backend: Optional[RegexBackend]) -> LazyPatterns:
+    sources = {}
+    seeded = {}
+    for signature_id, entry in compiled.items():
+        source = getattr(entry, attribute)
+        if source is not None:
+            sources[signature_id] = source
+            if entry.compiled[position] is not None:
+                seeded[signature_id] = entry.compiled[position]
+    return LazyPatterns(sources, seeded, backend)
+
+
+def _assemble(compiled: Dict[str, CompiledSignature], matchers: Dict[str, MultiPatternMatcher], index: SignatureIndex,
+              generation: int, source: str, started: float,
+              backend: Optional[RegexBackend]) -> RulesetGeneration:
+    return RulesetGeneration(
+        generation=generation,
+        signatures=MappingProxyType({signature_id: entry.signature for signature_id, entry in compiled.items()}),
+        compiled=MappingProxyType(compiled),
+        compiled_patterns=_patterns(compiled, 'text_regex', 0, backend),
+        byte_patterns=_patterns(compiled, 'byte_regex', 1, backend),
+        regex_factors=_column(compiled, 'factors'),
+        required_flags=_column(compiled, 'required_flags'),
+        literal_matchers=MappingProxyType(matchers),
+        dispatch_index=index,
+        compile_seconds=time.perf_counter() - started,
+        built_at=time.time(),
+        source=source
+    )
+
+
+def build_generation(compiled: Iterable[CompiledSignature], generation: int,
+                     source: str = "", started: Optional[float] = None,
+                     backend: Optional[RegexBackend] = None) -> RulesetGeneration:
+    """
+    Build a ruleset generation from compiled signatures (in insertion order)
+
+    The literal matchers cover STRING/HEX patterns and REGEX factors, one
+    matcher per payload view the signatures match against; the dispatch
+    index covers every other signature. Disabled signatures are
+    included in both, and callers check ``enabled``. ``started`` is the
+    perf_counter() value compile time is measured from (defaults to now,
+    so it covers only the matcher and index). Regexes not compiled yet are
+    compiled with ``backend`` on first use.
+    """
+    if started is None:
+        started = time.perf_counter()
+    compiled = {entry.signature.id: entry for entry in compiled}
+
+    pairs = {'raw': []}
+    for signature_id, entry in compiled.items():
+        view_pairs = pairs.setdefault(entry.signature.view, [])
+        if entry.signature.pattern_type in LITERAL_PATTERN_TYPES:
+            view_pairs.append((entry.signature.literal_bytes(), signature_id))
+        elif entry.factors:
+            view_pairs.extend((factor.encode('ascii'), signature_id) for factor in entry.factors)
+
+    matchers = {view: MultiPatternMatcher(view_pairs, ascii_case_insensitive=True)
+                for view, view_pairs in pairs.items() if view_pairs or view == 'raw'}
+    index = SignatureIndex(entry.signature for entry in compiled.values()
+                           if entry.signature.pattern_type not in LITERAL_PATTERN_TYPES)
+    return _assemble(compiled, matchers, index, generation, source, started, backend)
+
+
+def ruleset_cache_key(content: bytes) -> str:
+    """Cache key of a ruleset file: its content hash plus everything the compiled form depends on"""
+    digest = hashlib.sha256(content)
+    digest.update(f"|v{CACHE_VERSION}|{sys.version_info[0]}.{sys.version_info[1]}".encode())
+    return digest.hexdigest()
+
+
+def write_ruleset_cache(path: Path, key: str, generation: RulesetGeneration, last_update: Any):
+    """
+    Write a generation's compiled artifacts to ``path``
+
+    Must be called before the generation is published: the matcher and the
+    index gain cached entries while packets are matched. The file is written
+    to a temporary name and renamed, so concurrent readers (other worker
+    processes starting up) see either the old or the new cache.
+    """
+    data = {
+        'version': CACHE_VERSION,
+        'key': key,
+        'last_update': last_update,
+        'entries': [entry.to_cache() for entry in generation.compiled.values()],
+        'literal_matchers': dict(generation.literal_matchers),
+        'dispatch_index': generation.dispatch_index
+    }
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def read_ruleset_cache(path: Path, key: str, generation: int, source: str = "",
+                       backend: Optional[RegexBackend] = None) -> Optional[Tuple[RulesetGeneration, Any]]:
+    """
+    Load a generation from a cache file written for ``key``
+
+    Returns (generation, last_update), or None when the file is missing or
+    was written for another ruleset, cache version or Python version. The
+    regexes the packet path evaluates are compiled before returning, so
+    that cost stays at startup instead of landing on the first packets. The
+    cache is a pickle and gets the same trust as the ruleset file next to it.
+    """
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(data, dict) or data.get('version') != CACHE_VERSION or data.get('key') != key:
+        return None
+
+    compiled = {}
+    for signature, text_regex, byte_regex, factors, required_flags in data['entries']:
+        compiled[signature.id] = CompiledSignature(signature, text_regex, byte_regex, factors, required_flags)
+    ruleset = _assemble(compiled, data['literal_matchers'], data['dispatch_index'], generation, source, started,
+                        backend)
+    ruleset.precompile()
+    return ruleset, data['last_update']
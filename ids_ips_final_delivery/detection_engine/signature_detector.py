@@ -9,11 +9,36 @@ import re
 import time
 import logging
 import threading
-from typing import Dict, List, Optional, Set, Tuple, Any
-from dataclasses import dataclass, asdict
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Any
+from dataclasses import dataclass, asdict, fields
 from datetime import datetime, timedelta
 from pathlib import Path
 import hashlib
+import os
+
+try:
+    from detection_engine.multi_pattern import MultiPatternMatcher
+    from detection_engine.ruleset import (LITERAL_PATTERN_TYPES, CompiledSignature,
+                                          RulesetGeneration, build_generation, compile_signature,
+                                          read_ruleset_cache, ruleset_cache_key, write_ruleset_cache)
+    from detection_engine.signature_index import SignatureIndex, packet_direction, signature_key
+    from detection_engine.rule_profiler import RuleProfiler
+    from detection_engine.alert_limiter import DedupCache, RateLimiter
+    from detection_engine.regex_backend import get_regex_backend, is_linear
+    from detection_engine.payload_views import PayloadViews
+    from detection_engine.clock import EventClock
+except ImportError:
+    from multi_pattern import MultiPatternMatcher
+    from ruleset import (LITERAL_PATTERN_TYPES, CompiledSignature,
+                         RulesetGeneration, build_generation, compile_signature,
+                         read_ruleset_cache, ruleset_cache_key, write_ruleset_cache)
+    from signature_index import SignatureIndex, packet_direction, signature_key
+    from rule_profiler import RuleProfiler
+    from alert_limiter import DedupCache, RateLimiter
+    from regex_backend import get_regex_backend, is_linear
+    from payload_views import PayloadViews
+    from clock import EventClock
 
 @dataclass
 class Signature:
@@ -24,11 +49,12 @@ class Signature:
     severity: str  # LOW, MEDIUM, HIGH, CRITICAL
     category: str  # MALWARE, EXPLOIT, RECONNAISSANCE, etc.
     pattern: str
-    pattern_type: str  # REGEX, STRING, HEX
+    pattern_type: str  # REGEX, STRING, HEX, FLAGS
     protocol: Optional[str] = None
     src_port: Optional[int] = None
     dst_port: Optional[int] = None
     direction: str = "ANY"  # INBOUND, OUTBOUND, ANY
+    view: str = "raw"  # payload view matched: raw, url_decoded, lowercase, collapsed, normalized
     enabled: bool = True
     created_date: str = ""
     updated_date: str = ""
@@ -41,6 +67,17 @@ class Signature:
             self.created_date = datetime.now().isoformat()
         if not self.updated_date:
             self.updated_date = self.created_date
+    
+    def __reduce__(self):
+        # Unpickled (from the ruleset cache) through __init__: instances built that way get
+        # CPython's compact attribute storage, and the packet path reads their fields constantly
+        return (self.__class__, tuple(getattr(self, f.name) for f in fields(self)))
+    
+    def literal_bytes(self) -> bytes:
+        """Byte sequence searched in the payload (STRING and HEX signatures)"""
+        if self.pattern_type == "HEX":
+            return bytes.fromhex(self.pattern.replace(" ", ""))
+        return self.pattern.encode('utf-8')
 
 @dataclass
 class DetectionResult:
@@ -64,21 +101,75 @@ class DetectionResult:
             self.additional_info = {}
 
 class SignatureDatabase:
-    """Manages signature database operations"""
+    """
+    Manages signature database operations
+    
+    The compiled ruleset is an immutable RulesetGeneration. Changes build a
+    new generation (under the writer lock, off the packet path) and publish
+    it with a single reference swap; readers never lock and always see one
+    complete generation. With ``watch_interval`` set, the database file is
+    polled and reloaded in the background when it changes. Compiled
+    generations are cached on disk (``cache_path``, keyed by a hash of the
+    file's content), so restarts and worker processes skip compiling.
+    """
     
-    def __init__(self, db_path: str = "signatures.json"):
+    def __init__(self, db_path: str = "signatures.json", watch_interval: Optional[float] = None,
+                 cache_path: Optional[str] = None, use_cache: bool = True, regex_backend: str = "auto"):
         self.db_path = Path(db_path)
-        self.signatures: Dict[str, Signature] = {}
-        self.compiled_patterns: Dict[str, re.Pattern] = {}
+        # Compiled ruleset cache, next to the database file unless given
+        if use_cache:
+            self.cache_path = Path(cache_path) if cache_path else self.db_path.with_name(self.db_path.name + ".cache")
+        else:
+            self.cache_path = None
+        self.cache_stats = {'hits': 0, 'misses': 0, 'writes': 0}
         self.last_update = None
         self.logger = logging.getLogger(__name__)
-        self._lock = threading.RLock()
+        # Engine signature regexes are compiled with: "re", "re2" (linear time) or "auto"
+        self.regex_backend = get_regex_backend(regex_backend, self.logger)
+        self._lock = threading.RLock()  # serializes writers; readers use the published generation
+        self._generation: RulesetGeneration = build_generation((), 0, source="empty")
+        self.generation_history = deque(maxlen=20)
+        
+        # File watching
+        self._file_state = None  # (mtime_ns, size) last loaded or saved
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
         
         # Load signatures if database exists
         if self.db_path.exists():
             self.load_signatures()
         else:
             self._create_default_signatures()
+        
+        if watch_interval:
+            self.start_watching(watch_interval)
+    
+    @property
+    def generation(self) -> RulesetGeneration:
+        """The current ruleset generation (take one reference per unit of work)"""
+        return self._generation
+    
+    @property
+    def signatures(self) -> Mapping[str, Signature]:
+        return self._generation.signatures
+    
+    @property
+    def compiled_patterns(self) -> Mapping[str, re.Pattern]:
+        return self._generation.compiled_patterns
+    
+    @property
+    def byte_patterns(self) -> Mapping[str, re.Pattern]:
+        """REGEX signatures that compile as bytes regexes, STRING (ASCII case-insensitive) and HEX needles"""
+        return self._generation.byte_patterns
+    
+    @property
+    def regex_factors(self) -> Mapping[str, frozenset]:
+        """Literals every match of a bytes REGEX signature contains (one of them)"""
+        return self._generation.regex_factors
+    
+    @property
+    def required_flags(self) -> Mapping[str, frozenset]:
+        return self._generation.required_flags
     
     def _create_default_signatures(self):
         """Create default signature database with common attack patterns"""
@@ -93,7 +184,8 @@ class SignatureDatabase:
                 pattern=r"(?i)(union\s+select|union\s+all\s+select)",
                 pattern_type="REGEX",
                 protocol="TCP",
-                dst_port=80
+                dst_port=80,
+                view="url_decoded"
             ),
             Signature(
                 id="SQL_002",
@@ -104,7 +196,8 @@ class SignatureDatabase:
                 pattern=r"(?i)(or\s+1\s*=\s*1|or\s+'1'\s*=\s*'1')",
                 pattern_type="REGEX",
                 protocol="TCP",
-                dst_port=80
+                dst_port=80,
+                view="url_decoded"
             ),
             
             # XSS signatures
@@ -117,7 +210,8 @@ class SignatureDatabase:
                 pattern=r"(?i)<script[^>]*>.*?</script>",
                 pattern_type="REGEX",
                 protocol="TCP",
-                dst_port=80
+                dst_port=80,
+                view="url_decoded"
             ),
             
             # Command Injection signatures
@@ -140,7 +234,7 @@ class SignatureDatabase:
                 severity="MEDIUM",
                 category="RECONNAISSANCE",
                 pattern="SYN",
-                pattern_type="STRING",
+                pattern_type="FLAGS",
                 protocol="TCP"
             ),
             
@@ -178,7 +272,7 @@ class SignatureDatabase:
                 severity="HIGH",
                 category="DDOS",
                 pattern="SYN",
-                pattern_type="STRING",
+                pattern_type="FLAGS",
                 protocol="TCP"
             ),
             
@@ -189,10 +283,11 @@ class SignatureDatabase:
                 description="Detects directory traversal attempts",
                 severity="MEDIUM",
                 category="INJECTION",
-                pattern=r"(?i)(\.\.\/|\.\.\\|%2e%2e%2f|%2e%2e%5c)",
+                pattern=r"\.\.[/\\]",
                 pattern_type="REGEX",
                 protocol="TCP",
-                dst_port=80
+                dst_port=80,
+                view="url_decoded"
             ),
             
             # Buffer Overflow signatures
@@ -208,40 +303,76 @@ class SignatureDatabase:
             )
         ]
         
-        for sig in default_signatures:
-            self.add_signature(sig)
+        self.add_signatures(default_signatures, source="defaults")
         
         self.save_signatures()
         self.logger.info(f"Created default signature database with {len(default_signatures)} signatures")
     
     def add_signature(self, signature: Signature) -> bool:
         """Add a new signature to the database"""
+        return self.add_signatures([signature]) == 1
+    
+    def add_signatures(self, signatures: Iterable[Signature], source: str = "add") -> int:
+        """
+        Add or replace signatures and publish one new generation for all of them
+        
+        Returns the number of signatures added; invalid ones are logged and skipped.
+        """
         with self._lock:
-            try:
-                # Compile pattern for regex signatures
-                if signature.pattern_type == "REGEX":
-                    compiled_pattern = re.compile(signature.pattern)
-                    self.compiled_patterns[signature.id] = compiled_pattern
-                
-                self.signatures[signature.id] = signature
+            started = time.perf_counter()
+            entries = dict(self._generation.compiled)
+            added = 0
+            for signature in signatures:
+                entry = self._compile(signature)
+                if entry is not None:
+                    entries[signature.id] = entry
+                    added += 1
+                    self.logger.info(f"Added signature: {signature.id} - {signature.name}")
+            if added:
+                self._publish(entries.values(), source, started)
                 self.last_update = time.time()
-                self.logger.info(f"Added signature: {signature.id} - {signature.name}")
-                return True
-                
-            except re.error as e:
-                self.logger.error(f"Invalid regex pattern in signature {signature.id}: {e}")
-                return False
-            except Exception as e:
-                self.logger.error(f"Error adding signature {signature.id}: {e}")
-                return False
+            return added
+    
+    def _compile(self, signature: Signature, previous: Optional[RulesetGeneration] = None
+                 ) -> Optional[CompiledSignature]:
+        """Compile a signature, reusing ``previous``'s entry when the signature is unchanged"""
+        if previous is not None:
+            entry = previous.compiled.get(signature.id)
+            if entry is not None and entry.signature == signature:
+                return entry
+        try:
+            entry = compile_signature(signature, self.regex_backend)
+        except re.error as e:
+            self.logger.error(f"Invalid regex pattern in signature {signature.id}: {e}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Error adding signature {signature.id}: {e}")
+            return None
+        if entry.signature.pattern_type != signature.pattern_type:
+            self.logger.info(f"Signature {signature.id}: STRING flag pattern treated as FLAGS")
+        return entry
+    
+    def _publish(self, entries: Iterable[CompiledSignature], source: str,
+                 started: Optional[float] = None) -> RulesetGeneration:
+        """Build the next generation and swap it in (caller holds the writer lock)"""
+        return self._swap(build_generation(entries, self._generation.generation + 1, source, started,
+                                           self.regex_backend))
+    
+    def _swap(self, generation: RulesetGeneration) -> RulesetGeneration:
+        self._generation = generation
+        self.generation_history.append(generation.get_stats())
+        self.logger.info(f"Published ruleset generation {generation.generation}: "
+                         f"{len(generation.signatures)} signatures built in "
+                         f"{generation.compile_seconds * 1000:.1f} ms ({generation.source})")
+        return generation
     
     def remove_signature(self, signature_id: str) -> bool:
         """Remove a signature from the database"""
         with self._lock:
-            if signature_id in self.signatures:
-                del self.signatures[signature_id]
-                if signature_id in self.compiled_patterns:
-                    del self.compiled_patterns[signature_id]
+            if signature_id in self._generation.compiled:
+                entries = dict(self._generation.compiled)
+                del entries[signature_id]
+                self._publish(entries.values(), "remove")
                 self.last_update = time.time()
                 self.logger.info(f"Removed signature: {signature_id}")
                 return True
@@ -267,39 +398,150 @@ class SignatureDatabase:
         """Get all enabled signatures"""
         return [sig for sig in self.signatures.values() if sig.enabled]
     
+    def get_literal_matcher(self) -> MultiPatternMatcher:
+        """
+        Get the byte automaton over the STRING/HEX patterns and REGEX factors
+        of signatures matching the raw payload (other payload views have
+        their own, in ``generation.literal_matchers``)
+        
+        Values are signature IDs: a STRING signature's ID means it matched,
+        a HEX signature's ID means it may have matched (the automaton folds
+        ASCII case, HEX needles are exact), and a REGEX signature's ID means
+        one of its required literal factors occurs and the regex has to run.
+        Disabled signatures are included; callers check ``enabled`` on a hit.
+        """
+        return self._generation.literal_matcher
+    
+    def get_dispatch_index(self) -> SignatureIndex:
+        """
+        Get the dispatch index over all non-literal (REGEX, FLAGS) signatures
+        
+        STRING/HEX signatures are found through the literal matcher instead.
+        Disabled signatures are included; callers check ``enabled``.
+        """
+        return self._generation.dispatch_index
+    
     def load_signatures(self) -> bool:
-        """Load signatures from JSON file"""
+        """
+        Load signatures from JSON file
+        
+        The new generation replaces the current one only once it is fully
+        compiled; if the file cannot be read the current ruleset stays active.
+        A compiled ruleset cache matching the file's content is loaded instead
+        of compiling (only the regexes packets evaluate are compiled then);
+        otherwise unchanged signatures reuse their compiled patterns and the
+        cache is rewritten.
+        """
         try:
-            with open(self.db_path, 'r') as f:
-                data = json.load(f)
-            
-            self.signatures.clear()
-            self.compiled_patterns.clear()
-            
-            for sig_data in data.get('signatures', []):
-                signature = Signature(**sig_data)
-                self.add_signature(signature)
-            
-            self.last_update = data.get('last_update', time.time())
-            self.logger.info(f"Loaded {len(self.signatures)} signatures from {self.db_path}")
-            return True
+            with self._lock:
+                started = time.perf_counter()
+                self._file_state = self._stat_file()
+                content = self.db_path.read_bytes()
+                generation = self._load_cache(content)
+                
+                if generation is None:
+                    data = json.loads(content)
+                    previous = self._generation
+                    entries = []
+                    for sig_data in data.get('signatures', []):
+                        entry = self._compile(Signature(**sig_data), previous)
+                        if entry is not None:
+                            entries.append(entry)
+                    
+                    generation = build_generation(entries, previous.generation + 1,
+                                                  f"load {self.db_path.name}", started, self.regex_backend)
+                    self.last_update = data.get('last_update', time.time())
+                    self._write_cache(content, generation)
+                
+                self._swap(generation)
+                self.logger.info(f"Loaded {len(generation.signatures)} signatures from {self.db_path}")
+                return True
             
         except Exception as e:
             self.logger.error(f"Error loading signatures: {e}")
             return False
     
+    def _load_cache(self, content: bytes) -> Optional[RulesetGeneration]:
+        if not self.cache_path:
+            return None
+        try:
+            cached = read_ruleset_cache(self.cache_path, ruleset_cache_key(content),
+                                        self._generation.generation + 1, f"cache {self.cache_path.name}",
+                                        self.regex_backend)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable ruleset cache {self.cache_path}: {e}")
+            cached = None
+        if cached is None:
+            self.cache_stats['misses'] += 1
+            return None
+        generation, self.last_update = cached
+        self.cache_stats['hits'] += 1
+        return generation
+    
+    def _write_cache(self, content: bytes, generation: RulesetGeneration):
+        if not self.cache_path:
+            return
+        try:
+            write_ruleset_cache(self.cache_path, ruleset_cache_key(content), generation, self.last_update)
+            self.cache_stats['writes'] += 1
+        except Exception as e:
+            self.logger.warning(f"Could not write ruleset cache {self.cache_path}: {e}")
+    
+    def reload_async(self) -> threading.Thread:
+        """Reload the database file on a background thread"""
+        thread = threading.Thread(target=self.load_signatures, name="SignatureReload", daemon=True)
+        thread.start()
+        return thread
+    
+    def _stat_file(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.db_path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def start_watching(self, interval: float = 2.0):
+        """Poll the database file every ``interval`` seconds and reload it when it changes"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(interval,),
+                                              name="SignatureWatcher", daemon=True)
+        self._watch_thread.start()
+        self.logger.info(f"Watching {self.db_path} for changes every {interval}s")
+    
+    def stop_watching(self):
+        """Stop the file watcher"""
+        self._watch_stop.set()
+        if self._watch_thread:
+            self._watch_thread.join(timeout=5)
+            self._watch_thread = None
+    
+    def _watch_loop(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            state = self._stat_file()
+            if state is not None and state != self._file_state:
+                self.logger.info(f"Signature file {self.db_path} changed, reloading")
+                self.load_signatures()
+    
     def save_signatures(self) -> bool:
         """Save signatures to JSON file"""
         try:
+            signatures = self._generation.signatures
             data = {
                 'last_update': self.last_update or time.time(),
-                'signatures': [asdict(sig) for sig in self.signatures.values()]
+                'signatures': [asdict(sig) for sig in signatures.values()]
             }
             
-            with open(self.db_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Write a temporary file and rename it, so the watcher never reads a partial file
+            with self._lock:
+                temp_path = self.db_path.with_name(self.db_path.name + ".tmp")
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(temp_path, self.db_path)
+                self._file_state = self._stat_file()
             
-            self.logger.info(f"Saved {len(self.signatures)} signatures to {self.db_path}")
+            self.logger.info(f"Saved {len(signatures)} signatures to {self.db_path}")
             return True
             
         except Exception as e:
@@ -308,30 +550,44 @@ class SignatureDatabase:
     
     def get_stats(self) -> Dict[str, Any]:
         """Get signature database statistics"""
+        generation = self._generation
+        signatures = generation.signatures
         categories = {}
         severities = {}
         enabled_count = 0
         
-        for sig in self.signatures.values():
+        for sig in signatures.values():
             categories[sig.category] = categories.get(sig.category, 0) + 1
             severities[sig.severity] = severities.get(sig.severity, 0) + 1
             if sig.enabled:
                 enabled_count += 1
         
         return {
-            'total_signatures': len(self.signatures),
+            'total_signatures': len(signatures),
             'enabled_signatures': enabled_count,
-            'disabled_signatures': len(self.signatures) - enabled_count,
+            'disabled_signatures': len(signatures) - enabled_count,
             'categories': categories,
             'severities': severities,
-            'last_update': self.last_update
+            'last_update': self.last_update,
+            'ruleset': generation.get_stats(),
+            'ruleset_history': list(self.generation_history),
+            'watching': bool(self._watch_thread and self._watch_thread.is_alive()),
+            'cache': dict(self.cache_stats, path=str(self.cache_path) if self.cache_path else None),
+            'regex_backend': self.regex_backend.name
         }
 
 class SignatureDetector:
-    """Main signature-based detection engine"""
+    """
+    Main signature-based detection engine
+    
+    Duplicate suppression and rate limits count ``clock`` time (packet
+    event time unless given).
+    """
     
-    def __init__(self, signature_db: SignatureDatabase):
+    def __init__(self, signature_db: SignatureDatabase, profile_rules: bool = False,
+                 max_alert_keys: int = 100000, clock=None):
         self.signature_db = signature_db
+        self.clock = clock or EventClock()
         self.logger = logging.getLogger(__name__)
         self.stats = {
             'packets_analyzed': 0,
@@ -341,58 +597,236 @@ class SignatureDetector:
         }
         
         # Detection caching to prevent duplicate alerts
-        self.detection_cache: Dict[str, float] = {}
         self.cache_timeout = 300  # 5 minutes
         
         # Rate limiting for detections
-        self.rate_limits: Dict[str, List[float]] = {}
         self.rate_limit_window = 60  # 1 minute
         self.max_detections_per_window = 10
+        
+        # Both are bounded: at most max_alert_keys keys each, oldest evicted first
+        self.max_alert_keys = max_alert_keys
+        self.configure_alert_limits()
+        
+        # Per REGEX signature: how often the literal prefilter let the regex be skipped
+        self.regex_stats: Dict[str, Dict[str, int]] = {}
+        
+        # Per-signature cost accounting, only present while profiling is enabled
+        self.profiler: Optional[RuleProfiler] = RuleProfiler() if profile_rules else None
+        
+        # Scan budget for backtracking (stdlib re) regexes; linear-time (RE2) ones run unguarded
+        self.regex_max_scan_bytes = 16384  # payload bytes a backtracking regex may scan
+        self.regex_search_budget = 0.005  # seconds; a slower search is an overrun for its rule
+        self.regex_packet_budget = 0.02  # seconds per payload; later backtracking regexes are skipped
+        self.regex_suspend_after = 3  # overruns before a rule stops being evaluated
+        self.regex_suspend_seconds = 300  # how long a suspension lasts
+        self.regex_overruns: Dict[str, Dict[str, Any]] = {}  # flagged rules
+        self.suspended_regex_rules: Dict[str, float] = {}  # signature ID -> resume time (clock time)
+        self.regex_budget_totals = {'searches_skipped': 0, 'packets_over_budget': 0}
+        self._regex_budget_left = self.regex_packet_budget
+    
+    def configure_alert_limits(self, cache_timeout: Optional[float] = None,
+                               rate_limit_window: Optional[float] = None,
+                               max_detections_per_window: Optional[int] = None,
+                               max_alert_keys: Optional[int] = None):
+        """Set duplicate/rate limits (unset arguments keep their value); resets the alert state"""
+        if cache_timeout is not None:
+            self.cache_timeout = cache_timeout
+        if rate_limit_window is not None:
+            self.rate_limit_window = rate_limit_window
+        if max_detections_per_window is not None:
+            self.max_detections_per_window = max_detections_per_window
+        if max_alert_keys is not None:
+            self.max_alert_keys = max_alert_keys
+        
+        # (signature, src, dst) reported within cache_timeout; (signature, src) counts per window
+        self.detection_cache = DedupCache(self.cache_timeout, self.max_alert_keys)
+        self.rate_limits = RateLimiter(self.rate_limit_window, self.max_detections_per_window,
+                                       max_keys=self.max_alert_keys)
+    
+    def enable_profiling(self):
+        """Start recording per-signature evaluation cost"""
+        if self.profiler is None:
+            self.profiler = RuleProfiler()
+            self.logger.info("Rule profiling enabled")
+    
+    def disable_profiling(self) -> Optional[RuleProfiler]:
+        """Stop profiling; returns the profiler with the data recorded so far"""
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            self.logger.info("Rule profiling disabled")
+        return profiler
+    
+    def get_rule_profile(self, limit: int = 10, sort_by: str = 'total_time') -> Dict[str, Any]:
+        """Top costly rules by ``sort_by`` (total_time, avg_time, max_time, evaluations, matches, bytes_scanned)"""
+        profiler = self.profiler
+        if profiler is None:
+            return {'enabled': False}
+        return profiler.get_stats(limit, sort_by)
+    
+    def dump_rule_profile(self, path: str) -> bool:
+        """Write the full rule profile as JSON (show it with detection_engine/rule_profiler.py)"""
+        profiler = self.profiler
+        if profiler is None:
+            self.logger.warning("Rule profiling is not enabled, nothing to dump")
+            return False
+        try:
+            profiler.dump(path, {'packets_analyzed': self.stats['packets_analyzed']})
+            self.logger.info(f"Rule profile written to {path}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing rule profile: {e}")
+            return False
     
     def analyze_packet(self, packet_info) -> List[DetectionResult]:
         """Analyze a packet against all signatures"""
+        return self.analyze_batch([packet_info])[0]
+    
+    def analyze_batch(self, packets: List) -> List[List[DetectionResult]]:
+        """
+        Analyze a batch of packets against all signatures
+        
+        The ruleset generation is fetched once for the whole batch, so every
+        packet in it is matched against the same rules even if a reload
+        publishes a new generation meanwhile. Returns one list of detections
+        per packet, in packet order.
+        """
+        ruleset = self.signature_db.generation
+        return [self._analyze_with_index(packet_info, ruleset) for packet_info in packets]
+    
+    def _analyze_with_index(self, packet_info, ruleset: RulesetGeneration) -> List[DetectionResult]:
+        """
+        Analyze a packet against the signatures that can apply to it
+        
+        REGEX and FLAGS signatures come from the dispatch index, which
+        already applied the protocol/port/direction criteria; STRING/HEX
+        signatures come from one scan of each payload view with its literal
+        matcher. Normalized views are built on first use and shared by
+        every signature that matches against them.
+        """
         self.stats['packets_analyzed'] += 1
+        self.clock.observe(packet_info.timestamp)
         detections = []
         
-        # Get packet content for analysis
-        content = self._extract_content(packet_info)
-        if not content:
-            return detections
-        
-        # Check against all enabled signatures
-        for signature in self.signature_db.get_enabled_signatures():
-            if self._matches_signature_criteria(packet_info, signature):
-                detection = self._check_signature_match(packet_info, signature, content)
-                if detection:
-                    # Check for rate limiting and caching
-                    if self._should_report_detection(detection):
-                        detections.append(detection)
-                        self.stats['detections'] += 1
+        views = self._payload_views(packet_info)
+        profiler = self.profiler
+        self._regex_budget_left = self.regex_packet_budget
+        
+        # One scan per view finds literal signatures and the REGEX signatures whose factors occur
+        hits = set()
+        for view, matcher in ruleset.literal_matchers.items():
+            if not len(matcher):
+                continue
+            if profiler is None:
+                hits |= matcher.search(views.get(view))
+            else:
+                start = time.perf_counter()
+                data = views.get(view)
+                hits |= matcher.search(data)
+                profiler.record_literal_scan(time.perf_counter() - start, len(data))
+        regex_factors = ruleset.regex_factors
+        
+        # (signature, already found by the literal matcher)
+        candidates = [(signature, False) for signature in ruleset.dispatch_index.candidates(
+            packet_info.protocol, packet_info.src_port, packet_info.dst_port,
+            packet_direction(packet_info)) if signature.enabled]
+        for signature_id in sorted(hits):
+            signature = ruleset.signatures.get(signature_id)
+            if (signature and signature.enabled and signature.pattern_type in LITERAL_PATTERN_TYPES
+                    and self._matches_signature_criteria(packet_info, signature)):
+                candidates.append((signature, True))
+        
+        # Check the candidates' patterns
+        for signature, literal_matched in candidates:
+            regex_stats = None
+            if signature.pattern_type == "REGEX":
+                regex_stats = self._get_regex_stats(signature.id)
+                regex_stats['packets_checked'] += 1
+                if signature.id in regex_factors:
+                    if signature.id not in hits:
+                        regex_stats['regex_evaluations_avoided'] += 1
+                        continue
+                    regex_stats['prefilter_hits'] += 1
+                regex_stats['regex_evaluations'] += 1
+            
+            if profiler is None:
+                detection = self._check_signature_match(packet_info, signature, views, ruleset,
+                                                        literal_matched=literal_matched)
+            else:
+                start = time.perf_counter()
+                detection = self._check_signature_match(packet_info, signature, views, ruleset,
+                                                        literal_matched=literal_matched)
+                # FLAGS and literal-matched STRING signatures do not look at the payload
+                scanned = 0 if literal_matched or signature.pattern_type == "FLAGS" else len(views.get(signature.view))
+                profiler.record(signature, time.perf_counter() - start, detection is not None, scanned)
+            if detection:
+                if regex_stats is not None:
+                    regex_stats['regex_matches'] += 1
+                # Check for rate limiting and caching
+                if self._should_report_detection(detection):
+                    detections.append(detection)
+                    self.stats['detections'] += 1
         
         return detections
     
-    def _extract_content(self, packet_info) -> str:
-        """Extract content from packet for analysis"""
-        content_parts = []
-        
-        # Add basic packet information
-        content_parts.append(f"{packet_info.src_ip}:{packet_info.src_port}")
-        content_parts.append(f"{packet_info.dst_ip}:{packet_info.dst_port}")
-        content_parts.append(packet_info.protocol)
+    def _get_regex_stats(self, signature_id: str) -> Dict[str, int]:
+        stats = self.regex_stats.get(signature_id)
+        if stats is None:
+            stats = self.regex_stats[signature_id] = {
+                'packets_checked': 0,
+                'prefilter_hits': 0,
+                'regex_evaluations': 0,
+                'regex_evaluations_avoided': 0,
+                'regex_matches': 0
+            }
+        return stats
+    
+    def get_prefilter_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get per-signature regex prefilter statistics
         
-        if packet_info.flags:
-            content_parts.append(packet_info.flags)
+        prefilter_hit_rate is the share of prefiltered checks where a factor
+        was present (and the regex had to run); signatures without factors
+        always run and report None.
+        """
+        result = {}
+        for signature_id, stats in self.regex_stats.items():
+            entry = dict(stats)
+            factors = self.signature_db.regex_factors.get(signature_id)
+            entry['factors'] = sorted(factors) if factors else []
+            prefiltered = stats['prefilter_hits'] + stats['regex_evaluations_avoided']
+            entry['prefilter_hit_rate'] = stats['prefilter_hits'] / prefiltered if prefiltered else None
+            result[signature_id] = entry
+        return result
+    
+    def _payload_views(self, packet_info) -> PayloadViews:
+        """
+        Normalized views of the packet payload, memoized on the packet
         
-        # If raw packet data is available, include it
-        if packet_info.raw_packet:
+        Other engines analyzing the same packet object reuse the buffers
+        already built.
+        """
+        views = getattr(packet_info, 'payload_views', None)
+        if views is None:
+            views = PayloadViews(self._payload_view(packet_info))
             try:
-                # Try to decode as UTF-8, fallback to hex representation
-                decoded = packet_info.raw_packet.decode('utf-8', errors='ignore')
-                content_parts.append(decoded)
-            except:
-                content_parts.append(packet_info.raw_packet.hex())
+                packet_info.payload_views = views
+            except AttributeError:
+                pass  # packet type without the slot: views live for this analysis only
+        return views
+    
+    def _payload_view(self, packet_info) -> memoryview:
+        """
+        Zero-copy view of the packet payload
         
-        return " ".join(content_parts)
+        raw_packet holds the whole frame, so the payload is its last
+        payload_size bytes; when the sizes disagree the whole buffer is scanned.
+        """
+        raw = packet_info.raw_packet or b""
+        view = memoryview(raw)
+        payload_size = packet_info.payload_size or 0
+        if 0 < payload_size < len(raw):
+            view = view[len(raw) - payload_size:]
+        return view
     
     def _matches_signature_criteria(self, packet_info, signature: Signature) -> bool:
         """Check if packet matches signature criteria (protocol, ports, etc.)"""
@@ -409,40 +843,71 @@ class SignatureDetector:
         if signature.dst_port and signature.dst_port != packet_info.dst_port:
             return False
         
-        # Direction check (simplified - would need more context in real implementation)
-        # For now, we'll assume all packets match direction criteria
+        # Direction check: only packets that know their direction can be excluded
+        direction = packet_direction(packet_info)
+        if direction and signature_key(signature)[3] not in (None, direction):
+            return False
         
         return True
     
-    def _check_signature_match(self, packet_info, signature: Signature, content: str) -> Optional[DetectionResult]:
-        """Check if content matches signature pattern"""
+    def _check_signature_match(self, packet_info, signature: Signature, views: PayloadViews,
+                               ruleset: RulesetGeneration,
+                               literal_matched: bool = False) -> Optional[DetectionResult]:
+        """
+        Check if the signature's payload view matches the signature pattern
+        
+        ``literal_matched`` means the literal matcher already found this
+        STRING signature in the payload, so the search is skipped. HEX hits
+        are always re-checked, as the matcher folds ASCII case.
+        """
         try:
             matched_content = ""
+            # Literal-matched STRING signatures need no regex (left uncompiled when loaded from cache)
+            if literal_matched and signature.pattern_type == "STRING":
+                byte_pattern = None
+            else:
+                byte_pattern = ruleset.byte_patterns.get(signature.id)
+            payload = views.get(signature.view) if signature.pattern_type != "FLAGS" else None
             
             if signature.pattern_type == "REGEX":
-                pattern = self.signature_db.compiled_patterns.get(signature.id)
-                if pattern:
-                    match = pattern.search(content)
-                    if match:
-                        matched_content = match.group(0)
-                    else:
+                if byte_pattern:
+                    match = self._regex_search(signature, byte_pattern, payload)
+                    if not match:
                         return None
+                    matched_content = match.group(0).decode('utf-8', errors='replace')
                 else:
-                    return None
+                    # Non-ASCII pattern: match on the decoded payload
+                    pattern = ruleset.compiled_patterns.get(signature.id)
+                    if not pattern:
+                        return None
+                    match = self._regex_search(signature, pattern, str(payload, 'utf-8', errors='ignore'))
+                    if not match:
+                        return None
+                    matched_content = match.group(0)
                     
             elif signature.pattern_type == "STRING":
-                if signature.pattern.lower() in content.lower():
+                if literal_matched or (byte_pattern and byte_pattern.search(payload)):
                     matched_content = signature.pattern
                 else:
                     return None
                     
             elif signature.pattern_type == "HEX":
-                hex_pattern = signature.pattern.replace(" ", "").lower()
-                if hex_pattern in content.lower():
-                    matched_content = hex_pattern
+                if byte_pattern and byte_pattern.search(payload):
+                    matched_content = signature.pattern
                 else:
                     return None
             
+            elif signature.pattern_type == "FLAGS":
+                required = ruleset.required_flags.get(signature.id)
+                flags = packet_info.flags
+                if required and flags and required <= set(flags.split("|")):
+                    matched_content = flags
+                else:
+                    return None
+            
+            else:
+                return None
+            
             # Create detection result
             detection = DetectionResult(
                 signature_id=signature.id,
@@ -470,6 +935,99 @@ class SignatureDetector:
             self.logger.error(f"Error checking signature {signature.id}: {e}")
             return None
     
+    def _regex_search(self, signature: Signature, pattern, data):
+        """
+        Search ``data`` with a signature regex, within the scan budget
+        
+        Backtracking regexes scan at most regex_max_scan_bytes and share
+        regex_packet_budget seconds per payload; once it is spent, or for
+        suspended rules, the search is skipped (no match). A search slower
+        than regex_search_budget flags its rule, and a rule flagged
+        regex_suspend_after times is suspended for regex_suspend_seconds.
+        Search times are wall time (they measure this process); the
+        suspension runs on the detector's clock, like its alert windows.
+        Python cannot interrupt a running search, so one overrun still costs
+        its full time; the budget bounds what follows it.
+        """
+        if is_linear(pattern):
+            return pattern.search(data)
+        
+        if self.suspended_regex_rules:
+            resume_at = self.suspended_regex_rules.get(signature.id)
+            if resume_at is not None:
+                if self.clock.now() < resume_at:
+                    self.regex_budget_totals['searches_skipped'] += 1
+                    return None
+                self.resume_regex_rule(signature.id)
+        if self._regex_budget_left <= 0:
+            self.regex_budget_totals['searches_skipped'] += 1
+            return None
+        
+        if len(data) > self.regex_max_scan_bytes:
+            data = data[:self.regex_max_scan_bytes]
+        start = time.perf_counter()
+        match = pattern.search(data)
+        elapsed = time.perf_counter() - start
+        
+        self._regex_budget_left -= elapsed
+        if self._regex_budget_left <= 0:
+            self.regex_budget_totals['packets_over_budget'] += 1
+        if elapsed > self.regex_search_budget:
+            self._record_regex_overrun(signature, elapsed, len(data))
+        return match
+    
+    def _record_regex_overrun(self, signature: Signature, elapsed: float, scanned: int):
+        overrun = self.regex_overruns.get(signature.id)
+        if overrun is None:
+            overrun = self.regex_overruns[signature.id] = {
+                'name': signature.name,
+                'pattern': signature.pattern,
+                'overruns': 0,
+                'strikes': 0,  # overruns since the rule was last resumed
+                'suspensions': 0,
+                'worst_ms': 0.0,
+                'worst_payload_bytes': 0,
+                'suspended': False
+            }
+            self.logger.warning(f"Regex signature {signature.id} exceeded its scan budget: "
+                                f"{elapsed * 1000:.1f} ms on {scanned} bytes")
+        overrun['overruns'] += 1
+        overrun['strikes'] += 1
+        if elapsed * 1000 > overrun['worst_ms']:
+            overrun['worst_ms'] = elapsed * 1000
+            overrun['worst_payload_bytes'] = scanned
+        if overrun['strikes'] >= self.regex_suspend_after and not overrun['suspended']:
+            overrun['suspended'] = True
+            overrun['suspensions'] += 1
+            self.suspended_regex_rules[signature.id] = self.clock.now() + self.regex_suspend_seconds
+            self.logger.warning(f"Suspended regex signature {signature.id} for {self.regex_suspend_seconds}s "
+                                f"after {overrun['strikes']} scan budget overruns "
+                                f"(worst {overrun['worst_ms']:.1f} ms)")
+    
+    def resume_regex_rule(self, signature_id: str) -> bool:
+        """Evaluate a suspended regex signature again (it stays flagged, with its strikes reset)"""
+        if self.suspended_regex_rules.pop(signature_id, None) is None:
+            return False
+        overrun = self.regex_overruns.get(signature_id)
+        if overrun is not None:
+            overrun['strikes'] = 0
+            overrun['suspended'] = False
+        self.logger.info(f"Resumed regex signature {signature_id}")
+        return True
+    
+    def get_regex_budget_stats(self) -> Dict[str, Any]:
+        """Scan budget settings, totals and the rules that exceeded it (slowest first)"""
+        flagged = sorted(self.regex_overruns.items(), key=lambda item: item[1]['worst_ms'], reverse=True)
+        return {
+            'backend': self.signature_db.regex_backend.name,
+            'max_scan_bytes': self.regex_max_scan_bytes,
+            'search_budget_ms': self.regex_search_budget * 1000,
+            'packet_budget_ms': self.regex_packet_budget * 1000,
+            **self.regex_budget_totals,
+            'flagged_rules': {signature_id: dict(overrun) for signature_id, overrun in flagged},
+            'suspended_rules': sorted(self.suspended_regex_rules)
+        }
+    
     def _calculate_confidence(self, signature: Signature, matched_content: str) -> float:
         """Calculate confidence score for detection"""
         confidence = 1.0
@@ -497,34 +1055,19 @@ class SignatureDetector:
     
     def _should_report_detection(self, detection: DetectionResult) -> bool:
         """Check if detection should be reported (rate limiting and caching)"""
-        current_time = time.time()
-        
-        # Create cache key
-        cache_key = f"{detection.signature_id}:{detection.src_ip}:{detection.dst_ip}"
+        current_time = self.clock.now()
         
         # Check cache
-        if cache_key in self.detection_cache:
-            if current_time - self.detection_cache[cache_key] < self.cache_timeout:
-                return False
-        
-        # Check rate limiting
-        rate_key = f"{detection.signature_id}:{detection.src_ip}"
-        if rate_key not in self.rate_limits:
-            self.rate_limits[rate_key] = []
-        
-        # Clean old entries
-        self.rate_limits[rate_key] = [
-            t for t in self.rate_limits[rate_key] 
-            if current_time - t < self.rate_limit_window
-        ]
+        cache_key = (detection.signature_id, detection.src_ip, detection.dst_ip)
+        if self.detection_cache.recent(cache_key, current_time):
+            return False
         
-        # Check rate limit
-        if len(self.rate_limits[rate_key]) >= self.max_detections_per_window:
+        # Check rate limiting (counts the detection when allowed)
+        if not self.rate_limits.allow((detection.signature_id, detection.src_ip), current_time):
             return False
         
-        # Update cache and rate limit
-        self.detection_cache[cache_key] = current_time
-        self.rate_limits[rate_key].append(current_time)
+        # Update cache
+        self.detection_cache.add(cache_key, current_time)
         
         return True
     
@@ -545,6 +1088,14 @@ class SignatureDetector:
             if self.stats['packets_analyzed'] > 0 else 0
         )
         
+        stats['regex_evaluations'] = sum(s['regex_evaluations'] for s in self.regex_stats.values())
+        stats['regex_evaluations_avoided'] = sum(
+            s['regex_evaluations_avoided'] for s in self.regex_stats.values())
+        stats['rule_profile'] = self.get_rule_profile()
+        stats['alert_dedup'] = self.detection_cache.get_stats()
+        stats['alert_rate_limit'] = self.rate_limits.get_stats()
+        stats['regex_budget'] = self.get_regex_budget_stats()
+        
         return stats
     
     def reset_stats(self):
@@ -555,6 +1106,9 @@ class SignatureDetector:
             'false_positives': 0,
             'start_time': time.time()
         }
+        self.regex_stats = {}
+        if self.profiler is not None:
+            self.profiler.reset()
 
 # Example usage and testing
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Signature Dispatch Index for IDS/IPS System
+Maps packet protocol, ports and direction to the signatures that can apply to them
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Signature directions that restrict matching; anything else means ANY
+DIRECTIONS = ("INBOUND", "OUTBOUND")
+
+
+def packet_direction(packet_info) -> Optional[str]:
+    """INBOUND/OUTBOUND for packets that know their direction, None when unknown"""
+    direction = getattr(packet_info, 'direction', None)
+    if direction:
+        direction = direction.upper()
+        if direction in DIRECTIONS:
+            return direction
+    return None
+
+
+def signature_key(signature) -> Tuple[Any, Any, Any, Any]:
+    """Index key of a signature: (protocol, dst_port, src_port, direction), None = wildcard"""
+    direction = signature.direction.upper() if signature.direction else None
+    return (signature.protocol or None,
+            signature.dst_port or None,
+            signature.src_port or None,
+            direction if direction in DIRECTIONS else None)
+
+
+class SignatureIndex:
+    """
+    Dispatch index from packet header fields to candidate signatures.
+
+    Signatures are grouped into buckets by (protocol, dst_port, src_port,
+    direction), with None as the wildcard in any position. A lookup merges
+    the few buckets the packet can fall into and memoizes the
+    result per normalized key: values no signature mentions collapse to
+    None, so ephemeral ports do not grow the memo. Candidates come back in
+    signature insertion order, and every candidate satisfies the same
+    protocol/port/direction rules as
+    SignatureDetector._matches_signature_criteria. A packet with no known
+    direction matches signatures of every direction.
+
+    The index is immutable: build a new one when the signature set changes.
+    """
+
+    def __init__(self, signatures: Iterable, memo_limit: int = 65536):
+        """
+        Build the index
+
+        Args:
+            signatures: Signatures to index (typically all non-literal signatures)
+            memo_limit: Max number of memoized lookups before the memo is reset
+        """
+        self._buckets: Dict[Tuple, List] = {}
+        self._position: Dict[str, int] = {}
+        for position, signature in enumerate(signatures):
+            self._position[signature.id] = position
+            self._buckets.setdefault(signature_key(signature), []).append(signature)
+
+        self._protocols = {key[0] for key in self._buckets if key[0] is not None}
+        self._dst_ports = {key[1] for key in self._buckets if key[1] is not None}
+        self._src_ports = {key[2] for key in self._buckets if key[2] is not None}
+        self._directions = {key[3] for key in self._buckets if key[3] is not None}
+
+        self._memo: Dict[Tuple, Tuple] = {}
+        self._memo_limit = memo_limit
+        self.signature_count = len(self._position)
+
+    def candidates(self, protocol: Optional[str], src_port: Optional[int],
+                   dst_port: Optional[int], direction: Optional[str] = None) -> Tuple:
+        """Signatures whose protocol, port and direction criteria the packet satisfies"""
+        if direction is None:
+            direction = 'ANY'  # unknown: every direction applies
+        elif direction not in self._directions:
+            direction = None
+        key = (protocol if protocol in self._protocols else None,
+               dst_port if dst_port in self._dst_ports else None,
+               src_port if src_port in self._src_ports else None,
+               direction)
+        result = self._memo.get(key)
+        if result is None:
+            result = self._lookup(*key)
+            if len(self._memo) >= self._memo_limit:
+                self._memo.clear()
+            self._memo[key] = result
+        return result
+
+    def _lookup(self, protocol, dst_port, src_port, direction) -> Tuple:
+        protocols = (None, protocol) if protocol is not None else (None,)
+        dst_ports = (None, dst_port) if dst_port is not None else (None,)
+        src_ports = (None, src_port) if src_port is not None else (None,)
+        if direction == 'ANY':
+            directions = (None,) + tuple(self._directions)
+        else:
+            directions = (None, direction) if direction is not None else (None,)
+
+        merged = []
+        for p in protocols:
+            for d in dst_ports:
+                for s in src_ports:
+                    for direction_key in directions:
+                        bucket = self._buckets.get((p, d, s, direction_key))
+                        if bucket:
+                            merged.extend(bucket)
+
+        position = self._position
+        merged.sort(key=lambda signature: position[signature.id])
+        return tuple(merged)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get index size"""
+        return {
+            'signatures': self.signature_count,
+            'buckets': len(self._buckets),
+            'wildcard_signatures': len(self._buckets.get((None, None, None, None), ())),
+            'memoized_lookups': len(self._memo)
+        }
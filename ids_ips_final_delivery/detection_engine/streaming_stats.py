@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Streaming Statistics for IDS/IPS System
+Sliding-window accumulators whose updates and queries cost O(1)
+"""
+
+import math
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+class SlidingWindowStats:
+    """
+    Count, sum, mean, sample standard deviation, min and max of the last
+    ``window_size`` values.
+
+    Mean and variance are kept with Welford's update, applied in reverse
+    when a value leaves the window, and the sum is kept alongside; every
+    ``window_size`` evictions they are recomputed from the window, which
+    bounds floating-point drift at an amortized O(1) cost. Min and max come
+    from monotonic deques of candidates (amortized O(1) per update, O(1)
+    per query); pass ``track_extremes=False`` to skip them where only
+    counts, sums and means are needed.
+    """
+    __slots__ = ('window_size', 'track_extremes', '_values', '_sum', '_mean', '_m2',
+                 '_mins', '_maxes', '_added', '_evictions')
+
+    def __init__(self, window_size: int, track_extremes: bool = True):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        self.window_size = window_size
+        self.track_extremes = track_extremes
+        self._values = deque()
+        self._sum = 0
+        self._mean = 0.0
+        self._m2 = 0.0  # sum of squared deviations from the mean
+        self._mins = deque()  # (sequence number, value), values increasing
+        self._maxes = deque()  # (sequence number, value), values decreasing
+        self._added = 0  # sequence number of the next value
+        self._evictions = 0
+
+    def add(self, value):
+        """Add a value, evicting the oldest one if the window is full"""
+        values = self._values
+        if len(values) == self.window_size:
+            self._evict()
+        values.append(value)
+        self._sum += value
+        delta = value - self._mean
+        self._mean += delta / len(values)
+        self._m2 += delta * (value - self._mean)
+
+        if self.track_extremes:
+            sequence = self._added
+            mins = self._mins
+            while mins and mins[-1][1] >= value:
+                mins.pop()
+            mins.append((sequence, value))
+            maxes = self._maxes
+            while maxes and maxes[-1][1] <= value:
+                maxes.pop()
+            maxes.append((sequence, value))
+        self._added += 1
+
+    def extend(self, values: Iterable):
+        for value in values:
+            self.add(value)
+
+    def _evict(self):
+        values = self._values
+        value = values.popleft()
+        self._sum -= value
+        count = len(values)
+        if count:
+            delta = value - self._mean
+            self._mean -= delta / count
+            self._m2 -= delta * (value - self._mean)
+            if self._m2 < 0:
+                self._m2 = 0.0
+        else:
+            self._mean = 0.0
+            self._m2 = 0.0
+
+        if self.track_extremes:
+            sequence = self._added - count - 1
+            if self._mins and self._mins[0][0] == sequence:
+                self._mins.popleft()
+            if self._maxes and self._maxes[0][0] == sequence:
+                self._maxes.popleft()
+
+        self._evictions += 1
+        if self._evictions >= self.window_size:
+            self._resync()
+
+    def _resync(self):
+        """Recompute sum, mean and variance from the window (once per window_size evictions)"""
+        values = self._values
+        self._evictions = 0
+        self._sum = sum(values)
+        if not values:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        mean = self._sum / len(values)
+        self._mean = mean
+        self._m2 = math.fsum((value - mean) ** 2 for value in values)
+
+    def load(self, values: Iterable):
+        """Replace the window with ``values`` (oldest first; only the last window_size are kept)"""
+        self.clear()
+        window = deque(values, maxlen=self.window_size)
+        self._values = deque(window)
+        if self.track_extremes:
+            for sequence, value in enumerate(window):
+                mins = self._mins
+                while mins and mins[-1][1] >= value:
+                    mins.pop()
+                mins.append((sequence, value))
+                maxes = self._maxes
+                while maxes and maxes[-1][1] <= value:
+                    maxes.pop()
+                maxes.append((sequence, value))
+        self._added = len(window)
+        self._resync()
+
+    def clear(self):
+        self._values.clear()
+        self._mins.clear()
+        self._maxes.clear()
+        self._sum = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def count(self) -> int:
+        return len(self._values)
+
+    @property
+    def total(self):
+        return self._sum
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 with fewer than two values)"""
+        count = len(self._values)
+        return self._m2 / (count - 1) if count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self):
+        if not self.track_extremes:
+            raise AttributeError("min is not tracked (track_extremes=False)")
+        return self._mins[0][1] if self._mins else 0
+
+    @property
+    def max(self):
+        if not self.track_extremes:
+            raise AttributeError("max is not tracked (track_extremes=False)")
+        return self._maxes[0][1] if self._maxes else 0
+
+    def values(self) -> List:
+        """The values in the window, oldest first"""
+        return list(self._values)
+
+    def summary(self) -> Dict[str, float]:
+        """mean/std/min/max, as NetworkBaseline reports them"""
+        return {'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
@@ -15,6 +15,11 @@ from collections import defaultdict, deque
 from enum import Enum
 import math
 
+try:
+    from detection_engine.clock import EventClock
+except ImportError:
+    from clock import EventClock
+
 class ThreatLevel(Enum):
     """Threat level enumeration"""
     BENIGN = 0
@@ -63,10 +68,16 @@ class ThreatScore:
             self.mitigation_suggestions = []
 
 class ThreatScoringEngine:
-    """Main threat scoring engine that combines multiple detection methods"""
+    """
+    Main threat scoring engine that combines multiple detection methods
+    
+    Scores and IP history are timestamped with ``clock`` (packet event time
+    unless given).
+    """
     
-    def __init__(self, config_file: str = "threat_scoring_config.json"):
+    def __init__(self, config_file: str = "threat_scoring_config.json", clock=None):
         self.logger = logging.getLogger(__name__)
+        self.clock = clock or EventClock()
         
         # Scoring weights for different detection methods
         self.weights = {
@@ -109,8 +120,8 @@ class ThreatScoringEngine:
         self.ip_history: Dict[str, Dict] = defaultdict(lambda: {
             'scores': deque(maxlen=100),
             'detections': deque(maxlen=50),
-            'first_seen': time.time(),
-            'last_seen': time.time(),
+            'first_seen': self.clock.now(),
+            'last_seen': self.clock.now(),
             'total_detections': 0,
             'max_score': 0.0,
             'avg_score': 0.0
@@ -136,6 +147,9 @@ class ThreatScoringEngine:
         
         self._lock = threading.RLock()
         
+        # Context cleanup once per time window of clock time
+        self.clock.call_every(self.scoring_context['time_window'], self._cleanup_context)
+        
         # Load configuration if available
         self.config_file = config_file
         self.load_config()
@@ -187,7 +201,7 @@ class ThreatScoringEngine:
         """Calculate comprehensive threat score for a packet"""
         
         with self._lock:
-            current_time = time.time()
+            current_time = self.clock.observe(packet_info.timestamp)
             
             # Initialize threat score
             threat_score = ThreatScore(
@@ -601,6 +615,16 @@ class ThreatScoringEngine:
         # Update max score
         self.stats['max_score'] = max(self.stats['max_score'], threat_score.normalized_score)
     
+    def _cleanup_context(self, current_time: float):
+        """Start a new port scan window and drop connection patterns of sources gone quiet"""
+        with self._lock:
+            self.scoring_context['port_scan_tracking'].clear()
+            patterns = self.scoring_context['connection_patterns']
+            cutoff = current_time - self.scoring_context['time_window']
+            for src_ip in list(patterns.keys()):
+                if not patterns[src_ip] or patterns[src_ip][-1]['timestamp'] <= cutoff:
+                    del patterns[src_ip]
+    
     def get_ip_risk_profile(self, ip_address: str) -> Dict[str, Any]:
         """Get comprehensive risk profile for an IP address"""
         history = self.ip_history[ip_address]
@@ -19,6 +19,8 @@ import hashlib
 # Add all component paths
 sys.path.append(str(Path(__file__).parent.parent))
 
+from packet_capture.spsc_ring import SPSCRing
+
 # Import all components with error handling
 components_loaded = {}
 
@@ -77,7 +79,7 @@ class IntegratedIDSIPS:
         
         # Component instances
         self.components = {}
-        self.packet_queue = queue.Queue(maxsize=10000)
+        self.packet_queue = SPSCRing(maxsize=10000)  # capture loop -> processing loop
         self.alert_queue = queue.Queue(maxsize=1000)
         
         # Statistics
@@ -272,6 +274,12 @@ class IntegratedIDSIPS:
             self.components['blocker'] = MockIPBlocker()
             self.logger.info("✅ Mock IP Blocker initialized")
         
+        # Traffic of blocked sources is never shed while the sniffer samples under overload
+        sniffer = self.components.get('sniffer')
+        blocker = self.components.get('blocker')
+        if hasattr(sniffer, 'load_controller') and hasattr(blocker, 'add_block_callback'):
+            blocker.add_block_callback(sniffer.load_controller.set_protected_sources)
+        
         # Initialize Logger
         if components_loaded.get('logger', False):
             try:
@@ -638,7 +646,8 @@ class IntegratedIDSIPS:
             'queue_sizes': {
                 'packet_queue': self.packet_queue.qsize(),
                 'alert_queue': self.alert_queue.qsize()
-            }
+            },
+            'packet_queue': self.packet_queue.get_stats()
         }
         
         # Get recent alerts (simplified)
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+Kernel Capture Filter for IDS/IPS System
+Compiles PacketSniffer filter settings into classic BPF programs for packet sockets
+"""
+
+import ctypes
+import shutil
+import socket
+import struct
+import subprocess
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from packet_capture.packet_decoder import (VLAN_ETHERTYPES, MAX_VLAN_TAGS, MAX_IPV6_EXT_HEADERS,
+                                               IPV6_EXT_HEADERS, IPV6_FRAGMENT_HEADER)
+except ImportError:
+    from packet_decoder import (VLAN_ETHERTYPES, MAX_VLAN_TAGS, MAX_IPV6_EXT_HEADERS,
+                                IPV6_EXT_HEADERS, IPV6_FRAGMENT_HEADER)
+
+SO_ATTACH_FILTER = 26
+SO_DETACH_FILTER = 27
+BPF_MAXINSNS = 4096
+
+# Instruction classes, sizes, modes and operations (see <linux/filter.h>)
+BPF_LD, BPF_LDX, BPF_ST, BPF_STX, BPF_ALU, BPF_JMP, BPF_RET, BPF_MISC = range(8)
+BPF_W, BPF_H, BPF_B = 0x00, 0x08, 0x10
+BPF_IMM, BPF_ABS, BPF_IND, BPF_MEM, BPF_LEN = 0x00, 0x20, 0x40, 0x60, 0x80
+BPF_ADD, BPF_AND, BPF_LSH, BPF_RSH = 0x00, 0x50, 0x60, 0x70
+BPF_JA, BPF_JEQ, BPF_JGT, BPF_JGE, BPF_JSET = 0x00, 0x10, 0x20, 0x30, 0x40
+BPF_K, BPF_X, BPF_A = 0x00, 0x08, 0x10
+BPF_TAX, BPF_TXA = 0x00, 0x80
+
+# Bytes of each accepted packet handed to userspace
+ACCEPT_SNAPLEN = 0x40000
+
+# Protocol class codes stored in scratch memory by the classifier
+_PROTOCOL_CODES = {'Unknown': 0, 'ICMP': 1, 'TCP': 6, 'UDP': 17, 'ARP': 254}
+
+# Scratch memory slots
+_M_PROTO = 0     # protocol class code
+_M_FAMILY = 1    # 0 (no addresses), 4 or 6
+_M_SRC = 2       # offset of the source address
+_M_DST = 3       # offset of the destination address
+_M_L4 = 4        # offset of the transport header
+_M_NET = 5       # offset of the network header
+_M_TMP1 = 6
+_M_TMP2 = 7
+
+_SOCK_FILTER = struct.Struct("HBBI")
+
+BPFProgram = List[Tuple[int, int, int, int]]
+
+
+class _Assembler:
+    """Builds a classic BPF program with symbolic jump labels"""
+
+    def __init__(self):
+        self.items: List[list] = []
+        self._label_count = 0
+
+    def new_label(self, hint: str = "L") -> str:
+        self._label_count += 1
+        return f"{hint}{self._label_count}"
+
+    def label(self, name: str):
+        self.items.append(['label', name])
+
+    def op(self, code: int, k: int = 0):
+        self.items.append(['op', code, k])
+
+    def jump(self, code: int, k: int, jt: str, jf: str):
+        self.items.append(['jump', code | BPF_JMP, k, jt, jf])
+
+    def ja(self, target: str):
+        self.items.append(['ja', target])
+
+    def ret(self, k: int):
+        self.op(BPF_RET | BPF_K, k)
+
+    # Convenience wrappers
+    def ld_imm(self, k): self.op(BPF_LD | BPF_IMM, k)
+    def ld_len(self): self.op(BPF_LD | BPF_W | BPF_LEN)
+    def ld_abs_h(self, k): self.op(BPF_LD | BPF_H | BPF_ABS, k)
+    def ld_ind(self, size, k): self.op(BPF_LD | size | BPF_IND, k)
+    def ld_mem(self, m): self.op(BPF_LD | BPF_MEM, m)
+    def ldx_imm(self, k): self.op(BPF_LDX | BPF_W | BPF_IMM, k)
+    def ldx_mem(self, m): self.op(BPF_LDX | BPF_W | BPF_MEM, m)
+    def st(self, m): self.op(BPF_ST, m)
+    def stx(self, m): self.op(BPF_STX, m)
+    def alu_k(self, operation, k): self.op(BPF_ALU | operation | BPF_K, k)
+    def add_x(self): self.op(BPF_ALU | BPF_ADD | BPF_X)
+    def tax(self): self.op(BPF_MISC | BPF_TAX)
+    def txa(self): self.op(BPF_MISC | BPF_TXA)
+
+    def require_length(self, extra: int, fail: str):
+        """Jump to ``fail`` unless the packet holds ``extra`` bytes past X (clobbers A and X)"""
+        ok = self.new_label("len")
+        self.txa()
+        self.alu_k(BPF_ADD, extra)
+        self.tax()
+        self.ld_len()
+        self.jump(BPF_JGE | BPF_X, 0, ok, fail)
+        self.label(ok)
+
+    def assemble(self) -> BPFProgram:
+        """Resolve labels, inserting unconditional trampolines for far conditional jumps"""
+        items = [list(item) for item in self.items]
+        while True:
+            positions: Dict[str, int] = {}
+            index = 0
+            for item in items:
+                if item[0] == 'label':
+                    positions[item[1]] = index
+                else:
+                    index += 1
+
+            program = []
+            far = None
+            index = 0
+            for position, item in enumerate(items):
+                kind = item[0]
+                if kind == 'label':
+                    continue
+                if kind == 'op':
+                    program.append((item[1], 0, 0, item[2]))
+                elif kind == 'ja':
+                    program.append((BPF_JMP | BPF_JA, 0, 0, positions[item[1]] - index - 1))
+                else:
+                    _, code, k, jt, jf = item
+                    jt_off = positions[jt] - index - 1
+                    jf_off = positions[jf] - index - 1
+                    if jt_off > 255 or jf_off > 255:
+                        far = (position, 3 if jt_off > 255 else 4)
+                        break
+                    program.append((code, jt_off, jf_off, k))
+                index += 1
+
+            if far is None:
+                return program
+
+            # Route the far branch through an unconditional jump placed right after
+            # it; conditional jumps never fall through, so nothing else reaches it
+            position, slot = far
+            trampoline = self.new_label("far")
+            target = items[position][slot]
+            for branch in (3, 4):
+                if items[position][branch] == target:
+                    items[position][branch] = trampoline
+            items[position + 1:position + 1] = [['label', trampoline], ['ja', target]]
+
+
+def _canonical_addresses(addresses: Optional[Iterable]) -> Tuple[List[bytes], List[bytes], bool]:
+    """
+    Split configured addresses into packed IPv4 and IPv6 values
+
+    Only strings that the decoder could produce verbatim are kept (others can
+    never compare equal). Also reports whether "Unknown" is listed.
+    """
+    ipv4, ipv6 = [], []
+    unknown = False
+    for address in addresses or ():
+        if not isinstance(address, str):
+            continue
+        if address == "Unknown":
+            unknown = True
+            continue
+        try:
+            packed = socket.inet_pton(socket.AF_INET, address)
+            if socket.inet_ntoa(packed) == address and packed not in ipv4:
+                ipv4.append(packed)
+            continue
+        except OSError:
+            pass
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, address)
+            if socket.inet_ntop(socket.AF_INET6, packed) == address and packed not in ipv6:
+                ipv6.append(packed)
+        except OSError:
+            pass
+    return ipv4, ipv6, unknown
+
+
+def compile_capture_filter(protocols: Sequence[str], ip_whitelist: Optional[Sequence[str]] = None,
+                           ip_blacklist: Optional[Sequence[str]] = None,
+                           port_ranges: Optional[Sequence[Tuple[int, int]]] = None) -> BPFProgram:
+    """
+    Compile PacketSniffer filter settings into a classic BPF program
+
+    The program classifies Ethernet frames exactly like decode_frame (VLAN
+    tags, IPv4 fragments and options, IPv6 extension headers, ARP, truncated
+    headers) and then applies the same protocol, whitelist, blacklist and
+    port range rules as PacketSniffer._should_capture_packet, so packets it
+    accepts need no further check in Python.
+
+    Raises ValueError if the program would exceed the kernel's size limit.
+    """
+    asm = _Assembler()
+    unknown = asm.new_label("unknown")
+    classified = asm.new_label("classified")
+    accept = asm.new_label("accept")
+    reject = asm.new_label("reject")
+
+    # The kernel only accepts programs that store every scratch slot before loading it
+    asm.ld_imm(0)
+    for slot in (_M_PROTO, _M_FAMILY, _M_SRC, _M_DST, _M_L4, _M_NET, _M_TMP1, _M_TMP2):
+        asm.st(slot)
+
+    _emit_link_layer(asm, unknown, classified)
+
+    # Undecodable frames keep protocol "Unknown" and no addresses
+    asm.label(unknown)
+    asm.label(classified)
+    _emit_protocol_check(asm, protocols, reject)
+    if ip_whitelist:
+        _emit_address_check(asm, ip_whitelist, on_match=None, on_miss=reject)
+    if ip_blacklist:
+        _emit_address_check(asm, ip_blacklist, on_match=reject, on_miss=None)
+    if port_ranges:
+        _emit_port_check(asm, port_ranges, accept, reject)
+
+    asm.label(accept)
+    asm.ret(ACCEPT_SNAPLEN)
+    asm.label(reject)
+    asm.ret(0)
+
+    program = asm.assemble()
+    if len(program) > BPF_MAXINSNS:
+        raise ValueError(f"Capture filter needs {len(program)} instructions (limit {BPF_MAXINSNS})")
+    return program
+
+
+def _emit_link_layer(asm: _Assembler, unknown: str, done: str):
+    """Ethernet header and VLAN tags; dispatch on the ethertype with X = network offset"""
+    ipv4, ipv6, arp = asm.new_label("ipv4"), asm.new_label("ipv6"), asm.new_label("arp")
+
+    have_header = asm.new_label("eth")
+    asm.ld_len()
+    asm.jump(BPF_JGE | BPF_K, 14, have_header, unknown)
+    asm.label(have_header)
+    asm.ld_abs_h(12)
+
+    for tag in range(MAX_VLAN_TAGS + 1):
+        offset = 14 + 4 * tag
+        dispatch = asm.new_label("dispatch")
+        if tag < MAX_VLAN_TAGS:
+            vlan = asm.new_label("vlan")
+            for ethertype in sorted(VLAN_ETHERTYPES):
+                next_check = asm.new_label("etype")
+                asm.jump(BPF_JEQ | BPF_K, ethertype, vlan, next_check)
+                asm.label(next_check)
+            asm.ja(dispatch)
+
+            # Another tag: the decoder stops (with an unknown ethertype) if it is truncated
+            asm.label(vlan)
+            tagged = asm.new_label("tagged")
+            asm.ld_len()
+            asm.jump(BPF_JGE | BPF_K, offset + 4, tagged, unknown)
+            asm.label(tagged)
+            asm.ld_abs_h(offset + 2)
+            after = asm.new_label("after")
+            asm.ja(after)
+
+        asm.label(dispatch)
+        asm.ldx_imm(offset)
+        next_ipv6, next_arp = asm.new_label("etype"), asm.new_label("etype")
+        asm.jump(BPF_JEQ | BPF_K, 0x0800, ipv4, next_ipv6)
+        asm.label(next_ipv6)
+        asm.jump(BPF_JEQ | BPF_K, 0x86DD, ipv6, next_arp)
+        asm.label(next_arp)
+        asm.jump(BPF_JEQ | BPF_K, 0x0806, arp, unknown)
+
+        if tag < MAX_VLAN_TAGS:
+            asm.label(after)
+
+    asm.label(ipv4)
+    _emit_ipv4(asm, unknown, done)
+    asm.label(ipv6)
+    _emit_ipv6(asm, unknown, done)
+    asm.label(arp)
+    _emit_arp(asm, unknown, done)
+
+
+def _emit_ipv4(asm: _Assembler, unknown: str, done: str):
+    asm.stx(_M_NET)
+    asm.require_length(20, unknown)
+    asm.ldx_mem(_M_NET)
+
+    asm.ld_imm(4)
+    asm.st(_M_FAMILY)
+    asm.txa()
+    asm.alu_k(BPF_ADD, 12)
+    asm.st(_M_SRC)
+    asm.alu_k(BPF_ADD, 4)
+    asm.st(_M_DST)
+
+    # Non-first fragments carry no transport header
+    first_fragment = asm.new_label("frag0")
+    asm.ld_ind(BPF_H, 6)
+    asm.jump(BPF_JSET | BPF_K, 0x1FFF, done, first_fragment)
+    asm.label(first_fragment)
+
+    asm.ld_ind(BPF_B, 9)
+    asm.st(_M_TMP1)
+    asm.ld_ind(BPF_B, 0)
+    asm.alu_k(BPF_AND, 0x0F)
+    asm.alu_k(BPF_LSH, 2)
+    asm.add_x()
+    asm.st(_M_L4)
+    _emit_transport(asm, 1, done)
+
+
+def _emit_ipv6(asm: _Assembler, unknown: str, done: str):
+    transport = asm.new_label("transport6")
+    asm.stx(_M_NET)
+    asm.require_length(40, unknown)
+    asm.ldx_mem(_M_NET)
+
+    asm.ld_imm(6)
+    asm.st(_M_FAMILY)
+    asm.txa()
+    asm.alu_k(BPF_ADD, 8)
+    asm.st(_M_SRC)
+    asm.alu_k(BPF_ADD, 16)
+    asm.st(_M_DST)
+
+    asm.ld_ind(BPF_B, 6)
+    asm.st(_M_TMP1)
+    asm.txa()
+    asm.alu_k(BPF_ADD, 40)
+    asm.st(_M_L4)
+
+    # Unrolled walk over the same extension headers as the decoder
+    for _ in range(MAX_IPV6_EXT_HEADERS):
+        extension, fragment, next_header = (asm.new_label("ext"), asm.new_label("frag"),
+                                            asm.new_label("nh"))
+        asm.ld_mem(_M_TMP1)
+        for header in sorted(IPV6_EXT_HEADERS):
+            next_check = asm.new_label("nhcheck")
+            asm.jump(BPF_JEQ | BPF_K, header, extension, next_check)
+            asm.label(next_check)
+        asm.jump(BPF_JEQ | BPF_K, IPV6_FRAGMENT_HEADER, fragment, transport)
+
+        asm.label(extension)
+        asm.ldx_mem(_M_L4)
+        asm.require_length(2, transport)
+        asm.ldx_mem(_M_L4)
+        asm.ld_ind(BPF_B, 0)
+        asm.st(_M_TMP1)
+        asm.ld_ind(BPF_B, 1)
+        asm.alu_k(BPF_ADD, 1)
+        asm.alu_k(BPF_LSH, 3)
+        asm.add_x()
+        asm.st(_M_L4)
+        asm.ja(next_header)
+
+        asm.label(fragment)
+        first_fragment = asm.new_label("frag0")
+        asm.ldx_mem(_M_L4)
+        asm.require_length(8, transport)
+        asm.ldx_mem(_M_L4)
+        asm.ld_ind(BPF_H, 2)
+        asm.alu_k(BPF_RSH, 3)
+        asm.jump(BPF_JEQ | BPF_K, 0, first_fragment, done)
+        asm.label(first_fragment)
+        asm.ld_ind(BPF_B, 0)
+        asm.st(_M_TMP1)
+        asm.txa()
+        asm.alu_k(BPF_ADD, 8)
+        asm.st(_M_L4)
+
+        asm.label(next_header)
+
+    asm.label(transport)
+    _emit_transport(asm, 58, done)
+
+
+def _emit_transport(asm: _Assembler, icmp_protocol: int, done: str):
+    """Classify the transport protocol held in M[TMP1] with its header at M[L4]"""
+    tcp, udp, icmp = asm.new_label("tcp"), asm.new_label("udp"), asm.new_label("icmp")
+    next_udp, next_icmp = asm.new_label("proto"), asm.new_label("proto")
+    asm.ld_mem(_M_TMP1)
+    asm.jump(BPF_JEQ | BPF_K, 6, tcp, next_udp)
+    asm.label(next_udp)
+    asm.jump(BPF_JEQ | BPF_K, 17, udp, next_icmp)
+    asm.label(next_icmp)
+    asm.jump(BPF_JEQ | BPF_K, icmp_protocol, icmp, done)
+
+    for label, header_len, code in ((tcp, 20, 6), (udp, 8, 17)):
+        asm.label(label)
+        asm.ldx_mem(_M_L4)
+        asm.require_length(header_len, done)
+        asm.ld_imm(code)
+        asm.st(_M_PROTO)
+        asm.ja(done)
+
+    asm.label(icmp)
+    has_body = asm.new_label("icmpbody")
+    asm.ldx_mem(_M_L4)
+    asm.ld_len()
+    asm.jump(BPF_JGT | BPF_X, 0, has_body, done)
+    asm.label(has_body)
+    asm.ld_imm(1)
+    asm.st(_M_PROTO)
+    asm.ja(done)
+
+
+def _emit_arp(asm: _Assembler, unknown: str, done: str):
+    ipv4, ipv6 = asm.new_label("arp4"), asm.new_label("arp6")
+    asm.stx(_M_NET)
+    asm.require_length(8, unknown)
+    asm.ldx_mem(_M_NET)
+
+    asm.ld_ind(BPF_B, 4)
+    asm.st(_M_TMP1)  # hardware address length
+    asm.ld_ind(BPF_B, 5)
+    asm.st(_M_TMP2)  # protocol address length
+
+    asm.ld_mem(_M_TMP1)
+    asm.alu_k(BPF_ADD, 8)
+    asm.add_x()
+    asm.st(_M_SRC)
+    asm.ldx_mem(_M_TMP2)
+    asm.add_x()
+    asm.ldx_mem(_M_TMP1)
+    asm.add_x()
+    asm.st(_M_DST)
+
+    asm.ldx_mem(_M_TMP2)
+    asm.add_x()
+    asm.tax()
+    complete = asm.new_label("arpfull")
+    asm.ld_len()
+    asm.jump(BPF_JGE | BPF_X, 0, complete, unknown)
+    asm.label(complete)
+
+    next_check = asm.new_label("plen")
+    asm.ld_mem(_M_TMP2)
+    asm.jump(BPF_JEQ | BPF_K, 4, ipv4, next_check)
+    asm.label(next_check)
+    asm.jump(BPF_JEQ | BPF_K, 16, ipv6, unknown)
+
+    for label, family in ((ipv4, 4), (ipv6, 6)):
+        asm.label(label)
+        asm.ld_imm(family)
+        asm.st(_M_FAMILY)
+        asm.ld_imm(_PROTOCOL_CODES['ARP'])
+        asm.st(_M_PROTO)
+        asm.ja(done)
+
+
+def _emit_protocol_check(asm: _Assembler, protocols: Sequence[str], reject: str):
+    codes = sorted({_PROTOCOL_CODES[name] for name in protocols if name in _PROTOCOL_CODES})
+    if len(codes) == len(_PROTOCOL_CODES):
+        return
+    if not codes:
+        asm.ja(reject)
+        return
+
+    allowed = asm.new_label("protook")
+    asm.ld_mem(_M_PROTO)
+    for code in codes:
+        next_check = asm.new_label("protocheck")
+        asm.jump(BPF_JEQ | BPF_K, code, allowed, next_check)
+        asm.label(next_check)
+    asm.ja(reject)
+    asm.label(allowed)
+
+
+def _emit_address_check(asm: _Assembler, addresses: Sequence[str],
+                        on_match: Optional[str], on_miss: Optional[str]):
+    """Jump to on_match if the source or destination address is listed, else on_miss (None = continue)"""
+    ipv4, ipv6, unknown_listed = _canonical_addresses(addresses)
+    done = asm.new_label("addrdone")
+    match = on_match or done
+    miss = on_miss or done
+    family4, family6 = asm.new_label("fam4"), asm.new_label("fam6")
+    check6, no_family = asm.new_label("fam"), asm.new_label("fam")
+
+    asm.ld_mem(_M_FAMILY)
+    asm.jump(BPF_JEQ | BPF_K, 4, family4, check6)
+    asm.label(check6)
+    asm.jump(BPF_JEQ | BPF_K, 6, family6, no_family)
+    asm.label(no_family)
+    asm.ja(match if unknown_listed else miss)
+
+    asm.label(family4)
+    for slot in (_M_SRC, _M_DST):
+        asm.ldx_mem(slot)
+        asm.ld_ind(BPF_W, 0)
+        for packed in ipv4:
+            following = asm.new_label("ip4")
+            asm.jump(BPF_JEQ | BPF_K, struct.unpack("!I", packed)[0], match, following)
+            asm.label(following)
+    asm.ja(miss)
+
+    asm.label(family6)
+    for slot in (_M_SRC, _M_DST):
+        asm.ldx_mem(slot)
+        for packed in ipv6:
+            words = struct.unpack("!IIII", packed)
+            following = asm.new_label("ip6")
+            for i, word in enumerate(words):
+                same = match if i == 3 else asm.new_label("ip6word")
+                asm.ld_ind(BPF_W, i * 4)
+                asm.jump(BPF_JEQ | BPF_K, word, same, following)
+                if i < 3:
+                    asm.label(same)
+            asm.label(following)
+    asm.ja(miss)
+
+    asm.label(done)
+
+
+def _emit_port_check(asm: _Assembler, port_ranges: Sequence[Tuple[int, int]], accept: str, reject: str):
+    ranges = []
+    for start, end in port_ranges:
+        start, end = max(int(start), 1), min(int(end), 0xFFFF)
+        if start <= end:
+            ranges.append((start, end))
+
+    check, next_check = asm.new_label("ports"), asm.new_label("portproto")
+    asm.ld_mem(_M_PROTO)
+    asm.jump(BPF_JEQ | BPF_K, 6, check, next_check)
+    asm.label(next_check)
+    asm.jump(BPF_JEQ | BPF_K, 17, check, accept)
+
+    asm.label(check)
+    asm.ldx_mem(_M_L4)
+    asm.ld_ind(BPF_H, 0)
+    asm.st(_M_TMP1)
+    asm.ld_ind(BPF_H, 2)
+    asm.st(_M_TMP2)
+
+    # Zero ports are skipped, and with both zero the port rule does not apply
+    dst_check, dst_zero, dst_ranges = asm.new_label("dport"), asm.new_label("dzero"), asm.new_label("dranges")
+    asm.ld_mem(_M_TMP1)
+    src_ranges = asm.new_label("sranges")
+    asm.jump(BPF_JEQ | BPF_K, 0, dst_check, src_ranges)
+    asm.label(src_ranges)
+    _emit_ranges(asm, ranges, accept, dst_check)
+
+    asm.label(dst_check)
+    asm.ld_mem(_M_TMP2)
+    asm.jump(BPF_JEQ | BPF_K, 0, dst_zero, dst_ranges)
+    asm.label(dst_ranges)
+    _emit_ranges(asm, ranges, accept, reject)
+
+    asm.label(dst_zero)
+    asm.ld_mem(_M_TMP1)
+    asm.jump(BPF_JEQ | BPF_K, 0, accept, reject)
+
+
+def _emit_ranges(asm: _Assembler, ranges: List[Tuple[int, int]], inside: str, outside: str):
+    """Jump to inside if A falls in any range, else outside"""
+    for start, end in ranges:
+        above_start, following = asm.new_label("rstart"), asm.new_label("range")
+        asm.jump(BPF_JGE | BPF_K, start, above_start, following)
+        asm.label(above_start)
+        asm.jump(BPF_JGT | BPF_K, end, following, inside)
+        asm.label(following)
+    asm.ja(outside)
+
+
+def compile_expression(expression: str, interface: Optional[str] = None) -> Optional[BPFProgram]:
+    """
+    Compile a pcap filter expression with ``tcpdump -ddd``
+
+    Returns None if tcpdump is not installed or rejects the expression.
+    """
+    tcpdump = shutil.which("tcpdump")
+    if not tcpdump:
+        return None
+
+    command = [tcpdump, "-ddd"]
+    if interface and interface != 'any':
+        command += ["-i", interface]
+    command.append(expression)
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=10, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    lines = result.stdout.split()
+    if not lines:
+        return None
+    count = int(lines[0])
+    values = [int(v) for v in lines[1:1 + count * 4]]
+    return [tuple(values[i:i + 4]) for i in range(0, len(values), 4)]
+
+
+def combine_programs(first: BPFProgram, second: BPFProgram) -> BPFProgram:
+    """
+    Chain two programs: packets must be accepted by ``first`` and then by ``second``
+
+    Every accepting return of ``first`` becomes a jump to the start of ``second``.
+    """
+    asm = _Assembler()
+    labels = [f"first{i}" for i in range(len(first) + 1)]
+    start_second = "second"
+    drop = "drop_first"
+
+    for i, (code, jt, jf, k) in enumerate(first):
+        asm.label(labels[i])
+        if code == BPF_RET | BPF_K:
+            if k:
+                asm.ja(start_second)
+            else:
+                asm.ret(0)
+        elif code == BPF_RET | BPF_A:
+            asm.jump(BPF_JEQ | BPF_K, 0, drop, start_second)
+        elif code == BPF_JMP | BPF_JA:
+            asm.ja(labels[i + 1 + k])
+        elif code & 0x07 == BPF_JMP:
+            asm.jump(code & ~0x07, k, labels[i + 1 + jt], labels[i + 1 + jf])
+        else:
+            asm.op(code, k)
+    asm.label(labels[-1])
+    asm.label(drop)
+    asm.ret(0)
+
+    asm.label(start_second)
+    second_labels = [f"second{i}" for i in range(len(second) + 1)]
+    for i, (code, jt, jf, k) in enumerate(second):
+        asm.label(second_labels[i])
+        if code == BPF_JMP | BPF_JA:
+            asm.ja(second_labels[i + 1 + k])
+        elif code & 0x07 == BPF_JMP:
+            asm.jump(code & ~0x07, k, second_labels[i + 1 + jt], second_labels[i + 1 + jf])
+        else:
+            asm.op(code, k)
+
+    program = asm.assemble()
+    if len(program) > BPF_MAXINSNS:
+        raise ValueError(f"Combined filter needs {len(program)} instructions (limit {BPF_MAXINSNS})")
+    return program
+
+
+def attach_filter(sock: socket.socket, program: BPFProgram):
+    """
+    Attach a classic BPF program to a socket
+
+    Attaching replaces any previous filter in one step, so no packet is ever
+    checked against a partially installed program.
+    """
+    raw = b"".join(_SOCK_FILTER.pack(*insn) for insn in program)
+    buffer = ctypes.create_string_buffer(raw, len(raw))
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def detach_filter(sock: socket.socket):
+    """Remove the BPF program attached to a socket"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
+    except OSError:
+        pass  # no filter attached
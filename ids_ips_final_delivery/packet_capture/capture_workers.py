@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Sharded Capture Workers for IDS/IPS System
+Runs one capture + detection pipeline per process, sharded by PACKET_FANOUT flow hashing
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional
+
+# Keys merged with max() instead of a sum (durations and peaks)
+_MAX_MERGE_SUFFIXES = ('_max', 'uptime_seconds', 'runtime', 'elapsed')
+# Keys averaged across workers
+_MEAN_MERGE_SUFFIXES = ('_avg', '_ratio', '_rate')
+
+
+def merge_worker_stats(worker_stats: List[Dict]) -> Dict:
+    """
+    Merge per-worker stats dicts into one view
+
+    Numeric counters are summed (rates in "per second" units sum too),
+    durations and peaks take the maximum, averages and ratios are averaged,
+    nested dicts are merged recursively and other values keep the first
+    worker's value.
+    """
+    merged: Dict[str, Any] = {}
+    keys = []
+    for stats in worker_stats:
+        for key in stats:
+            if key not in merged:
+                merged[key] = None
+                keys.append(key)
+
+    for key in keys:
+        values = [stats[key] for stats in worker_stats if key in stats and stats[key] is not None]
+        if not values:
+            merged[key] = None
+        elif all(isinstance(v, dict) for v in values):
+            merged[key] = merge_worker_stats(values)
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            if key.endswith(_MAX_MERGE_SUFFIXES):
+                merged[key] = max(values)
+            elif key.endswith(_MEAN_MERGE_SUFFIXES):
+                merged[key] = sum(values) / len(values)
+            else:
+                merged[key] = sum(values)
+        else:
+            merged[key] = values[0]
+    return merged
+
+
+def _worker_main(factory: Callable, worker_id: int, fanout_group: int,
+                 stop_event, report_queue, stats_interval: float):
+    """Entry point of a worker process: run one engine and report back to the parent"""
+    logger = logging.getLogger(__name__)
+    engine = factory(worker_id, fanout_group)
+    if engine.start() is False:
+        logger.error(f"Capture worker {worker_id} failed to start")
+        report_queue.put(('stats', worker_id, engine.get_stats()))
+        return
+
+    forward_events = hasattr(engine, 'get_recent_threats')
+    next_stats = time.monotonic()
+    try:
+        while not stop_event.wait(0.1):
+            if forward_events:
+                for event in engine.get_recent_threats(100):
+                    report_queue.put(('event', worker_id, event))
+
+            if time.monotonic() >= next_stats:
+                report_queue.put(('stats', worker_id, engine.get_stats()))
+                next_stats = time.monotonic() + stats_interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        if forward_events:
+            for event in engine.get_recent_threats(100):
+                report_queue.put(('event', worker_id, event))
+        report_queue.put(('stats', worker_id, engine.get_stats()))
+
+
+class CaptureWorkerPool:
+    """
+    Pool of capture worker processes sharing one PACKET_FANOUT group.
+
+    Every worker builds its own engine (sniffer plus detectors) from
+    ``factory(worker_id, fanout_group)``, so detection state is never shared
+    and the GIL is per process. With PACKET_FANOUT_HASH the kernel hashes
+    each flow symmetrically, so both directions of a flow always reach the
+    same worker. The engine must provide start(), stop() and get_stats();
+    if it also provides get_recent_threats(limit) its events are forwarded
+    to ``on_event`` in the parent.
+    """
+
+    def __init__(self, factory: Callable, workers: Optional[int] = None,
+                 fanout_group: Optional[int] = None, stats_interval: float = 1.0,
+                 on_event: Optional[Callable[[int, Any], None]] = None):
+        """
+        Initialize the worker pool
+
+        Args:
+            factory: Picklable callable (worker_id, fanout_group) -> engine
+            workers: Number of worker processes (defaults to the CPU count)
+            fanout_group: PACKET_FANOUT group id (defaults to one derived from the PID)
+            stats_interval: Seconds between stats reports from each worker
+            on_event: Called in the parent with (worker_id, event) for forwarded events
+        """
+        self.factory = factory
+        self.workers = workers or os.cpu_count() or 1
+        self.fanout_group = fanout_group if fanout_group is not None else os.getpid() & 0xFFFF
+        self.stats_interval = stats_interval
+        self.on_event = on_event
+        self.logger = logging.getLogger(__name__)
+
+        self.processes: List[multiprocessing.Process] = []
+        self.worker_stats: Dict[int, Dict] = {}
+        self.stats_lock = threading.Lock()
+        self.stop_event = multiprocessing.Event()
+        self.report_queue = multiprocessing.Queue()
+        self.collector_thread: Optional[threading.Thread] = None
+        self.is_running = False
+
+    def start(self):
+        """Start the worker processes and the report collector"""
+        if self.is_running:
+            self.logger.warning("Capture worker pool is already running")
+            return
+
+        self.stop_event.clear()
+        self.is_running = True
+        for worker_id in range(self.workers):
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(self.factory, worker_id, self.fanout_group,
+                      self.stop_event, self.report_queue, self.stats_interval),
+                name=f"capture-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        self.collector_thread = threading.Thread(target=self._collector_worker, daemon=True)
+        self.collector_thread.start()
+        self.logger.info(f"Started {self.workers} capture workers in fanout group {self.fanout_group}")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the workers and collect their final stats"""
+        if not self.is_running:
+            return
+
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"{process.name} did not stop in time; terminating")
+                process.terminate()
+                process.join(timeout=1)
+
+        self.is_running = False
+        if self.collector_thread:
+            self.collector_thread.join(timeout=2)
+        self._drain_reports()
+        self.processes = []
+        self.logger.info("Capture worker pool stopped")
+
+    def _collector_worker(self):
+        """Receive stats and events from the workers"""
+        while self.is_running:
+            try:
+                self._handle_report(self.report_queue.get(timeout=0.5))
+            except Empty:
+                continue
+            except Exception as e:
+                self.logger.error(f"Error collecting worker report: {e}")
+
+    def _drain_reports(self):
+        while True:
+            try:
+                self._handle_report(self.report_queue.get(timeout=0.1))
+            except Empty:
+                break
+
+    def _handle_report(self, report):
+        kind, worker_id, payload = report
+        if kind == 'stats':
+            with self.stats_lock:
+                self.worker_stats[worker_id] = payload
+        elif kind == 'event' and self.on_event:
+            try:
+                self.on_event(worker_id, payload)
+            except Exception as e:
+                self.logger.error(f"Error in worker event callback: {e}")
+
+    def get_stats(self) -> Dict:
+        """Get merged stats across workers, with the per-worker stats attached"""
+        with self.stats_lock:
+            per_worker = [self.worker_stats[i] for i in sorted(self.worker_stats)]
+
+        stats = merge_worker_stats(per_worker)
+        stats['workers'] = self.workers
+        stats['workers_alive'] = sum(1 for p in self.processes if p.is_alive())
+        stats['fanout_group'] = self.fanout_group
+        stats['per_worker'] = per_worker
+        return stats
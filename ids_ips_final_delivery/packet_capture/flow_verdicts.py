@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Flow Verdict Table for IDS/IPS System
+Remembers per-flow inspection decisions so packets of decided flows skip
+the detection engines
+"""
+
+import time
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from packet_capture.load_shedding import FlowKey, flow_key
+except ImportError:
+    from load_shedding import FlowKey, flow_key
+
+# Verdicts; packets of a flow are inspected only while it is undecided
+VERDICT_INSPECT = "inspect"  # undecided, counting payload bytes
+VERDICT_ALERTED = "alerted"  # already matched, its source is being handled
+VERDICT_TRUSTED = "trusted"  # known good
+VERDICT_BYPASS = "bypass"  # carried its byte allowance of clean traffic
+FLOW_VERDICTS = (VERDICT_INSPECT, VERDICT_ALERTED, VERDICT_TRUSTED, VERDICT_BYPASS)
+
+# Verdicts whose expiry moves with each packet (idle_timeout); the others keep a fixed TTL
+IDLE_VERDICTS = (VERDICT_INSPECT, VERDICT_BYPASS)
+
+
+class FlowEntry:
+    """Verdict and byte count of one flow"""
+    __slots__ = ('verdict', 'expires', 'bytes_seen', 'bypass_after')
+
+    def __init__(self, verdict: str, expires: float, bypass_after: int = 0):
+        self.verdict = verdict
+        self.expires = expires
+        self.bytes_seen = 0
+        self.bypass_after = bypass_after  # payload bytes before an undecided flow is bypassed (0 = never)
+
+
+class FlowVerdictTable:
+    """
+    Per-5-tuple inspection verdicts, checked before any detector runs.
+
+    A flow is inspected until it gets a verdict: "alerted" (set after a
+    detection) and "trusted" (set by an operator or policy) last a fixed
+    TTL, while "bypass" is reached once an undecided flow has carried the
+    allowance given to bypass_after(), or ``clean_bypass_bytes`` of payload
+    if that is set (off by default: a bypassed flow is invisible to every
+    detector, including volume and rate accounting), like a stream depth
+    limit. Undecided and bypassed flows expire after ``idle_timeout``
+    seconds without packets, so long-lived bulk transfers stay bypassed
+    while they are active. Keys are direction independent (both sides of a
+    connection share a verdict); at most ``max_flows`` flows are tracked,
+    least recently seen undecided or bypassed flows evicted first.
+
+    Idle-timeout flows are kept in last-seen order, which is their expiry
+    order; alerted and trusted flows sit in a heap by expiry, so a
+    long-lived verdict never holds up expiring the others.
+    """
+
+    def __init__(self, clock=None, **kwargs):
+        """
+        Initialize the table
+
+        Args:
+            clock: Detection clock shared with the detectors; TTLs then count
+                packet event time (each packet at its own timestamp) instead
+                of time.monotonic()
+            **kwargs: Overrides for any key of ``self.config``
+        """
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+        self._now = clock.now if clock is not None else time.monotonic
+        self.config = {
+            'enabled': True,
+            'clean_bypass_bytes': 0,  # payload bytes before an undecided flow is bypassed (0 = never)
+            'idle_timeout': 120.0,  # seconds an undecided or bypassed flow is kept without packets
+            'alerted_ttl': 300.0,  # seconds an alerted flow skips inspection (matches the alert dedup window)
+            'trusted_ttl': 3600.0,
+            'max_flows': 100000
+        }
+        self.configure(**kwargs)
+
+        self._flows: 'OrderedDict[FlowKey, FlowEntry]' = OrderedDict()  # inspect/bypass, last seen last
+        self._decided: Dict[FlowKey, FlowEntry] = {}  # alerted/trusted
+        self._decided_expiry: List[Tuple[float, FlowKey]] = []  # heap; stale items skipped
+        self._lock = threading.Lock()  # verdicts may be set from other threads than the packet path
+
+        self.stats = {
+            'packets_inspected': 0,
+            'packets_bypassed': 0,
+            'bytes_bypassed': 0,
+            'flows_bypassed': 0,  # undecided flows that reached their byte allowance
+            'expired': 0,
+            'evicted': 0
+        }
+        self.bypassed_by_verdict = {verdict: 0 for verdict in FLOW_VERDICTS[1:]}
+
+    def configure(self, **kwargs):
+        """Update table settings (verdicts already set keep their expiry)"""
+        for key, value in kwargs.items():
+            if key in self.config:
+                self.config[key] = value
+
+    # Packet path
+
+    def should_inspect(self, packet_info, now: Optional[float] = None) -> bool:
+        """Count a packet against its flow and tell whether the detectors should see it"""
+        if not self.config['enabled']:
+            return True
+        if now is None:
+            now = self.clock.observe(packet_info.timestamp) if self.clock is not None else time.monotonic()
+        with self._lock:
+            return self._check(packet_info, now)
+
+    def filter_batch(self, packets: List, now: Optional[float] = None) -> List:
+        """The packets of a batch that still need inspection, in batch order"""
+        if not self.config['enabled']:
+            return packets
+        if now is None and self.clock is not None:
+            observe = self.clock.observe
+            kept = []
+            with self._lock:
+                for packet_info in packets:
+                    now = observe(packet_info.timestamp)
+                    self._expire(now)
+                    if self._check(packet_info, now):
+                        kept.append(packet_info)
+            return kept
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return [packet_info for packet_info in packets if self._check(packet_info, now)]
+
+    def _check(self, packet_info, now: float) -> bool:
+        key = flow_key(packet_info.src_ip, packet_info.dst_ip, packet_info.src_port,
+                       packet_info.dst_port, packet_info.protocol)
+        size = packet_info.payload_size or 0
+        entry = self._lookup(key, now)
+
+        if entry is None:
+            clean_bypass_bytes = self.config['clean_bypass_bytes']
+            if not clean_bypass_bytes:
+                self.stats['packets_inspected'] += 1
+                return True  # nothing to count for flows nobody decided on
+            entry = self._insert(key, FlowEntry(VERDICT_INSPECT, 0.0, clean_bypass_bytes))
+        elif entry.verdict in IDLE_VERDICTS:
+            self._flows.move_to_end(key)
+
+        verdict = entry.verdict
+        if verdict == VERDICT_INSPECT:
+            entry.expires = now + self.config['idle_timeout']
+            entry.bytes_seen += size
+            if entry.bypass_after and entry.bytes_seen >= entry.bypass_after:
+                entry.verdict = VERDICT_BYPASS  # this packet is still inspected, later ones are not
+                self.stats['flows_bypassed'] += 1
+            self.stats['packets_inspected'] += 1
+            return True
+
+        if verdict == VERDICT_BYPASS:
+            entry.expires = now + self.config['idle_timeout']
+        entry.bytes_seen += size
+        self.stats['packets_bypassed'] += 1
+        self.stats['bytes_bypassed'] += size
+        self.bypassed_by_verdict[verdict] += 1
+        return False
+
+    def _lookup(self, key: FlowKey, now: float) -> Optional[FlowEntry]:
+        """A flow's live entry, dropping it if it has expired"""
+        table = self._flows
+        entry = table.get(key)
+        if entry is None:
+            table = self._decided
+            entry = table.get(key)
+            if entry is None:
+                return None
+        if entry.expires <= now:
+            del table[key]
+            self.stats['expired'] += 1
+            return None
+        return entry
+
+    def _insert(self, key: FlowKey, entry: FlowEntry) -> FlowEntry:
+        flows = self._flows
+        decided = self._decided
+        if flows.pop(key, None) is None and decided.pop(key, None) is None:
+            if len(flows) + len(decided) >= self.config['max_flows']:
+                self._evict()
+        if entry.verdict in IDLE_VERDICTS:
+            flows[key] = entry
+        else:
+            decided[key] = entry
+            heapq.heappush(self._decided_expiry, (entry.expires, key))
+            if len(self._decided_expiry) > 2 * len(decided) + 1024:
+                self._decided_expiry = [(e.expires, k) for k, e in decided.items()]
+                heapq.heapify(self._decided_expiry)
+        return entry
+
+    def _evict(self):
+        """Make room: the least recently seen idle-timeout flow, else the decided flow expiring first"""
+        self.stats['evicted'] += 1
+        if self._flows:
+            self._flows.popitem(last=False)
+            return
+        heap = self._decided_expiry
+        while heap:
+            expires, key = heapq.heappop(heap)
+            entry = self._decided.get(key)
+            if entry is not None and entry.expires == expires:
+                del self._decided[key]
+                return
+
+    def _expire(self, now: float):
+        """Drop expired flows: idle-timeout ones from the least recently seen end, decided ones from the heap"""
+        flows = self._flows
+        while flows:
+            key, entry = next(iter(flows.items()))
+            if entry.expires > now:
+                break
+            flows.popitem(last=False)
+            self.stats['expired'] += 1
+
+        heap = self._decided_expiry
+        while heap and heap[0][0] <= now:
+            expires, key = heapq.heappop(heap)
+            entry = self._decided.get(key)
+            if entry is not None and entry.expires == expires:
+                del self._decided[key]
+                self.stats['expired'] += 1
+
+    # Verdicts (any thread)
+
+    def set_verdict(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                    protocol: str, verdict: str, ttl: Optional[float] = None, bypass_after: int = 0):
+        """
+        Set a flow's verdict
+
+        ``ttl`` defaults to the verdict's configured TTL (idle_timeout for
+        "inspect" and "bypass"). For "inspect", ``bypass_after`` is the
+        payload byte allowance before the flow is bypassed (0 = never).
+        """
+        if verdict not in FLOW_VERDICTS:
+            raise ValueError(f"Unknown flow verdict {verdict!r}, expected one of {', '.join(FLOW_VERDICTS)}")
+        if ttl is None:
+            ttl = self.config.get(f"{verdict}_ttl", self.config['idle_timeout'])
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        with self._lock:
+            entry = FlowEntry(verdict, self._now() + ttl, bypass_after)
+            previous = self._flows.get(key) or self._decided.get(key)
+            if previous is not None:
+                entry.bytes_seen = previous.bytes_seen
+            self._insert(key, entry)
+        self.logger.debug(f"Flow {key} verdict set to {verdict} for {ttl:.0f}s")
+
+    def mark_alerted(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                     protocol: str, ttl: Optional[float] = None):
+        """Skip inspecting a flow that already raised an alert"""
+        self.set_verdict(src_ip, dst_ip, src_port, dst_port, protocol, VERDICT_ALERTED, ttl)
+
+    def mark_trusted(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                     protocol: str, ttl: Optional[float] = None):
+        """Skip inspecting a known good flow"""
+        self.set_verdict(src_ip, dst_ip, src_port, dst_port, protocol, VERDICT_TRUSTED, ttl)
+
+    def bypass_after(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                     protocol: str, byte_count: int):
+        """Inspect a flow until it has carried ``byte_count`` more payload bytes, then bypass it"""
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        with self._lock:
+            previous = self._flows.get(key) or self._decided.get(key)
+            seen = previous.bytes_seen if previous is not None else 0
+        self.set_verdict(src_ip, dst_ip, src_port, dst_port, protocol, VERDICT_INSPECT,
+                         bypass_after=seen + byte_count)
+
+    def clear_verdict(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                      protocol: str) -> bool:
+        """Forget a flow, so its packets are inspected again"""
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        with self._lock:
+            return self._flows.pop(key, None) is not None or self._decided.pop(key, None) is not None
+
+    def get_verdict(self, src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+                    protocol: str) -> str:
+        """Current verdict of a flow ("inspect" when it has none)"""
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        with self._lock:
+            entry = self._flows.get(key) or self._decided.get(key)
+            if entry is None or entry.expires <= self._now():
+                return VERDICT_INSPECT
+            return entry.verdict
+
+    def __len__(self) -> int:
+        return len(self._flows) + len(self._decided)
+
+    def get_stats(self) -> Dict:
+        """Get bypass statistics and the number of flows per verdict"""
+        with self._lock:
+            entries = list(self._flows.values()) + list(self._decided.values())
+            stats = self.stats.copy()
+        verdicts = {verdict: 0 for verdict in FLOW_VERDICTS}
+        for entry in entries:
+            verdicts[entry.verdict] += 1
+        stats['flows'] = len(entries)
+        stats['max_flows'] = self.config['max_flows']
+        stats['verdicts'] = verdicts
+        stats['bypassed_by_verdict'] = dict(self.bypassed_by_verdict)
+        total = stats['packets_inspected'] + stats['packets_bypassed']
+        stats['bypass_ratio'] = stats['packets_bypassed'] / total if total else 0.0
+        return stats
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Overload Controller for IDS/IPS System
+Switches the capture pipeline to deterministic per-flow sampling when the
+packet queue or processing latency crosses its thresholds
+"""
+
+import time
+import zlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Flow key: (protocol, lower endpoint, higher endpoint), same for both directions
+FlowKey = Tuple[str, Tuple[str, int], Tuple[str, int]]
+
+
+def flow_key(src_ip: str, dst_ip: str, src_port: Optional[int], dst_port: Optional[int],
+             protocol: str) -> FlowKey:
+    """Direction-independent key of the flow a packet belongs to"""
+    a = (src_ip, src_port or 0)
+    b = (dst_ip, dst_port or 0)
+    return (protocol, a, b) if a <= b else (protocol, b, a)
+
+
+def flow_hash(key: FlowKey) -> int:
+    """Stable 32-bit hash of a flow key (the same in every process, unlike hash())"""
+    protocol, (ip_a, port_a), (ip_b, port_b) = key
+    return zlib.crc32(f"{protocol}|{ip_a}|{port_a}|{ip_b}|{port_b}".encode())
+
+
+class OverloadController:
+    """
+    Adaptive load shedding for the capture pipeline.
+
+    Each consumer stage reports its queue depth and batch processing time
+    through observe() (the sniffer for its capture queue, the engine for the
+    detection queue behind it); the busiest stage counts. At most once per
+    ``evaluation_interval`` the controller
+    doubles the sampling divisor N while the pipeline is overloaded and
+    halves it again once both signals are back under their low thresholds.
+    While N > 1 the producer keeps a packet only if its flow hashes to
+    0 mod N, so whole flows are kept or shed (never random packets of a
+    flow) and the choice is identical across workers and restarts. Packets
+    of flagged flows (for ``flag_ttl`` seconds after the flag) and of
+    protected sources are always kept; the system integrator keeps the
+    protected set in step with the IP blocker's blocklist.
+
+    Detectors that count packets can scale their counts by the current
+    ``sampling_divisor`` (also reported by get_stats()).
+    """
+
+    def __init__(self, queue_capacity: int, **kwargs):
+        """
+        Initialize the controller
+
+        Args:
+            queue_capacity: Capacity of the queue whose depth is observed
+            **kwargs: Overrides for any key of ``self.config``
+        """
+        self.queue_capacity = queue_capacity
+        self.logger = logging.getLogger(__name__)
+
+        self.config = {
+            'enabled': True,
+            'queue_high_ratio': 0.8,  # enter/escalate sampling above this queue fill ratio
+            'queue_low_ratio': 0.3,  # relax sampling below this fill ratio
+            'latency_high_ms': 50.0,  # smoothed batch processing time that counts as overload
+            'latency_low_ms': 20.0,
+            'latency_smoothing': 0.2,  # EWMA weight of the newest batch
+            'evaluation_interval': 0.5,  # seconds between sampling decisions
+            'max_sampling_divisor': 64,
+            'max_flagged_flows': 10000,
+            'flag_ttl': 300.0,  # seconds a flagged flow is kept whatever the sampling rate
+            'log_interval': 10.0  # seconds between shedding summaries in the log
+        }
+        self.configure(**kwargs)
+
+        # Read by the producer on every packet, written only by the consumer
+        self.sampling_divisor = 1
+
+        self.flagged_flows: Dict[FlowKey, float] = {}  # flow -> expiry (monotonic), oldest first
+        self.protected_sources = frozenset()
+        self._flag_lock = threading.Lock()
+
+        self._latency_ms: Dict[str, float] = {}  # smoothed batch time per stage
+        self._peak_fill = 0.0
+        self._observe_lock = threading.Lock()
+        self._next_evaluation = time.monotonic() + self.config['evaluation_interval']
+        self._next_log = 0.0
+        self._shed_since_log = 0
+
+        self.stats = {
+            'packets_kept': 0,
+            'packets_shed': 0,
+            'packets_kept_flagged': 0,
+            'rate_changes': 0,
+            'overload_evaluations': 0,
+            'last_rate_change': None
+        }
+        self.rate_history: List[Dict] = []
+
+    def configure(self, **kwargs):
+        """Update controller thresholds"""
+        for key, value in kwargs.items():
+            if key in self.config:
+                self.config[key] = value
+
+    # Producer side
+
+    def should_keep(self, src_ip: str, dst_ip: str, src_port: Optional[int],
+                    dst_port: Optional[int], protocol: str) -> bool:
+        """Decide whether a packet enters the pipeline under the current sampling rate"""
+        divisor = self.sampling_divisor
+        if divisor == 1:
+            return True
+
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        if src_ip in self.protected_sources or dst_ip in self.protected_sources:
+            self.stats['packets_kept_flagged'] += 1
+            return True
+        expires = self.flagged_flows.get(key)
+        if expires is not None:
+            if expires > time.monotonic():
+                self.stats['packets_kept_flagged'] += 1
+                return True
+            with self._flag_lock:
+                self._expire_flags(time.monotonic())
+
+        if flow_hash(key) % divisor == 0:
+            self.stats['packets_kept'] += 1
+            return True
+
+        self.stats['packets_shed'] += 1
+        self._shed_since_log += 1
+        return False
+
+    # Flow and source protection (any thread)
+
+    def flag_flow(self, src_ip: str, dst_ip: str, src_port: Optional[int],
+                  dst_port: Optional[int], protocol: str):
+        """
+        Always keep this flow (e.g. after a detection) for flag_ttl seconds;
+        flagging it again restarts the TTL. Every flag has the same TTL, so
+        insertion order is expiry order; the oldest flag is evicted early
+        when max_flagged_flows are set.
+        """
+        key = flow_key(src_ip, dst_ip, src_port, dst_port, protocol)
+        now = time.monotonic()
+        expires = now + self.config['flag_ttl']
+        with self._flag_lock:
+            self._expire_flags(now)
+            self.flagged_flows.pop(key, None)
+            self.flagged_flows[key] = expires
+            while len(self.flagged_flows) > self.config['max_flagged_flows']:
+                del self.flagged_flows[next(iter(self.flagged_flows))]
+
+    def _expire_flags(self, now: float):
+        """Drop expired flags from the front (call with _flag_lock; flags are kept in expiry order)"""
+        flagged_flows = self.flagged_flows
+        while flagged_flows:
+            key = next(iter(flagged_flows))
+            if flagged_flows[key] > now:
+                break
+            del flagged_flows[key]
+
+    def unflag_flow(self, src_ip: str, dst_ip: str, src_port: Optional[int],
+                    dst_port: Optional[int], protocol: str):
+        """Stop protecting a flow"""
+        with self._flag_lock:
+            self.flagged_flows.pop(flow_key(src_ip, dst_ip, src_port, dst_port, protocol), None)
+
+    def set_protected_sources(self, ips):
+        """Replace the set of addresses whose traffic is never shed (e.g. blocklisted sources)"""
+        self.protected_sources = frozenset(ips)
+
+    # Consumer side
+
+    def observe(self, queue_depth: int, batch_seconds: float, queue_capacity: Optional[int] = None,
+                stage: str = "capture"):
+        """
+        Record one batch handled by a stage and re-evaluate the sampling rate when due
+
+        Args:
+            queue_depth: Items waiting in the stage's input queue
+            batch_seconds: Time the stage spent on the batch
+            queue_capacity: Capacity of that queue (the controller's own by default)
+            stage: Name of the reporting stage; latency is smoothed per stage
+        """
+        capacity = queue_capacity or self.queue_capacity
+        fill = queue_depth / capacity if capacity else 0.0
+        with self._observe_lock:
+            alpha = self.config['latency_smoothing']
+            latency = self._latency_ms.get(stage, 0.0)
+            self._latency_ms[stage] = latency + alpha * (batch_seconds * 1000.0 - latency)
+            if fill > self._peak_fill:
+                self._peak_fill = fill
+
+            now = time.monotonic()
+            if now >= self._next_evaluation:
+                self._evaluate()
+                self._next_evaluation = now + self.config['evaluation_interval']
+
+            if self._shed_since_log and now >= self._next_log:
+                self.logger.warning(f"Overload: sampling 1/{self.sampling_divisor} of flows, "
+                                    f"shed {self._shed_since_log} packets since last report")
+                self._shed_since_log = 0
+                self._next_log = now + self.config['log_interval']
+
+    @property
+    def latency_ms(self) -> float:
+        """Smoothed batch time of the slowest stage"""
+        return max(self._latency_ms.values(), default=0.0)
+
+    def _evaluate(self):
+        self.stats['overload_evaluations'] += 1
+        fill = self._peak_fill
+        self._peak_fill = 0.0
+        latency = self.latency_ms
+        config = self.config
+
+        divisor = self.sampling_divisor
+        if not config['enabled']:
+            divisor = 1
+        elif fill >= config['queue_high_ratio'] or latency >= config['latency_high_ms']:
+            divisor = min(divisor * 2, config['max_sampling_divisor'])
+        elif fill <= config['queue_low_ratio'] and latency <= config['latency_low_ms']:
+            divisor = max(divisor // 2, 1)
+
+        if divisor != self.sampling_divisor:
+            self._set_divisor(divisor, fill)
+
+    def _set_divisor(self, divisor: int, fill: float):
+        previous = self.sampling_divisor
+        self.sampling_divisor = divisor
+        change = {
+            'time': time.time(),
+            'sampling_divisor': divisor,
+            'sampling_rate': 1.0 / divisor,
+            'queue_fill': round(fill, 3),
+            'latency_ms': round(self.latency_ms, 2)
+        }
+        self.stats['rate_changes'] += 1
+        self.stats['last_rate_change'] = change
+        self.rate_history.append(change)
+        del self.rate_history[:-20]
+
+        if divisor == 1:
+            self.logger.info(f"Overload cleared: sampling disabled (was 1/{previous})")
+        else:
+            self.logger.warning(f"Overload: sampling 1/{divisor} of flows "
+                                f"(queue {fill:.0%}, batch latency {self.latency_ms:.1f} ms)")
+
+    def get_stats(self) -> Dict:
+        """Get shedding statistics, including the current sampling rate"""
+        stats = self.stats.copy()
+        stats['sampling_divisor'] = self.sampling_divisor
+        stats['sampling_rate'] = 1.0 / self.sampling_divisor
+        stats['latency_ms'] = self.latency_ms
+        stats['stage_latency_ms'] = dict(self._latency_ms)
+        with self._flag_lock:
+            self._expire_flags(time.monotonic())
+            stats['flagged_flows'] = len(self.flagged_flows)
+        stats['protected_sources'] = len(self.protected_sources)
+        stats['rate_history'] = list(self.rate_history)
+        return stats
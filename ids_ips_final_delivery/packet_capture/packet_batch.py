@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Columnar Packet Batch for IDS/IPS System
+Struct-of-arrays packet representation for low-churn, vectorized detection
+"""
+
+import socket
+import struct
+from array import array
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from packet_capture.packet_decoder import TCP_FLAG_NAMES, TCP_FLAG_STRINGS
+except ImportError:
+    from packet_decoder import TCP_FLAG_NAMES, TCP_FLAG_STRINGS
+
+# Protocol codes (IP protocol numbers where one exists)
+PROTOCOL_CODES = {'Unknown': 0, 'ICMP': 1, 'TCP': 6, 'UDP': 17, 'ARP': 254}
+PROTOCOL_NAMES = {code: name for name, code in PROTOCOL_CODES.items()}
+
+DIRECTION_CODES = {'unknown': 0, 'inbound': 1, 'outbound': 2, 'internal': 3}
+DIRECTION_NAMES = {code: name for name, code in DIRECTION_CODES.items()}
+
+# Protocols whose packets carry ports and (for TCP) a flags byte
+_PORT_PROTOCOLS = frozenset((PROTOCOL_CODES['TCP'], PROTOCOL_CODES['UDP']))
+_TCP = PROTOCOL_CODES['TCP']
+
+_FLAG_MASKS = {flags: mask for mask, flags in enumerate(TCP_FLAG_STRINGS)}
+_FLAG_BITS = {name: 1 << bit for bit, name in enumerate(TCP_FLAG_NAMES)}
+_FLAG_LISTS = tuple(flags.split("|") if flags else [] for flags in TCP_FLAG_STRINGS)
+
+_U32 = struct.Struct("!I")
+_inet_aton = socket.inet_aton
+
+# array typecode and NumPy dtype for every fixed-width column
+COLUMNS = {
+    'timestamp': ('d', 'float64'),
+    'src_ip': ('I', 'uint32'),
+    'dst_ip': ('I', 'uint32'),
+    'src_port': ('H', 'uint16'),
+    'dst_port': ('H', 'uint16'),
+    'protocol': ('B', 'uint8'),
+    'flags': ('B', 'uint8'),
+    'packet_size': ('i', 'int32'),
+    'payload_size': ('i', 'int32'),
+    'direction': ('B', 'uint8'),
+}
+
+
+def ip_to_int(ip: str) -> Optional[int]:
+    """Convert a dotted-quad IPv4 address to an integer (None if not IPv4)"""
+    try:
+        return _U32.unpack(_inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return None
+
+
+def int_to_ip(value: int) -> str:
+    """Convert an integer to a dotted-quad IPv4 address"""
+    return socket.inet_ntoa(_U32.pack(value))
+
+
+class PacketBatch:
+    """
+    Struct-of-arrays batch of packets.
+
+    Fixed-width fields live in one typed column each (NumPy arrays when
+    NumPy is installed, ``array.array`` otherwise); payload bytes are
+    concatenated into ``payload_data`` and sliced with ``payload_offsets``.
+    Values that do not fit a column (IPv6 or "Unknown" addresses, unlisted
+    protocol or direction names, non-TCP flag names, an empty rather than
+    missing raw_packet) are kept per row in the sparse ``extras`` dict and
+    win over the column value on conversion.
+    """
+
+    __slots__ = tuple(COLUMNS) + ('payload_offsets', 'payload_data', 'extras',
+                                  'payload_hashes', 'metadata')
+
+    def __init__(self, columns: Dict[str, Any], payload_offsets, payload_data: bytes = b"",
+                 extras: Optional[Dict[int, Dict[str, Any]]] = None,
+                 payload_hashes: Optional[List[str]] = None,
+                 metadata: Optional[List[Dict[str, Any]]] = None):
+        """
+        Initialize a batch from prebuilt columns
+
+        Args:
+            columns: One array per entry of COLUMNS, all of the same length
+            payload_offsets: Length+1 offsets into payload_data
+            payload_data: Concatenated payload bytes
+            extras: Per-row values that override the columns
+            payload_hashes: Optional per-row payload hashes (EnhancedPacket)
+            metadata: Optional per-row metadata dicts (EnhancedPacket)
+        """
+        for name in COLUMNS:
+            setattr(self, name, _as_column(columns[name], name))
+        self.payload_offsets = _as_offsets(payload_offsets)
+        self.payload_data = payload_data
+        self.extras = extras or {}
+        self.payload_hashes = payload_hashes
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the columns and payload buffer"""
+        total = len(self.payload_data)
+        for name in tuple(COLUMNS) + ('payload_offsets',):
+            column = getattr(self, name)
+            total += len(column) * column.itemsize
+        return total
+
+    def payload(self, index: int) -> bytes:
+        """Get the payload bytes of one row"""
+        return self.payload_data[self.payload_offsets[index]:self.payload_offsets[index + 1]]
+
+    @classmethod
+    def _builder(cls) -> Dict[str, array]:
+        return {name: array(typecode) for name, (typecode, _) in COLUMNS.items()}
+
+    @classmethod
+    def from_packet_infos(cls, packets: List) -> 'PacketBatch':
+        """Build a batch from PacketInfo objects (raw_packet becomes the payload)"""
+        columns = cls._builder()
+        offsets = array('q', [0])
+        chunks = []
+        extras = {}
+        size = 0
+
+        for i, packet in enumerate(packets):
+            row = _append_common(columns, packet)
+            _append_flags_string(columns, row, packet.flags, packet.protocol)
+            columns['packet_size'].append(packet.packet_size)
+            columns['direction'].append(0)
+
+            raw = packet.raw_packet
+            if raw:
+                chunks.append(raw)
+                size += len(raw)
+            elif raw is not None:
+                row['raw_packet'] = raw  # empty, not missing
+            offsets.append(size)
+
+            if row:
+                extras[i] = row
+
+        return cls(columns, offsets, b"".join(chunks), extras)
+
+    @classmethod
+    def from_enhanced_packets(cls, packets: List) -> 'PacketBatch':
+        """Build a batch from EnhancedPacket objects (payload_snippet becomes the payload)"""
+        columns = cls._builder()
+        offsets = array('q', [0])
+        chunks = []
+        extras = {}
+        size = 0
+
+        for i, packet in enumerate(packets):
+            row = _append_common(columns, packet)
+            _append_flags_list(columns, row, packet.flags)
+            columns['packet_size'].append(packet.payload_size)
+
+            code = DIRECTION_CODES.get(packet.direction)
+            if code is None:
+                code = 0
+                row['direction'] = packet.direction
+            columns['direction'].append(code)
+
+            snippet = packet.payload_snippet.encode('utf-8') if packet.payload_snippet else b""
+            chunks.append(snippet)
+            size += len(snippet)
+            offsets.append(size)
+
+            if row:
+                extras[i] = row
+
+        return cls(columns, offsets, b"".join(chunks), extras,
+                   payload_hashes=[packet.payload_hash for packet in packets],
+                   metadata=[packet.metadata for packet in packets])
+
+    def _row(self, index: int) -> Dict[str, Any]:
+        """Decode the common fields of one row"""
+        row = self.extras.get(index, {})
+        protocol = int(self.protocol[index])
+        has_ports = protocol in _PORT_PROTOCOLS
+
+        return {
+            'timestamp': float(self.timestamp[index]),
+            'src_ip': row['src_ip'] if 'src_ip' in row else int_to_ip(int(self.src_ip[index])),
+            'dst_ip': row['dst_ip'] if 'dst_ip' in row else int_to_ip(int(self.dst_ip[index])),
+            'src_port': int(self.src_port[index]) if has_ports else row.get('src_port'),
+            'dst_port': int(self.dst_port[index]) if has_ports else row.get('dst_port'),
+            'protocol': row.get('protocol') or PROTOCOL_NAMES.get(protocol, 'Unknown'),
+            'payload_size': int(self.payload_size[index]),
+        }
+
+    def packet_info(self, index: int):
+        """Rebuild the PacketInfo for one row"""
+        try:
+            from packet_capture.packet_sniffer import PacketInfo
+        except ImportError:
+            from packet_sniffer import PacketInfo
+
+        fields = self._row(index)
+        row = self.extras.get(index, {})
+        if 'flags' in row:
+            flags = row['flags']
+        elif self.protocol[index] == _TCP:
+            flags = TCP_FLAG_STRINGS[self.flags[index]]
+        else:
+            flags = None
+
+        return PacketInfo(
+            packet_size=int(self.packet_size[index]),
+            flags=flags,
+            raw_packet=row['raw_packet'] if 'raw_packet' in row else self.payload(index) or None,
+            **fields
+        )
+
+    def to_packet_infos(self) -> List:
+        """Rebuild PacketInfo objects for every row"""
+        return [self.packet_info(i) for i in range(len(self))]
+
+    def enhanced_packet(self, index: int):
+        """Rebuild the EnhancedPacket for one row"""
+        from detection_engine.enhanced_detector import EnhancedPacket
+
+        fields = self._row(index)
+        row = self.extras.get(index, {})
+        flags = list(row['flags']) if 'flags' in row else list(_FLAG_LISTS[self.flags[index]])
+        direction = row.get('direction') or DIRECTION_NAMES.get(int(self.direction[index]), 'unknown')
+
+        return EnhancedPacket(
+            flags=flags,
+            payload_hash=self.payload_hashes[index] if self.payload_hashes is not None else "",
+            payload_snippet=self.payload(index).decode('utf-8', errors='replace'),
+            direction=direction,
+            metadata=self.metadata[index] if self.metadata is not None else {},
+            **fields
+        )
+
+    def to_enhanced_packets(self) -> List:
+        """Rebuild EnhancedPacket objects for every row"""
+        return [self.enhanced_packet(i) for i in range(len(self))]
+
+
+def _as_column(values, name: str):
+    typecode, dtype = COLUMNS[name]
+    if NUMPY_AVAILABLE:
+        if isinstance(values, array):
+            return np.frombuffer(values, dtype=dtype)
+        return np.asarray(values, dtype=dtype)
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    return array(typecode, values)
+
+
+def _as_offsets(values):
+    if NUMPY_AVAILABLE:
+        if isinstance(values, array):
+            return np.frombuffer(values, dtype='int64')
+        return np.asarray(values, dtype='int64')
+    if isinstance(values, array) and values.typecode == 'q':
+        return values
+    return array('q', values)
+
+
+def _append_common(columns: Dict[str, array], packet) -> Dict[str, Any]:
+    """Append the fields shared by PacketInfo and EnhancedPacket; return row overflow"""
+    row = {}
+    columns['timestamp'].append(packet.timestamp)
+
+    src = ip_to_int(packet.src_ip)
+    if src is None:
+        src = 0
+        row['src_ip'] = packet.src_ip
+    columns['src_ip'].append(src)
+
+    dst = ip_to_int(packet.dst_ip)
+    if dst is None:
+        dst = 0
+        row['dst_ip'] = packet.dst_ip
+    columns['dst_ip'].append(dst)
+
+    protocol = PROTOCOL_CODES.get(packet.protocol)
+    if protocol is None:
+        protocol = 0
+        row['protocol'] = packet.protocol
+    columns['protocol'].append(protocol)
+
+    # Ports are implied by TCP/UDP; keep any others as overflow
+    if protocol not in _PORT_PROTOCOLS and (packet.src_port is not None or packet.dst_port is not None):
+        row['src_port'] = packet.src_port
+        row['dst_port'] = packet.dst_port
+    columns['src_port'].append(packet.src_port or 0)
+    columns['dst_port'].append(packet.dst_port or 0)
+    columns['payload_size'].append(packet.payload_size)
+    return row
+
+
+def _append_flags_string(columns: Dict[str, array], row: Dict[str, Any],
+                         flags: Optional[str], protocol: str):
+    mask = _FLAG_MASKS.get(flags) if flags is not None else 0
+    if mask is None or (flags is not None) != (protocol == 'TCP'):
+        mask = 0
+        row['flags'] = flags
+    columns['flags'].append(mask)
+
+
+def _append_flags_list(columns: Dict[str, array], row: Dict[str, Any], flags: List[str]):
+    mask = 0
+    for name in flags:
+        bit = _FLAG_BITS.get(name)
+        if bit is None:
+            row['flags'] = list(flags)
+            mask = 0
+            break
+        mask |= bit
+    columns['flags'].append(mask)
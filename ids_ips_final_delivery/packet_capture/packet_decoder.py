@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Header Decoder for IDS/IPS System
+Scapy-free Ethernet/IPv4/IPv6/TCP/UDP/ICMP/ARP decoding from raw frame bytes
+"""
+
+import socket
+import struct
+from typing import Optional, Tuple
+
+# Link-layer header types (pcap LINKTYPE_* values)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+SUPPORTED_LINKTYPES = frozenset((LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL,
+                                 LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_LINUX_SLL2))
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = frozenset((0x8100, 0x88A8, 0x9100))
+MAX_VLAN_TAGS = 4
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+# IPv6 extension headers walked before the upper-layer protocol
+IPV6_EXT_HEADERS = frozenset((0, 43, 60))
+IPV6_FRAGMENT_HEADER = 44
+MAX_IPV6_EXT_HEADERS = 4
+
+_U16 = struct.Struct("!H")
+_PORTS = struct.Struct("!HH")
+# version/ihl, tos, total length, id, flags/fragment offset, ttl, protocol
+_IPV4 = struct.Struct("!BBHHHBB")
+_ARP = struct.Struct("!HHBBH")
+
+_inet_ntoa = socket.inet_ntoa
+_inet_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+
+TCP_FLAG_NAMES = ("FIN", "SYN", "RST", "PSH", "ACK", "URG", "ECE", "CWR")
+
+# "|"-joined flag strings for every value of the TCP flags byte
+TCP_FLAG_STRINGS = tuple(
+    "|".join(name for bit, name in enumerate(TCP_FLAG_NAMES) if value & (1 << bit))
+    for value in range(256)
+)
+
+DecodedHeaders = Tuple[str, str, Optional[int], Optional[int], str, Optional[str], int]
+
+_UNKNOWN: DecodedHeaders = ("Unknown", "Unknown", None, None, "Unknown", None, 0)
+
+
+def decode_frame(frame) -> DecodedHeaders:
+    """
+    Decode the headers of a raw Ethernet frame
+
+    Accepts any bytes-like object (bytes, bytearray, memoryview) and never
+    copies the payload. Returns the tuple
+    (src_ip, dst_ip, src_port, dst_port, protocol, flags, payload_size)
+    using the same conventions as PacketSniffer._extract_packet_info.
+    Frames that cannot be decoded yield "Unknown" fields.
+    """
+    length = len(frame)
+    if length < 14:
+        return _UNKNOWN
+
+    ethertype, = _U16.unpack_from(frame, 12)
+    return _decode_network(frame, ethertype, 14, length)
+
+
+def decode_packet(frame, linktype: int = LINKTYPE_ETHERNET) -> DecodedHeaders:
+    """
+    Decode the headers of a packet with the given pcap link-layer type
+
+    Supports Ethernet, raw IPv4/IPv6 and Linux cooked captures (SLL and
+    SLL2, as written by ``tcpdump -i any``). Unsupported link types yield
+    "Unknown" fields.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        return decode_frame(frame)
+
+    length = len(frame)
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not length:
+            return _UNKNOWN
+        version = frame[0] >> 4
+        if version == 4:
+            return _decode_ipv4(frame, 0, length)
+        if version == 6:
+            return _decode_ipv6(frame, 0, length)
+        return _UNKNOWN
+
+    if linktype == LINKTYPE_LINUX_SLL and length >= 16:
+        ethertype, = _U16.unpack_from(frame, 14)
+        return _decode_network(frame, ethertype, 16, length)
+
+    if linktype == LINKTYPE_LINUX_SLL2 and length >= 20:
+        ethertype, = _U16.unpack_from(frame, 0)
+        return _decode_network(frame, ethertype, 20, length)
+
+    return _UNKNOWN
+
+
+def _decode_network(frame, ethertype: int, offset: int, length: int) -> DecodedHeaders:
+    for _ in range(MAX_VLAN_TAGS):
+        if ethertype not in VLAN_ETHERTYPES or length < offset + 4:
+            break
+        ethertype, = _U16.unpack_from(frame, offset + 2)
+        offset += 4
+
+    if ethertype == ETHERTYPE_IPV4:
+        return _decode_ipv4(frame, offset, length)
+    if ethertype == ETHERTYPE_IPV6:
+        return _decode_ipv6(frame, offset, length)
+    if ethertype == ETHERTYPE_ARP:
+        return _decode_arp(frame, offset, length)
+    return _UNKNOWN
+
+
+def _decode_ipv4(frame, offset: int, length: int) -> DecodedHeaders:
+    if length < offset + 20:
+        return _UNKNOWN
+
+    version_ihl, _, _, _, frag, _, proto = _IPV4.unpack_from(frame, offset)
+    src_ip = _inet_ntoa(frame[offset + 12:offset + 16])
+    dst_ip = _inet_ntoa(frame[offset + 16:offset + 20])
+
+    header_len = (version_ihl & 0x0F) * 4
+    l4_offset = offset + header_len
+    payload_size = max(length - l4_offset, 0)
+
+    # Non-first fragments carry no transport header
+    if frag & 0x1FFF:
+        return (src_ip, dst_ip, None, None, "Unknown", None, payload_size)
+
+    return _decode_transport(frame, l4_offset, length, proto, IPPROTO_ICMP,
+                             src_ip, dst_ip, payload_size)
+
+
+def _decode_ipv6(frame, offset: int, length: int) -> DecodedHeaders:
+    if length < offset + 40:
+        return _UNKNOWN
+
+    next_header = frame[offset + 6]
+    src_ip = _inet_ntop(_AF_INET6, frame[offset + 8:offset + 24])
+    dst_ip = _inet_ntop(_AF_INET6, frame[offset + 24:offset + 40])
+
+    l4_offset = offset + 40
+    payload_size = max(length - l4_offset, 0)
+
+    for _ in range(MAX_IPV6_EXT_HEADERS):
+        if next_header in IPV6_EXT_HEADERS:
+            if length < l4_offset + 2:
+                break
+            next_header, ext_len = frame[l4_offset], frame[l4_offset + 1]
+            l4_offset += (ext_len + 1) * 8
+        elif next_header == IPV6_FRAGMENT_HEADER:
+            if length < l4_offset + 8:
+                break
+            frag_offset, = _U16.unpack_from(frame, l4_offset + 2)
+            if frag_offset >> 3:
+                return (src_ip, dst_ip, None, None, "Unknown", None, payload_size)
+            next_header = frame[l4_offset]
+            l4_offset += 8
+        else:
+            break
+
+    return _decode_transport(frame, l4_offset, length, next_header, IPPROTO_ICMPV6,
+                             src_ip, dst_ip, payload_size)
+
+
+def _decode_transport(frame, offset: int, length: int, proto: int, icmp_proto: int,
+                      src_ip: str, dst_ip: str, payload_size: int) -> DecodedHeaders:
+    if proto == IPPROTO_TCP and length >= offset + 20:
+        src_port, dst_port = _PORTS.unpack_from(frame, offset)
+        flags = TCP_FLAG_STRINGS[frame[offset + 13]]
+        return (src_ip, dst_ip, src_port, dst_port, "TCP", flags, payload_size)
+
+    if proto == IPPROTO_UDP and length >= offset + 8:
+        src_port, dst_port = _PORTS.unpack_from(frame, offset)
+        return (src_ip, dst_ip, src_port, dst_port, "UDP", None, payload_size)
+
+    if proto == icmp_proto and length > offset:
+        return (src_ip, dst_ip, None, None, "ICMP", None, payload_size)
+
+    return (src_ip, dst_ip, None, None, "Unknown", None, payload_size)
+
+
+def _decode_arp(frame, offset: int, length: int) -> DecodedHeaders:
+    if length < offset + 8:
+        return _UNKNOWN
+
+    _, _, hw_len, proto_len, _ = _ARP.unpack_from(frame, offset)
+    psrc = offset + 8 + hw_len
+    pdst = psrc + proto_len + hw_len
+    if length < pdst + proto_len:
+        return _UNKNOWN
+
+    if proto_len == 4:
+        src_ip = _inet_ntoa(frame[psrc:psrc + 4])
+        dst_ip = _inet_ntoa(frame[pdst:pdst + 4])
+    elif proto_len == 16:
+        src_ip = _inet_ntop(_AF_INET6, frame[psrc:psrc + 16])
+        dst_ip = _inet_ntop(_AF_INET6, frame[pdst:pdst + 16])
+    else:
+        return _UNKNOWN
+
+    return (src_ip, dst_ip, None, None, "ARP", None, 0)
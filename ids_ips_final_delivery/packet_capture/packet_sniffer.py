@@ -4,27 +4,52 @@ Packet Sniffer Module for IDS/IPS System
 Captures and preprocesses network packets for analysis
 """
 
+import sys
 import threading
 import time
 import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Callable
-from dataclasses import dataclass, asdict
-from queue import Queue, Empty
+from typing import Any, Dict, List, Optional, Callable
+from dataclasses import dataclass, asdict, field
+from queue import Empty, Full
 import socket
 import struct
 
 try:
-    from scapy.all import sniff, IP, TCP, UDP, ICMP, ARP, Ether
+    from scapy.all import sniff, IP, IPv6, TCP, UDP, ICMP, ARP, Ether
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
     print("Warning: Scapy not available. Install with: pip install scapy")
 
-@dataclass
+try:
+    from packet_capture.tpacket_ring import TPacketV3Ring, TPACKET_AVAILABLE
+    from packet_capture.packet_decoder import (decode_packet, TCP_FLAG_STRINGS,
+                                               LINKTYPE_ETHERNET, SUPPORTED_LINKTYPES)
+    from packet_capture.packet_batch import PacketBatch
+    from packet_capture.pcap_reader import PcapReader
+    from packet_capture.bpf_filter import compile_capture_filter, compile_expression, combine_programs
+    from packet_capture.spsc_ring import SPSCRing
+    from packet_capture.load_shedding import OverloadController
+except ImportError:
+    from tpacket_ring import TPacketV3Ring, TPACKET_AVAILABLE
+    from packet_decoder import decode_packet, TCP_FLAG_STRINGS, LINKTYPE_ETHERNET, SUPPORTED_LINKTYPES
+    from packet_batch import PacketBatch
+    from pcap_reader import PcapReader
+    from bpf_filter import compile_capture_filter, compile_expression, combine_programs
+    from spsc_ring import SPSCRing
+    from load_shedding import OverloadController
+
+# Settings applied by _should_capture_packet (and compiled into the kernel filter)
+FILTER_CONFIG_KEYS = ('protocols_to_capture', 'ip_whitelist', 'ip_blacklist', 'port_ranges')
+
+# dataclass(slots=True) needs Python 3.10+
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class PacketInfo:
-    """Data class to store packet information"""
+    """Data class to store packet information (uses __slots__ where supported)"""
     timestamp: float
     src_ip: str
     dst_ip: str
@@ -35,6 +60,8 @@ class PacketInfo:
     flags: Optional[str]
     payload_size: int
     raw_packet: Optional[bytes] = None
+    # Normalized payload buffers, built and memoized by the detection engines
+    payload_views: Optional[Any] = field(default=None, repr=False, compare=False)
 
 class PacketSniffer:
     """
@@ -52,17 +79,33 @@ class PacketSniffer:
         self.interface = interface
         self.filter_expression = filter_expression
         self.is_running = False
-        self.packet_queue = Queue(maxsize=10000)
+        self.packet_queue = SPSCRing(maxsize=10000)  # capture thread -> processing worker
         self.stats = {
             'packets_captured': 0,
             'packets_processed': 0,
             'packets_dropped': 0,
+            'packets_shed': 0,
             'start_time': None,
-            'bytes_captured': 0
+            'bytes_captured': 0,
+            'batches_delivered': 0
         }
         self.callbacks: List[Callable[[PacketInfo], None]] = []
+        self.batch_callbacks: List[Callable[[List[PacketInfo]], None]] = []
+        self.columnar_callbacks: List[Callable[[PacketBatch], None]] = []
         self.logger = logging.getLogger(__name__)
         
+        # Capture ring (tpacket_v3 backend only)
+        self.capture_ring: Optional[TPacketV3Ring] = None
+        
+        # True while the ring's BPF program enforces FILTER_CONFIG_KEYS
+        self.kernel_filter_active = False
+        
+        # Switches to per-flow sampling when the processing side falls behind
+        self.load_controller = OverloadController(self.packet_queue.maxsize)
+        
+        # Replay progress (pcap backend only)
+        self.replay_stats: Optional[Dict] = None
+        
         # Threading
         self.capture_thread = None
         self.processing_thread = None
@@ -76,7 +119,20 @@ class PacketSniffer:
             'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP'],
             'port_ranges': None,  # [(start, end), ...] or None for all ports
             'ip_whitelist': None,  # [ip1, ip2, ...] or None for all IPs
-            'ip_blacklist': None   # [ip1, ip2, ...] or None
+            'ip_blacklist': None,  # [ip1, ip2, ...] or None
+            'capture_backend': 'scapy',  # 'scapy', 'tpacket_v3' or 'pcap'
+            'ring_block_size': 1 << 22,  # bytes per TPACKET_V3 block
+            'ring_block_count': 64,
+            'ring_frame_size': 2048,
+            'ring_retire_timeout_ms': 60,
+            'ring_stats_interval': 1.0,  # seconds between kernel counter reads
+            'kernel_filter': True,  # compile filter settings into BPF for the tpacket_v3 backend
+            'fanout_group': None,  # PACKET_FANOUT group id shared by sharded capture workers
+            'pcap_file': None,  # capture file replayed by the pcap backend
+            'replay_speed': 1.0,  # 1.0 = realtime, N = N times faster, 0 = as fast as possible
+            'batch_size': 256,  # max packets per callback batch
+            'batch_timeout_ms': 10,  # max time to wait for a batch to fill
+            'load_shedding': True  # sample flows instead of dropping packets under overload
         }
     
     def add_callback(self, callback: Callable[[PacketInfo], None]):
@@ -88,17 +144,95 @@ class PacketSniffer:
         if callback in self.callbacks:
             self.callbacks.remove(callback)
     
+    def add_batch_callback(self, callback: Callable, columnar: bool = False):
+        """
+        Add a callback function that receives batches of captured packets
+        
+        Batches hold up to ``batch_size`` packets and are delivered once full
+        or ``batch_timeout_ms`` after their first packet, whichever comes first.
+        With ``columnar=True`` the callback gets a PacketBatch instead of a list
+        of PacketInfo; the PacketBatch is built once and shared by all such callbacks.
+        """
+        if columnar:
+            self.columnar_callbacks.append(callback)
+        else:
+            self.batch_callbacks.append(callback)
+    
+    def remove_batch_callback(self, callback: Callable):
+        """Remove a batch callback function"""
+        if callback in self.batch_callbacks:
+            self.batch_callbacks.remove(callback)
+        if callback in self.columnar_callbacks:
+            self.columnar_callbacks.remove(callback)
+    
     def configure(self, **kwargs):
         """Update configuration parameters"""
         for key, value in kwargs.items():
             if key in self.config:
                 self.config[key] = value
                 self.logger.info(f"Configuration updated: {key} = {value}")
+        
+        if 'load_shedding' in kwargs:
+            self.load_controller.configure(enabled=bool(kwargs['load_shedding']))
+        
+        # Recompile and swap the kernel filter of a running ring
+        if self.capture_ring and any(key in kwargs for key in FILTER_CONFIG_KEYS + ('kernel_filter',)):
+            self._apply_kernel_filter(self.capture_ring)
+    
+    def _build_kernel_filter(self):
+        """
+        Build the BPF program for the capture ring
+        
+        Returns (program, exact): exact is True when the program enforces the
+        filter settings, so the Python check can be skipped for ring frames.
+        """
+        program = None
+        exact = False
+        if self.config['kernel_filter']:
+            try:
+                program = compile_capture_filter(
+                    self.config['protocols_to_capture'],
+                    self.config['ip_whitelist'],
+                    self.config['ip_blacklist'],
+                    self.config['port_ranges']
+                )
+                exact = True
+            except ValueError as e:
+                self.logger.warning(f"Filter settings not compiled to BPF, checking in Python: {e}")
+        
+        if self.filter_expression:
+            expression_program = compile_expression(self.filter_expression, self.interface)
+            if expression_program is None:
+                self.logger.warning("filter_expression could not be compiled (is tcpdump installed?); not applied")
+            elif program is None:
+                program = expression_program
+            else:
+                try:
+                    program = combine_programs(expression_program, program)
+                except ValueError as e:
+                    self.logger.warning(f"{e}; applying filter_expression only")
+                    program, exact = expression_program, False
+        
+        return program, exact
+    
+    def _apply_kernel_filter(self, ring: TPacketV3Ring):
+        """Compile the filter settings and attach them to the ring's socket"""
+        program, exact = self._build_kernel_filter()
+        try:
+            # Keep the Python check on while programs are swapped
+            self.kernel_filter_active = False
+            ring.set_filter(program)
+            self.kernel_filter_active = exact
+            if program:
+                self.logger.info(f"Kernel capture filter attached ({len(program)} instructions)")
+        except OSError as e:
+            self.logger.error(f"Could not attach kernel capture filter: {e}")
     
     def _extract_packet_info(self, packet) -> Optional[PacketInfo]:
         """Extract relevant information from a captured packet"""
         try:
-            timestamp = time.time()
+            # Capture time recorded by scapy (live or read from file)
+            timestamp = float(getattr(packet, 'time', None) or time.time())
             
             # Initialize default values
             src_ip = dst_ip = "Unknown"
@@ -137,6 +271,28 @@ class PacketSniffer:
                     icmp_layer = packet[ICMP]
                     protocol = "ICMP"
                     
+            elif packet.haslayer(IPv6):
+                ip_layer = packet[IPv6]
+                src_ip = ip_layer.src
+                dst_ip = ip_layer.dst
+                payload_size = len(ip_layer.payload) if ip_layer.payload else 0
+                
+                if packet.haslayer(TCP):
+                    tcp_layer = packet[TCP]
+                    src_port = tcp_layer.sport
+                    dst_port = tcp_layer.dport
+                    protocol = "TCP"
+                    flags = self._get_tcp_flags(tcp_layer.flags)
+                    
+                elif packet.haslayer(UDP):
+                    udp_layer = packet[UDP]
+                    src_port = udp_layer.sport
+                    dst_port = udp_layer.dport
+                    protocol = "UDP"
+                    
+                elif any(layer.__name__.startswith("ICMPv6") for layer in packet.layers()):
+                    protocol = "ICMP"
+                    
             elif packet.haslayer(ARP):
                 arp_layer = packet[ARP]
                 src_ip = arp_layer.psrc
@@ -167,18 +323,37 @@ class PacketSniffer:
             self.logger.error(f"Error extracting packet info: {e}")
             return None
     
+    def _extract_frame_info(self, frame, timestamp: float, linktype: int = LINKTYPE_ETHERNET,
+                            apply_filter: bool = True) -> Optional[PacketInfo]:
+        """Extract packet information from a raw frame without scapy"""
+        try:
+            (src_ip, dst_ip, src_port, dst_port,
+             protocol, flags, payload_size) = decode_packet(frame, linktype)
+            
+            # Apply filtering (unless the kernel already did)
+            if apply_filter and not self._should_capture_packet(src_ip, dst_ip, src_port, dst_port, protocol):
+                return None
+            
+            return PacketInfo(
+                timestamp=timestamp,
+                src_ip=src_ip,
+                dst_ip=dst_ip,
+                src_port=src_port,
+                dst_port=dst_port,
+                protocol=protocol,
+                packet_size=len(frame),
+                flags=flags,
+                payload_size=payload_size,
+                raw_packet=bytes(frame) if self.config['enable_raw_capture'] else None
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Error decoding frame: {e}")
+            return None
+    
     def _get_tcp_flags(self, flags: int) -> str:
         """Convert TCP flags integer to string representation"""
-        flag_names = []
-        if flags & 0x01: flag_names.append("FIN")
-        if flags & 0x02: flag_names.append("SYN")
-        if flags & 0x04: flag_names.append("RST")
-        if flags & 0x08: flag_names.append("PSH")
-        if flags & 0x10: flag_names.append("ACK")
-        if flags & 0x20: flag_names.append("URG")
-        if flags & 0x40: flag_names.append("ECE")
-        if flags & 0x80: flag_names.append("CWR")
-        return "|".join(flag_names)
+        return TCP_FLAG_STRINGS[int(flags) & 0xFF]
     
     def _should_capture_packet(self, src_ip: str, dst_ip: str, src_port: Optional[int], 
                               dst_port: Optional[int], protocol: str) -> bool:
@@ -213,38 +388,108 @@ class PacketSniffer:
     
     def _packet_handler(self, packet):
         """Handle captured packets"""
+        self._enqueue_packet_info(self._extract_packet_info(packet))
+    
+    def _frame_handler(self, frame, timestamp: float):
+        """Handle captured raw frames"""
+        self._enqueue_packet_info(
+            self._extract_frame_info(frame, timestamp, apply_filter=not self.kernel_filter_active)
+        )
+    
+    def _replay_frame_handler(self, frame, timestamp: float, linktype: int):
+        """Handle frames read from a capture file (waits for queue space instead of dropping)"""
+        self._enqueue_packet_info(self._extract_frame_info(frame, timestamp, linktype), block=True)
+    
+    def _enqueue_packet_info(self, packet_info: Optional[PacketInfo], block: bool = False):
+        """Queue extracted packet information for the processing worker"""
         try:
-            packet_info = self._extract_packet_info(packet)
             if packet_info:
                 self.stats['packets_captured'] += 1
                 self.stats['bytes_captured'] += packet_info.packet_size
                 
+                # Shed whole flows while the controller is sampling (replay never sheds)
+                if not block and not self.load_controller.should_keep(
+                        packet_info.src_ip, packet_info.dst_ip, packet_info.src_port,
+                        packet_info.dst_port, packet_info.protocol):
+                    self.stats['packets_shed'] += 1
+                    return
+                
                 # Add to processing queue
+                if block:
+                    while not self.stop_event.is_set():
+                        try:
+                            self.packet_queue.put(packet_info, timeout=0.5)
+                            return
+                        except Full:
+                            continue
+                    return
+                
                 try:
                     self.packet_queue.put_nowait(packet_info)
-                except:
+                except Full:
+                    # Counted here and in the ring; the controller logs overload at a limited rate
                     self.stats['packets_dropped'] += 1
-                    self.logger.warning("Packet queue full, dropping packet")
                     
         except Exception as e:
             self.logger.error(f"Error in packet handler: {e}")
     
-    def _processing_worker(self):
-        """Worker thread for processing captured packets"""
-        while not self.stop_event.is_set():
+    def _collect_batch(self) -> List[PacketInfo]:
+        """Collect up to batch_size packets, waiting at most batch_timeout_ms after the first"""
+        # Wait up to a second for the first packet, then take whatever is already queued
+        batch_size = self.config['batch_size']
+        batch = self.packet_queue.get_many(batch_size, timeout=1)
+        if not batch:
+            raise Empty
+        
+        deadline = time.monotonic() + self.config['batch_timeout_ms'] / 1000.0
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = self.packet_queue.get_many(batch_size - len(batch), timeout=remaining)
+            if not more:
+                break
+            batch.extend(more)
+        
+        return batch
+    
+    def _deliver_batch(self, batch: List[PacketInfo]):
+        """Deliver a batch to batch callbacks and each packet to per-packet callbacks"""
+        for callback in self.batch_callbacks:
             try:
-                # Get packet from queue with timeout
-                packet_info = self.packet_queue.get(timeout=1)
-                
-                # Process packet through callbacks
+                callback(batch)
+            except Exception as e:
+                self.logger.error(f"Error in batch callback: {e}")
+        
+        if self.columnar_callbacks:
+            columnar_batch = PacketBatch.from_packet_infos(batch)
+            for callback in self.columnar_callbacks:
+                try:
+                    callback(columnar_batch)
+                except Exception as e:
+                    self.logger.error(f"Error in columnar batch callback: {e}")
+        
+        if self.callbacks:
+            for packet_info in batch:
                 for callback in self.callbacks:
                     try:
                         callback(packet_info)
                     except Exception as e:
                         self.logger.error(f"Error in callback: {e}")
+        
+        self.stats['packets_processed'] += len(batch)
+        self.stats['batches_delivered'] += 1
+    
+    def _processing_worker(self):
+        """Worker thread for processing captured packets"""
+        while not self.stop_event.is_set():
+            try:
+                batch = self._collect_batch()
                 
-                self.stats['packets_processed'] += 1
-                self.packet_queue.task_done()
+                # Process packets through callbacks
+                started = time.perf_counter()
+                self._deliver_batch(batch)
+                self.load_controller.observe(self.packet_queue.qsize(), time.perf_counter() - started)
                 
             except Empty:
                 continue
@@ -253,7 +498,7 @@ class PacketSniffer:
     
     def start(self):
         """Start packet capture"""
-        if not SCAPY_AVAILABLE:
+        if not SCAPY_AVAILABLE and self.config['capture_backend'] == 'scapy':
             raise RuntimeError("Scapy is required for packet capture")
         
         if self.is_running:
@@ -279,6 +524,129 @@ class PacketSniffer:
     
     def _capture_worker(self):
         """Worker thread for packet capture"""
+        if self.config['capture_backend'] == 'pcap':
+            self._pcap_replay_loop()
+            return
+        
+        if self.config['capture_backend'] == 'tpacket_v3':
+            if self._open_capture_ring():
+                self._ring_capture_loop()
+                return
+            if not SCAPY_AVAILABLE:
+                self.logger.error("No capture backend available (scapy not installed)")
+                self.is_running = False
+                return
+            self.logger.warning("Falling back to scapy capture backend")
+        
+        self._scapy_capture_loop()
+    
+    def _open_capture_ring(self) -> bool:
+        """Open the TPACKET_V3 ring, returning False if it is unavailable"""
+        if not TPACKET_AVAILABLE:
+            self.logger.warning("TPACKET_V3 capture requires Linux AF_PACKET sockets")
+            return False
+        
+        program, exact = self._build_kernel_filter()
+        ring = TPacketV3Ring(
+            interface=self.interface,
+            block_size=self.config['ring_block_size'],
+            block_count=self.config['ring_block_count'],
+            frame_size=self.config['ring_frame_size'],
+            retire_timeout_ms=self.config['ring_retire_timeout_ms'],
+            fanout_group=self.config['fanout_group'],
+            bpf_program=program
+        )
+        try:
+            ring.open()
+        except (OSError, ValueError, RuntimeError) as e:
+            self.logger.error(f"Could not open TPACKET_V3 ring: {e}")
+            return False
+        
+        self.kernel_filter_active = exact
+        self.capture_ring = ring
+        return True
+    
+    def _ring_capture_loop(self):
+        """Capture loop for the tpacket_v3 backend"""
+        ring = self.capture_ring
+        timeout_ms = int(self.config['capture_timeout'] * 1000)
+        next_stats_update = time.time() + self.config['ring_stats_interval']
+        try:
+            while not self.stop_event.is_set():
+                ring.poll(self._frame_handler, timeout_ms)
+                
+                if time.time() >= next_stats_update:
+                    ring.update_kernel_stats()
+                    next_stats_update = time.time() + self.config['ring_stats_interval']
+        except Exception as e:
+            self.logger.error(f"Error in ring capture worker: {e}")
+            self.is_running = False
+        finally:
+            ring.close()
+    
+    def _pcap_replay_loop(self):
+        """Capture loop for the pcap backend: replay a capture file at replay_speed"""
+        pcap_file = self.config['pcap_file']
+        speed = self.config['replay_speed']
+        if self.filter_expression:
+            self.logger.warning("filter_expression is not applied by the pcap backend")
+        
+        self.replay_stats = {
+            'file': pcap_file,
+            'speed': speed,
+            'packets_replayed': 0,
+            'elapsed': 0.0,
+            'replay_pps': 0.0,
+            'capture_duration': 0.0,
+            'unsupported_linktype': 0,
+            'completed': False
+        }
+        replay = self.replay_stats
+        
+        try:
+            with PcapReader(pcap_file) as reader:
+                self.logger.info(f"Replaying {pcap_file} ({reader.format}) at "
+                                 f"{'max' if speed <= 0 else f'{speed}x'} speed")
+                first_timestamp = None
+                wall_start = time.monotonic()
+                
+                for frame, timestamp, linktype in reader:
+                    if self.stop_event.is_set():
+                        break
+                    
+                    # Pace against the capture timestamps
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    if speed > 0:
+                        delay = (timestamp - first_timestamp) / speed - (time.monotonic() - wall_start)
+                        if delay > 0 and self.stop_event.wait(delay):
+                            break
+                    
+                    if linktype not in SUPPORTED_LINKTYPES:
+                        replay['unsupported_linktype'] += 1
+                    self._replay_frame_handler(frame, timestamp, linktype)
+                    replay['packets_replayed'] += 1
+                else:
+                    replay['completed'] = True
+                
+                replay['elapsed'] = time.monotonic() - wall_start
+                replay['capture_duration'] = reader.get_stats().get('capture_duration', 0.0)
+                if replay['elapsed'] > 0:
+                    replay['replay_pps'] = replay['packets_replayed'] / replay['elapsed']
+            
+            if replay['unsupported_linktype']:
+                self.logger.warning(f"{replay['unsupported_linktype']} packets had an unsupported link type")
+            self.logger.info(
+                f"Replay {'finished' if replay['completed'] else 'stopped'}: "
+                f"{replay['packets_replayed']} packets in {replay['elapsed']:.2f}s "
+                f"({replay['replay_pps']:,.0f} pps)"
+            )
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not replay capture file {pcap_file}: {e}")
+            self.is_running = False
+    
+    def _scapy_capture_loop(self):
+        """Capture loop for the scapy backend"""
         try:
             sniff(
                 iface=self.interface,
@@ -318,6 +686,18 @@ class PacketSniffer:
             if stats['runtime'] > 0:
                 stats['packets_per_second'] = stats['packets_captured'] / stats['runtime']
                 stats['bytes_per_second'] = stats['bytes_captured'] / stats['runtime']
+        
+        stats['packet_queue'] = self.packet_queue.get_stats()
+        stats['load_shedding'] = self.load_controller.get_stats()
+        stats['sampling_rate'] = stats['load_shedding']['sampling_rate']
+        
+        if self.replay_stats:
+            stats['replay'] = self.replay_stats.copy()
+        
+        if self.capture_ring:
+            ring_stats = self.capture_ring.get_stats()
+            stats['capture_ring'] = ring_stats
+            stats['kernel_drops'] = ring_stats['kernel_drops']
         return stats
     
     def get_available_interfaces(self) -> List[str]:
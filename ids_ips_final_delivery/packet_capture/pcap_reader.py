@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Capture File Reader for IDS/IPS System
+Streams packets from pcap and pcapng files through a read-only mmap
+"""
+
+import mmap
+import struct
+import logging
+from typing import Dict, Iterator, Optional, Tuple
+
+# Classic pcap magic numbers (microsecond and nanosecond timestamps)
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+
+# pcapng block types
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_OBSOLETE_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Interface description options
+PCAPNG_OPT_END = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+PCAPNG_OPT_IF_TSOFFSET = 14
+
+# Frame, timestamp (seconds since the epoch), pcap link-layer type
+CapturedFrame = Tuple[memoryview, float, int]
+
+
+class PcapReader:
+    """
+    Streaming reader for pcap and pcapng capture files.
+
+    The file is mapped read-only and frames are yielded as memoryview
+    slices of the mapping, so nothing is loaded up front and no payload is
+    copied. A frame is only valid until the next one is requested; callers
+    that keep frames must copy them.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the reader
+
+        Args:
+            path: Path to a .pcap or .pcapng file
+        """
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+
+        self.format: Optional[str] = None
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+        self.stats = {
+            'packets_read': 0,
+            'bytes_read': 0,
+            'blocks_skipped': 0,
+            'first_timestamp': None,
+            'last_timestamp': None
+        }
+
+    def open(self):
+        """Map the file and detect its format"""
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            self._file = None
+            raise ValueError(f"{self.path} is empty")
+        self._view = memoryview(self._map)
+
+        if len(self._view) < 4:
+            self.close()
+            raise ValueError(f"{self.path} is too short to be a capture file")
+
+        magic_le, = struct.unpack_from("<I", self._view, 0)
+        magic_be, = struct.unpack_from(">I", self._view, 0)
+        if magic_le == PCAPNG_SECTION_HEADER:
+            self.format = 'pcapng'
+        elif PCAP_MAGIC_USEC in (magic_le, magic_be) or PCAP_MAGIC_NSEC in (magic_le, magic_be):
+            self.format = 'pcap'
+        else:
+            self.close()
+            raise ValueError(f"{self.path} is not a pcap or pcapng file")
+
+    def close(self):
+        """Unmap and close the file"""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a frame; the mapping is freed with it
+                self.logger.warning(f"Frames from {self.path} still referenced at close")
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'PcapReader':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self) -> Iterator[CapturedFrame]:
+        if self._view is None:
+            self.open()
+        packets = self._read_pcapng() if self.format == 'pcapng' else self._read_pcap()
+        for frame, timestamp, linktype in packets:
+            self._record(frame, timestamp)
+            try:
+                yield frame, timestamp, linktype
+            finally:
+                frame.release()
+
+    def _record(self, frame: memoryview, timestamp: float):
+        self.stats['packets_read'] += 1
+        self.stats['bytes_read'] += len(frame)
+        if self.stats['first_timestamp'] is None:
+            self.stats['first_timestamp'] = timestamp
+        self.stats['last_timestamp'] = timestamp
+
+    def _read_pcap(self) -> Iterator[CapturedFrame]:
+        view = self._view
+        size = len(view)
+        if size < 24:
+            return
+
+        magic, = struct.unpack_from("<I", view, 0)
+        endian = "<" if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else ">"
+        magic, = struct.unpack_from(endian + "I", view, 0)
+        resolution = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+
+        network, = struct.unpack_from(endian + "I", view, 20)
+        linktype = network & 0x0FFFFFFF  # upper bits may carry FCS information
+
+        record = struct.Struct(endian + "IIII")
+        offset = 24
+        while offset + 16 <= size:
+            ts_sec, ts_frac, incl_len, _ = record.unpack_from(view, offset)
+            start = offset + 16
+            end = start + incl_len
+            if end > size:
+                self.logger.warning(f"Truncated packet record at offset {offset} in {self.path}")
+                break
+            yield view[start:end], ts_sec + ts_frac * resolution, linktype
+            offset = end
+
+    def _read_pcapng(self) -> Iterator[CapturedFrame]:
+        view = self._view
+        size = len(view)
+        endian = "<"
+        interfaces = []  # (linktype, resolution, offset) per interface in this section
+        last_timestamp = 0.0
+
+        offset = 0
+        while offset + 12 <= size:
+            block_type, = struct.unpack_from(endian + "I", view, offset)
+
+            if block_type == PCAPNG_SECTION_HEADER:
+                # Each section declares its own byte order
+                bom_le, = struct.unpack_from("<I", view, offset + 8)
+                endian = "<" if bom_le == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+
+            block_len, = struct.unpack_from(endian + "I", view, offset + 4)
+            if block_len < 12 or block_len % 4 or offset + block_len > size:
+                self.logger.warning(f"Invalid or truncated block at offset {offset} in {self.path}")
+                break
+            body = offset + 8
+            body_end = offset + block_len - 4
+
+            if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+                linktype, _, _ = struct.unpack_from(endian + "HHI", view, body)
+                resolution, ts_offset = self._interface_options(view, body + 8, body_end, endian)
+                interfaces.append((linktype, resolution, ts_offset))
+
+            elif block_type == PCAPNG_ENHANCED_PACKET:
+                iface, ts_high, ts_low, caplen, _ = struct.unpack_from(endian + "IIIII", view, body)
+                if iface < len(interfaces):
+                    linktype, resolution, ts_offset = interfaces[iface]
+                    last_timestamp = ((ts_high << 32) | ts_low) * resolution + ts_offset
+                    start = body + 20
+                    yield view[start:start + caplen], last_timestamp, linktype
+
+            elif block_type == PCAPNG_OBSOLETE_PACKET:
+                iface, _, ts_high, ts_low, caplen, _ = struct.unpack_from(endian + "HHIIII", view, body)
+                if iface < len(interfaces):
+                    linktype, resolution, ts_offset = interfaces[iface]
+                    last_timestamp = ((ts_high << 32) | ts_low) * resolution + ts_offset
+                    start = body + 20
+                    yield view[start:start + caplen], last_timestamp, linktype
+
+            elif block_type == PCAPNG_SIMPLE_PACKET:
+                # Simple packets have no timestamp; reuse the last one seen
+                if interfaces:
+                    orig_len, = struct.unpack_from(endian + "I", view, body)
+                    start = body + 4
+                    caplen = min(orig_len, body_end - start)
+                    yield view[start:start + caplen], last_timestamp, interfaces[0][0]
+
+            elif block_type != PCAPNG_SECTION_HEADER:
+                self.stats['blocks_skipped'] += 1
+
+            offset += block_len
+
+    def _interface_options(self, view: memoryview, offset: int, end: int,
+                           endian: str) -> Tuple[float, float]:
+        """Read the timestamp resolution and offset from interface options"""
+        resolution = 1e-6
+        ts_offset = 0.0
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", view, offset)
+            value = offset + 4
+            if code == PCAPNG_OPT_END:
+                break
+            if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                tsresol = view[value]
+                resolution = 2.0 ** -(tsresol & 0x7F) if tsresol & 0x80 else 10.0 ** -tsresol
+            elif code == PCAPNG_OPT_IF_TSOFFSET and length >= 8:
+                ts_offset = float(struct.unpack_from(endian + "q", view, value)[0])
+            offset = value + ((length + 3) & ~3)
+        return resolution, ts_offset
+
+    def get_stats(self) -> Dict:
+        """Get reader statistics"""
+        stats = self.stats.copy()
+        stats['format'] = self.format
+        if stats['first_timestamp'] is not None:
+            stats['capture_duration'] = stats['last_timestamp'] - stats['first_timestamp']
+        return stats
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Single-Producer/Single-Consumer Ring for IDS/IPS System
+Preallocated bounded ring used in place of queue.Queue between pipeline threads
+"""
+
+import time
+import threading
+from queue import Empty, Full
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SPSCRing:
+    """
+    Bounded ring buffer for exactly one producer thread and one consumer thread.
+
+    Slots are preallocated and each side only advances its own index, so the
+    fast paths take no lock: the producer writes a slot and then publishes it
+    by moving ``_tail``; the consumer reads it and then frees it by moving
+    ``_head`` (each a single atomic store under the GIL). An Event is only
+    touched when the other side is actually waiting.
+
+    The interface mirrors queue.Queue (put/get with block and timeout,
+    put_nowait/get_nowait, qsize/empty/full, task_done) so it can replace
+    the pipeline queues directly, and adds put_many/get_many, a high-water
+    mark and exact counters. ``dropped`` counts items refused by the
+    non-blocking puts (put_nowait, put(block=False), put_many overflow);
+    blocking puts that time out are counted separately in ``put_timeouts``
+    because the caller still owns the item and may retry it. join() is not
+    supported; task_done() is accepted and ignored.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        """
+        Initialize the ring
+
+        Args:
+            maxsize: Capacity in items (rounded up to a power of two internally)
+        """
+        if maxsize <= 0:
+            raise ValueError("SPSCRing needs a positive maxsize")
+        self.maxsize = maxsize
+        capacity = 1
+        while capacity < maxsize:
+            capacity <<= 1
+        self._mask = capacity - 1
+        self._slots: List[Any] = [None] * capacity
+
+        # Monotonic indices: _head is only written by the consumer, _tail by the producer
+        self._head = 0
+        self._tail = 0
+
+        self._not_empty = threading.Event()
+        self._not_full = threading.Event()
+        self._consumer_waiting = False
+        self._producer_waiting = False
+
+        self.high_watermark = 0
+        self.dropped = 0
+        self.put_timeouts = 0
+
+    # Producer side
+
+    def put_nowait(self, item: Any):
+        """Add an item, raising queue.Full (and counting a drop) if the ring is full"""
+        tail = self._tail
+        if tail - self._head >= self.maxsize:
+            self.dropped += 1
+            raise Full
+        self._slots[tail & self._mask] = item
+        self._tail = tail = tail + 1
+        if tail - self._head > self.high_watermark:
+            self.high_watermark = tail - self._head
+        if self._consumer_waiting:
+            self._not_empty.set()
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None):
+        """Add an item, waiting up to ``timeout`` seconds for space when ``block`` is set"""
+        if not block or self._tail - self._head < self.maxsize:
+            return self.put_nowait(item)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._tail - self._head >= self.maxsize:
+            self._not_full.clear()
+            self._producer_waiting = True
+            try:
+                # Re-check after announcing the wait so a concurrent get cannot be missed
+                if self._tail - self._head < self.maxsize:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.put_timeouts += 1
+                    raise Full
+                self._not_full.wait(remaining)
+            finally:
+                self._producer_waiting = False
+
+        tail = self._tail
+        self._slots[tail & self._mask] = item
+        self._publish(tail + 1)
+
+    def put_many(self, items: Iterable[Any]) -> int:
+        """Add as many items as fit without blocking; returns the number added (the rest count as drops)"""
+        items = list(items)
+        tail = self._tail
+        space = self.maxsize - (tail - self._head)
+        accepted = min(space, len(items))
+        slots, mask = self._slots, self._mask
+        for i in range(accepted):
+            slots[(tail + i) & mask] = items[i]
+        self.dropped += len(items) - accepted
+        if accepted:
+            self._publish(tail + accepted)
+        return accepted
+
+    def _publish(self, tail: int):
+        self._tail = tail
+        depth = tail - self._head
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        if self._consumer_waiting:
+            self._not_empty.set()
+
+    # Consumer side
+
+    def get_nowait(self) -> Any:
+        """Remove and return an item, raising queue.Empty if the ring is empty"""
+        head = self._head
+        if head == self._tail:
+            raise Empty
+        index = head & self._mask
+        slots = self._slots
+        item = slots[index]
+        slots[index] = None
+        self._head = head + 1
+        if self._producer_waiting:
+            self._not_full.set()
+        return item
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """Remove and return an item, waiting up to ``timeout`` seconds when ``block`` is set"""
+        if block and self._head == self._tail:
+            self._wait_for_items(timeout)
+        return self.get_nowait()
+
+    def get_many(self, max_items: int, timeout: Optional[float] = 0) -> List[Any]:
+        """
+        Remove up to ``max_items`` items
+
+        Waits up to ``timeout`` seconds (None = forever, 0 = not at all) for
+        the first item and returns whatever is available then, possibly an
+        empty list.
+        """
+        if timeout != 0:
+            try:
+                self._wait_for_items(timeout)
+            except Empty:
+                return []
+
+        head = self._head
+        count = min(max_items, self._tail - head)
+        if count <= 0:
+            return []
+        slots, mask = self._slots, self._mask
+        items = []
+        for i in range(head, head + count):
+            index = i & mask
+            items.append(slots[index])
+            slots[index] = None
+        self._release(head + count)
+        return items
+
+    def _wait_for_items(self, timeout: Optional[float]):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._head == self._tail:
+            self._not_empty.clear()
+            self._consumer_waiting = True
+            try:
+                # Re-check after announcing the wait so a concurrent put cannot be missed
+                if self._head != self._tail:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._not_empty.wait(remaining)
+            finally:
+                self._consumer_waiting = False
+
+    def _release(self, head: int):
+        self._head = head
+        if self._producer_waiting:
+            self._not_full.set()
+
+    def task_done(self):
+        """Accepted for queue.Queue compatibility; the ring does not track unfinished tasks"""
+
+    # Introspection (approximate while the other side is running, like queue.Queue)
+
+    def qsize(self) -> int:
+        return self._tail - self._head
+
+    def empty(self) -> bool:
+        return self._tail == self._head
+
+    def full(self) -> bool:
+        return self._tail - self._head >= self.maxsize
+
+    def get_stats(self) -> Dict:
+        """Get ring statistics"""
+        return {
+            'capacity': self.maxsize,
+            'size': self.qsize(),
+            'high_watermark': self.high_watermark,
+            'enqueued': self._tail,
+            'dequeued': self._head,
+            'dropped': self.dropped,
+            'put_timeouts': self.put_timeouts
+        }
@@ -78,6 +78,9 @@ class IPBlocker:
             'start_time': time.time()
         }
         
+        # Called with the blocked addresses whenever the blocklist changes
+        self.block_callbacks = []
+        
         # Threading
         self._lock = threading.RLock()
         self.cleanup_thread = None
@@ -265,6 +268,7 @@ class IPBlocker:
                 self.blocked_ips.add(ip_address)
                 self.stats['total_blocks'] += 1
                 self.stats['active_blocks'] += 1
+                self._notify_block_callbacks()
                 
                 self.logger.info(f"Blocked IP {ip_address}: {reason} (Rule ID: {rule.rule_id})")
             else:
@@ -311,6 +315,7 @@ class IPBlocker:
                 self.blocked_ips.discard(ip_address)
                 self.stats['total_unblocks'] += 1
                 self.stats['active_blocks'] -= 1
+                self._notify_block_callbacks()
                 
                 self.logger.info(f"Unblocked IP {ip_address} (Rule ID: {rule_to_remove.rule_id})")
             else:
@@ -326,6 +331,20 @@ class IPBlocker:
                 method=method
             )
     
+    def add_block_callback(self, callback):
+        """Call ``callback(blocked_ips)`` now and whenever an address is blocked or unblocked"""
+        with self._lock:
+            self.block_callbacks.append(callback)
+            callback(frozenset(self.blocked_ips))
+    
+    def _notify_block_callbacks(self):
+        blocked = frozenset(self.blocked_ips)
+        for callback in self.block_callbacks:
+            try:
+                callback(blocked)
+            except Exception as e:
+                self.logger.error(f"Error in block callback: {e}")
+    
     def _apply_block(self, rule: BlockRule) -> Tuple[bool, str, str]:
         """Apply a blocking rule using platform-specific method"""
         
@@ -13,15 +13,21 @@ from pathlib import Path
 from typing import Dict, List, Optional, Callable
 import json
 import queue
+from functools import partial
 
 # Add paths for imports
 sys.path.append(str(Path(__file__).parent))
 
+from packet_capture.spsc_ring import SPSCRing
+from packet_capture.flow_verdicts import FlowVerdictTable
+from detection_engine.clock import EventClock
+
 try:
     from packet_capture.packet_sniffer import PacketSniffer, PacketInfo
-    from detection_engine.signature_detector import SignatureDetector, DetectionResult
+    from packet_capture.capture_workers import CaptureWorkerPool
+    from detection_engine.signature_detector import SignatureDatabase, SignatureDetector, DetectionResult
     from detection_engine.anomaly_detector import AnomalyDetector
-    from detection_engine.ml_detector import MLDetector
+    from detection_engine.ml_detector import MLDetectionEngine
     from logging_system.logger import SecurityLogger
     from simple_detector import SimpleRealDetector
     COMPONENTS_AVAILABLE = True
@@ -39,13 +45,21 @@ class RealIDSEngine:
     Real-time IDS/IPS Engine that performs actual network monitoring and threat detection
     """
     
-    def __init__(self, interface: str = None, db_manager=None):
+    def __init__(self, interface: str = None, db_manager=None, capture_workers: int = 1,
+                 fanout_group: Optional[int] = None, worker_id: Optional[int] = None,
+                 clean_bypass_bytes: int = 1048576):
         """
         Initialize the real IDS engine
         
         Args:
             interface: Network interface to monitor (None for auto-detect)
             db_manager: Database manager for storing threats
+            capture_workers: Number of capture processes; above 1 each process runs its
+                own sniffer and detectors on a PACKET_FANOUT_HASH share of the traffic
+            fanout_group: PACKET_FANOUT group to join (set for sharded worker engines)
+            worker_id: Index of this engine within a sharded pool
+            clean_bypass_bytes: Payload bytes after which a flow nobody alerted on skips the
+                payload detectors (0 = inspect every flow to the end)
         """
         # Setup logging first
         self.logger = self._setup_logging()
@@ -53,11 +67,23 @@ class RealIDSEngine:
         self.interface = interface or self._detect_interface()
         self.db_manager = db_manager
         self.running = False
+        self.capture_workers = capture_workers
+        self.fanout_group = fanout_group
+        self.worker_id = worker_id
+        self.clean_bypass_bytes = clean_bypass_bytes
+        self.worker_pool = None
         
         # Initialize components
-        self.packet_queue = queue.Queue(maxsize=1000)
+        self.packet_queue = SPSCRing(maxsize=64)  # batches of packets (sniffer worker -> processor)
         self.threat_queue = queue.Queue(maxsize=100)
         
+        # Detection time is packet event time, shared by every windowed component
+        self.clock = EventClock()
+        
+        # Per-flow verdicts: packets of alerted, trusted or bypassed flows skip the payload
+        # detectors; bulk transfers are bypassed once they carried clean_bypass_bytes
+        self.flow_verdicts = FlowVerdictTable(clock=self.clock, clean_bypass_bytes=clean_bypass_bytes)
+        
         # Detection engines
         self.signature_detector = None
         self.anomaly_detector = None
@@ -70,12 +96,20 @@ class RealIDSEngine:
         self.stats = {
             'packets_captured': 0,
             'packets_processed': 0,
+            'packets_bypassed': 0,
+            'packets_dropped': 0,  # whole batches the detection queue had no room for
+            'batches_dropped': 0,
             'threats_detected': 0,
             'false_positives': 0,
             'start_time': None,
             'last_packet_time': None
         }
         
+        if self.capture_workers > 1:
+            # Sniffers and detectors live in the worker processes
+            self.simple_detector = None
+            return
+        
         # Initialize detection engines
         self._initialize_detection_engines()
         
@@ -128,21 +162,29 @@ class RealIDSEngine:
             
             # Try to initialize advanced detectors
             try:
-                self.signature_detector = SignatureDetector()
+                # Compiled ruleset is cached next to the database, so restarts and workers skip compiling
+                signature_db = SignatureDatabase(str(Path(__file__).parent / "detection_engine" / "signatures.json"))
+                self.signature_detector = SignatureDetector(signature_db, clock=self.clock)
                 self.logger.info("✅ Signature detector initialized")
             except Exception as e:
                 self.logger.warning(f"⚠️ Signature detector failed: {e}")
                 self.signature_detector = None
             
             try:
-                self.anomaly_detector = AnomalyDetector()
+                # Learned baseline survives restarts (one file per capture worker, next to the log DBs)
+                baseline_name = ("anomaly_baseline.bin" if self.worker_id is None
+                                 else f"anomaly_baseline.w{self.worker_id}.bin")
+                baseline_dir = Path(__file__).parent / "logs"
+                baseline_dir.mkdir(exist_ok=True)
+                self.anomaly_detector = AnomalyDetector(baseline_path=str(baseline_dir / baseline_name),
+                                                        clock=self.clock)
                 self.logger.info("✅ Anomaly detector initialized")
             except Exception as e:
                 self.logger.warning(f"⚠️ Anomaly detector failed: {e}")
                 self.anomaly_detector = None
             
             try:
-                self.ml_detector = MLDetector()
+                self.ml_detector = MLDetectionEngine(clock=self.clock)
                 self.logger.info("✅ ML detector initialized")
             except Exception as e:
                 self.logger.warning(f"⚠️ ML detector failed: {e}")
@@ -160,8 +202,15 @@ class RealIDSEngine:
                     filter_expression="ip"  # Monitor IP traffic only
                 )
                 
-                # Add packet processing callback
-                self.packet_sniffer.add_callback(self._process_packet)
+                if self.fanout_group is not None:
+                    # Sharded worker: join the fanout group on a TPACKET_V3 ring
+                    self.packet_sniffer.configure(
+                        capture_backend='tpacket_v3',
+                        fanout_group=self.fanout_group
+                    )
+                
+                # Add batch processing callback
+                self.packet_sniffer.add_batch_callback(self._process_packet_batch)
                 self.logger.info(f"✅ Packet sniffer initialized on interface: {self.interface}")
             else:
                 self.logger.warning("⚠️ Packet sniffer not available - components missing")
@@ -169,65 +218,74 @@ class RealIDSEngine:
         except Exception as e:
             self.logger.error(f"❌ Error initializing packet sniffer: {e}")
     
-    def _process_packet(self, packet_info: PacketInfo):
-        """Process captured packet through detection engines"""
+    def _process_packet_batch(self, packets: List[PacketInfo]):
+        """Queue a batch of captured packets for the detection engines"""
         try:
-            self.stats['packets_captured'] += 1
+            self.stats['packets_captured'] += len(packets)
             self.stats['last_packet_time'] = datetime.now()
             
-            # Add to processing queue (non-blocking)
+            # Add to processing queue (non-blocking); the load controller sees its depth
+            # and starts sampling flows before it fills, so drops are only counted here
             try:
-                self.packet_queue.put_nowait(packet_info)
+                self.packet_queue.put_nowait(packets)
             except queue.Full:
-                self.logger.warning("Packet queue full - dropping packet")
+                self.stats['batches_dropped'] += 1
+                self.stats['packets_dropped'] += len(packets)
             
         except Exception as e:
-            self.logger.error(f"Error processing packet: {e}")
+            self.logger.error(f"Error processing packet batch: {e}")
+    
+    def _analyze_batch(self, detector, packets: List[PacketInfo]) -> List[List]:
+        """Run a detector over a batch, using its batch API when it has one"""
+        if hasattr(detector, 'analyze_batch'):
+            return detector.analyze_batch(packets)
+        return [detector.analyze_packet(packet_info) for packet_info in packets]
     
     def _packet_processor_thread(self):
-        """Background thread to process packets from queue"""
+        """Background thread to process packet batches from queue"""
+        # (attribute, name, sees bypassed packets): volume and rate tracking needs every packet
+        engines = (
+            ('simple_detector', "Simple", False),
+            ('signature_detector', "Signature", False),
+            ('anomaly_detector', "Anomaly", True),
+            ('ml_detector', "ML", False),
+        )
+        
         while self.running:
             try:
-                # Get packet from queue (with timeout)
-                packet_info = self.packet_queue.get(timeout=1.0)
-                
-                self.stats['packets_processed'] += 1
+                # Get batch from queue (with timeout)
+                batch = self.packet_queue.get(timeout=1.0)
+                started = time.perf_counter()
                 
-                # Run through all detection engines
-                threats = []
+                self.stats['packets_processed'] += len(batch)
                 
-                # Simple detector (always runs)
-                if hasattr(self, 'simple_detector') and self.simple_detector:
-                    simple_results = self.simple_detector.analyze_packet(packet_info)
-                    threats.extend(simple_results)
+                # Packets of flows that already have a verdict are not inspected
+                packets = self.flow_verdicts.filter_batch(batch)
+                self.stats['packets_bypassed'] += len(batch) - len(packets)
                 
-                # Advanced signature detection
-                if self.signature_detector:
-                    try:
-                        sig_results = self.signature_detector.analyze_packet(packet_info)
-                        threats.extend(sig_results)
-                    except Exception as e:
-                        self.logger.warning(f"Signature detection error: {e}")
-                
-                # Anomaly detection
-                if self.anomaly_detector:
+                # Run through all detection engines
+                detected = []
+                for attr, name, sees_bypassed in engines:
+                    detector = getattr(self, attr, None)
+                    if not detector:
+                        continue
+                    inspected = batch if sees_bypassed else packets
                     try:
-                        anom_results = self.anomaly_detector.analyze_packet(packet_info)
-                        threats.extend(anom_results)
+                        for packet_info, results in zip(inspected, self._analyze_batch(detector, inspected)):
+                            detected.extend((threat, packet_info, attr) for threat in results)
                     except Exception as e:
-                        self.logger.warning(f"Anomaly detection error: {e}")
+                        self.logger.warning(f"{name} detection error: {e}")
                 
-                # ML detection
-                if self.ml_detector:
-                    try:
-                        ml_results = self.ml_detector.analyze_packet(packet_info)
-                        threats.extend(ml_results)
-                    except Exception as e:
-                        self.logger.warning(f"ML detection error: {e}")
+                # Process any detected threats; only signature hits settle a flow's verdict
+                for threat, packet_info, attr in detected:
+                    self._handle_threat_detection(threat, packet_info,
+                                                  mark_flow=attr == 'signature_detector')
                 
-                # Process any detected threats
-                for threat in threats:
-                    self._handle_threat_detection(threat, packet_info)
+                # Detection backlog and latency drive load shedding in the sniffer
+                if self.packet_sniffer:
+                    self.packet_sniffer.load_controller.observe(
+                        self.packet_queue.qsize(), time.perf_counter() - started,
+                        queue_capacity=self.packet_queue.maxsize, stage="detection")
                 
                 self.packet_queue.task_done()
                 
@@ -236,14 +294,18 @@ class RealIDSEngine:
             except Exception as e:
                 self.logger.error(f"Error in packet processor: {e}")
     
-    def _handle_threat_detection(self, detection_result, packet_info: PacketInfo):
-        """Handle a detected threat"""
+    def _handle_threat_detection(self, detection_result, packet_info: PacketInfo, mark_flow: bool = False):
+        """Handle a detected threat (``mark_flow``: stop inspecting the rest of its flow)"""
         try:
             self.stats['threats_detected'] += 1
             
+            threat_number = self.stats['threats_detected']
+            if self.worker_id is not None:
+                threat_number = f"W{self.worker_id}_{threat_number}"
+            
             # Create threat data structure
             threat_data = {
-                'threat_id': f"REAL_{int(time.time() * 1000)}_{self.stats['threats_detected']}",
+                'threat_id': f"REAL_{int(time.time() * 1000)}_{threat_number}",
                 'timestamp': datetime.now().isoformat(),
                 'source_ip': packet_info.src_ip,
                 'destination_ip': packet_info.dst_ip,
@@ -267,24 +329,47 @@ class RealIDSEngine:
                 }
             }
             
+            # A signature matched the flow: skip inspecting the rest of it for a while
+            if mark_flow:
+                self.flow_verdicts.mark_alerted(
+                    packet_info.src_ip, packet_info.dst_ip, packet_info.src_port,
+                    packet_info.dst_port, packet_info.protocol)
+            
+            # Keep the whole flow in view if the sniffer starts sampling under overload
+            if self.packet_sniffer:
+                self.packet_sniffer.load_controller.flag_flow(
+                    packet_info.src_ip, packet_info.dst_ip, packet_info.src_port,
+                    packet_info.dst_port, packet_info.protocol)
+            
             # Log the threat
             self.logger.warning(f"🚨 REAL THREAT DETECTED: {threat_data['threat_type']} from {threat_data['source_ip']}")
             
-            # Save to database if available
-            if self.db_manager:
-                success = self.db_manager.save_threat(threat_data)
-                if success:
-                    self.logger.info(f"💾 Real threat saved to database")
-            
-            # Add to threat queue for real-time updates
-            try:
-                self.threat_queue.put_nowait(threat_data)
-            except queue.Full:
-                self.logger.warning("Threat queue full")
+            self._publish_threat(threat_data)
             
         except Exception as e:
             self.logger.error(f"Error handling threat detection: {e}")
     
+    def _publish_threat(self, threat_data: Dict):
+        """Save a threat and queue it for real-time updates"""
+        # Save to database if available
+        if self.db_manager:
+            success = self.db_manager.save_threat(threat_data)
+            if success:
+                self.logger.info(f"💾 Real threat saved to database")
+        
+        # Add to threat queue for real-time updates
+        try:
+            self.threat_queue.put_nowait(threat_data)
+        except queue.Full:
+            self.logger.warning("Threat queue full")
+    
+    def _handle_worker_threat(self, worker_id: int, threat_data: Dict):
+        """Handle a threat forwarded by a capture worker process"""
+        try:
+            self._publish_threat(threat_data)
+        except Exception as e:
+            self.logger.error(f"Error handling threat from worker {worker_id}: {e}")
+    
     def start(self):
         """Start the real-time IDS engine"""
         if self.running:
@@ -295,6 +380,9 @@ class RealIDSEngine:
         self.running = True
         self.stats['start_time'] = datetime.now()
         
+        if self.capture_workers > 1:
+            return self._start_workers()
+        
         try:
             # Start packet processor thread
             self.processor_thread = threading.Thread(
@@ -322,6 +410,24 @@ class RealIDSEngine:
             self.running = False
             return False
     
+    def _start_workers(self) -> bool:
+        """Start sharded capture worker processes"""
+        try:
+            self.worker_pool = CaptureWorkerPool(
+                partial(_create_worker_engine, self.interface, clean_bypass_bytes=self.clean_bypass_bytes),
+                workers=self.capture_workers,
+                fanout_group=self.fanout_group,
+                on_event=self._handle_worker_threat
+            )
+            self.worker_pool.start()
+            self.logger.info(f"🔥 Real-time IDS Engine is now ACTIVE with {self.capture_workers} capture workers!")
+            self.logger.info(f"🎯 Monitoring interface: {self.interface}")
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ Failed to start capture workers: {e}")
+            self.running = False
+            return False
+    
     def stop(self):
         """Stop the real-time IDS engine"""
         if not self.running:
@@ -330,16 +436,44 @@ class RealIDSEngine:
         self.logger.info("🛑 Stopping Real-time IDS Engine...")
         self.running = False
         
+        # Stop capture workers
+        if self.worker_pool:
+            self.worker_pool.stop()
+            self.logger.info("✅ Capture workers stopped")
+        
         # Stop packet capture
         if self.packet_sniffer:
             self.packet_sniffer.stop()
             self.logger.info("✅ Packet capture stopped")
         
+        # Save the learned baseline for the next start
+        if self.anomaly_detector:
+            self.anomaly_detector.stop_snapshots()
+            self.logger.info("✅ Anomaly baseline saved")
+        
         self.logger.info("✅ Real-time IDS Engine stopped")
     
     def get_stats(self) -> Dict:
-        """Get current statistics"""
+        """Get current statistics (merged across capture workers when sharded)"""
         stats = self.stats.copy()
+        if self.worker_pool:
+            worker_stats = self.worker_pool.get_stats()
+            for key in ('packets_captured', 'packets_processed', 'packets_bypassed', 'packets_dropped',
+                        'batches_dropped', 'threats_detected', 'false_positives'):
+                stats[key] = worker_stats.get(key) or 0
+            stats['last_packet_time'] = max(
+                (w['last_packet_time'] for w in worker_stats['per_worker'] if w.get('last_packet_time')),
+                default=None
+            )
+            stats['workers'] = worker_stats
+        else:
+            stats['packet_queue'] = self.packet_queue.get_stats()
+            stats['flow_verdicts'] = self.flow_verdicts.get_stats()
+            stats['clock'] = self.clock.get_stats()
+            if self.packet_sniffer:
+                stats['load_shedding'] = self.packet_sniffer.load_controller.get_stats()
+                stats['sampling_rate'] = stats['load_shedding']['sampling_rate']
+        
         if stats['start_time']:
             uptime = datetime.now() - stats['start_time']
             stats['uptime_seconds'] = uptime.total_seconds()
@@ -364,6 +498,13 @@ class RealIDSEngine:
         return self.running
 
 
+def _create_worker_engine(interface: str, worker_id: int, fanout_group: int,
+                          clean_bypass_bytes: int = 1048576) -> RealIDSEngine:
+    """Build the engine run by one sharded capture worker process"""
+    return RealIDSEngine(interface=interface, fanout_group=fanout_group, worker_id=worker_id,
+                         clean_bypass_bytes=clean_bypass_bytes)
+
+
 # Test function
 def test_real_ids():
     """Test the real IDS engine"""
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Baseline Snapshot Check for IDS/IPS
+Saves a learned anomaly baseline and restores it into a fresh one (written
+by the calling thread and by a forked child), checking that every summary
+and the learned time come back unchanged; then checks that stale snapshots,
+files that are not snapshots and saves while the previous writer is still
+running are refused, that no child is forked while other threads run, and
+that a detector warm-started from a snapshot needs no new learning period
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.anomaly_detector import AnomalyDetector, NetworkBaseline
+from detection_engine.clock import EventClock
+
+failures = 0
+
+
+def expect(description: str, actual, expected):
+    global failures
+    if actual == expected:
+        print(f"ok  {description}")
+    else:
+        failures += 1
+        print(f"❌  {description}: got {actual!r:.300}, expected {expected!r:.300}")
+
+
+def rounded(value):
+    """Floats rounded to 6 decimals, recursively (running sums drift in the last bits)"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(rounded(item) for item in value)
+    return value
+
+
+def learned_baseline(seed: int = 1, seconds: float = 1800.0) -> NetworkBaseline:
+    """A baseline fed half an hour of mixed traffic"""
+    rng = random.Random(seed)
+    baseline = NetworkBaseline(window_size=500, learning_period=3600, clock=EventClock())
+    start = time.time() - 86400
+    t = 0.0
+    while t < seconds:
+        t += rng.expovariate(2.0)
+        baseline.update(PacketInfo(
+            timestamp=start + t, src_ip=f"10.0.0.{rng.randint(1, 30)}", dst_ip=f"10.0.1.{rng.randint(1, 4)}",
+            src_port=rng.randint(1024, 65535), dst_port=rng.choice([22, 53, 80, 443]),
+            protocol=rng.choice(["TCP", "TCP", "UDP", "ICMP"]), packet_size=rng.choice([60, 576, 1500]),
+            flags="ACK", payload_size=0))
+    return baseline
+
+
+def summaries(baseline: NetworkBaseline):
+    """Everything the detector reads from a baseline"""
+    return rounded({
+        'packet_rate': baseline.get_packet_rate_stats(),
+        'byte_rate': baseline.get_byte_rate_stats(),
+        'protocols': baseline.get_protocol_distribution(),
+        'ports': baseline.get_port_usage_stats(),
+        'ips': {ip: baseline.get_ip_stats(ip) for ip in sorted(baseline.ip_stats)},
+        'hours': {hour: {key: (len(window), window.total, window.mean, window.std)
+                         for key, window in stat.items()}
+                  for hour, stat in sorted(baseline.hourly_stats.items())}
+    })
+
+
+def check_round_trip(directory: Path, source: NetworkBaseline, use_fork: bool):
+    path = directory / f"round_trip_{'fork' if use_fork else 'thread'}.bin"
+    saved = source.save_snapshot(str(path), use_fork=use_fork)
+    source.reap_snapshot(block=True)
+    mode = "forked child" if use_fork and hasattr(os, 'fork') else "calling thread"
+    expect(f"save ({mode}) succeeds", (saved, source.snapshot_stats['failed']), (True, 0))
+
+    restored = NetworkBaseline(window_size=500, learning_period=3600, clock=EventClock())
+    expect(f"restore ({mode}) succeeds", restored.load_snapshot(str(path), max_age=3600), True)
+    expect(f"restored summaries ({mode}) are unchanged", summaries(restored), summaries(source))
+    expect(f"restored learned time ({mode}) is unchanged",
+           round(restored.learned_seconds(), 6), round(source.learned_seconds(), 6))
+
+
+def check_rejections(directory: Path, source: NetworkBaseline):
+    path = directory / "stale.bin"
+    stale = dict(source.snapshot(), saved_at=time.time() - 2 * 86400)
+    NetworkBaseline._write_snapshot(path, stale)
+    fresh = NetworkBaseline(clock=EventClock())
+    expect("snapshot older than max_age is ignored",
+           (fresh.load_snapshot(str(path), max_age=86400), fresh.learned_seconds()), (False, 0.0))
+    expect("the same snapshot loads within a larger max_age", fresh.load_snapshot(str(path), max_age=3 * 86400),
+           True)
+
+    path = directory / "not_a_snapshot.bin"
+    path.write_bytes(b"PK\x03\x04 definitely not a baseline")
+    fresh = NetworkBaseline(clock=EventClock())
+    expect("file without the snapshot magic is ignored", fresh.load_snapshot(str(path), max_age=86400), False)
+    expect("missing snapshot is ignored", fresh.load_snapshot(str(directory / "missing.bin"), max_age=86400),
+           False)
+
+
+def check_busy_writer(directory: Path, source: NetworkBaseline):
+    # A child that is still running stands in for a snapshot writer that has not finished
+    writer = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    source._snapshot_pid = writer.pid
+    skipped = source.snapshot_stats['skipped']
+    try:
+        expect("save while the previous writer runs is skipped",
+               (source.save_snapshot(str(directory / "busy.bin")), source.snapshot_stats['skipped'] - skipped),
+               (False, 1))
+        expect("the skipped save writes nothing", (directory / "busy.bin").exists(), False)
+    finally:
+        writer.kill()
+    source.reap_snapshot(block=True)
+    expect("the next save after the writer exits succeeds", source.save_snapshot(str(directory / "busy.bin")), True)
+    source.reap_snapshot(block=True)
+
+
+def check_no_fork_with_threads(directory: Path, source: NetworkBaseline):
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, daemon=True)
+    worker.start()
+    written = source.snapshot_stats['written']
+    try:
+        saved = source.save_snapshot(str(directory / "threads.bin"), use_fork=True)
+    finally:
+        stop.set()
+        worker.join()
+    expect("with other threads running the snapshot is written in-thread",
+           (saved, source._snapshot_pid, source.snapshot_stats['written'] - written), (True, None, 1))
+
+
+def check_warm_start(directory: Path):
+    path = str(directory / "detector.bin")
+    first = AnomalyDetector(learning_period=600, baseline_path=path, snapshot_interval=0, clock=EventClock())
+    rng = random.Random(2)
+    start = time.time() - 3600
+    for i in range(2000):
+        first.analyze_packet(PacketInfo(
+            timestamp=start + i * 0.5, src_ip=f"10.0.0.{rng.randint(1, 20)}", dst_ip="10.0.1.1",
+            src_port=rng.randint(1024, 65535), dst_port=443, protocol="TCP", packet_size=576,
+            flags="ACK", payload_size=0))
+    expect("first run finished learning", first.baseline.is_learning_complete(), True)
+    first.stop_snapshots()
+
+    second = AnomalyDetector(learning_period=600, baseline_path=path, snapshot_interval=0, clock=EventClock())
+    expect("warm-started detector needs no new learning period", second.baseline.is_learning_complete(), True)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)  # the killed stand-in writer is logged as a failed snapshot
+    source = learned_baseline()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        check_round_trip(directory, source, use_fork=False)
+        check_round_trip(directory, source, use_fork=True)
+        check_rejections(directory, source)
+        check_busy_writer(directory, source)
+        check_no_fork_with_threads(directory, source)
+        check_warm_start(directory)
+    print(f"{failures} failures")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Baseline Statistics Benchmark for IDS/IPS
+Measures the per-packet cost of NetworkBaseline updates plus the packet and
+byte rate queries the anomaly detector makes for every packet, across window
+sizes, against the previous deque + statistics implementation, and checks
+that both report the same values
+"""
+
+import sys
+import math
+import time
+import random
+import argparse
+import statistics
+from collections import deque
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.anomaly_detector import NetworkBaseline
+
+
+def legacy_stats(values: deque):
+    """What get_packet_rate_stats/get_byte_rate_stats computed before"""
+    counts = list(values)
+    return {
+        'mean': statistics.mean(counts),
+        'std': statistics.stdev(counts) if len(counts) > 1 else 0,
+        'min': min(counts),
+        'max': max(counts)
+    }
+
+
+def make_packets(count: int, rng: random.Random):
+    return [PacketInfo(
+        timestamp=0.0, src_ip=f"10.0.0.{rng.randint(1, 50)}", dst_ip="10.0.1.1",
+        src_port=rng.randint(1024, 65535), dst_port=rng.choice([80, 443, 22]), protocol="TCP",
+        packet_size=rng.choice([60, 60, 576, 1500, rng.randint(60, 1500)]), flags="ACK", payload_size=0
+    ) for _ in range(count)]
+
+
+def run_streaming(window: int, packets) -> float:
+    baseline = NetworkBaseline(window_size=window)
+    for packet_info in packets[:window]:  # warm up: full window
+        baseline.update(packet_info)
+    start = time.perf_counter()
+    for packet_info in packets[window:]:
+        baseline.update(packet_info)
+        baseline.get_packet_rate_stats()
+        baseline.get_byte_rate_stats()
+    return (time.perf_counter() - start) / (len(packets) - window)
+
+
+def run_legacy(window: int, packets) -> float:
+    packet_counts = deque(maxlen=window)
+    byte_counts = deque(maxlen=window)
+    for packet_info in packets[:window]:
+        packet_counts.append(1)
+        byte_counts.append(packet_info.packet_size)
+    measured = packets[window:]
+    start = time.perf_counter()
+    for packet_info in measured:
+        packet_counts.append(1)
+        byte_counts.append(packet_info.packet_size)
+        legacy_stats(packet_counts)
+        legacy_stats(byte_counts)
+    return (time.perf_counter() - start) / len(measured)
+
+
+def check_equivalence(window: int, packets, checks: int = 20) -> float:
+    """Largest relative difference between streaming and recomputed stats at ``checks`` points of the stream"""
+    baseline = NetworkBaseline(window_size=window)
+    byte_counts = deque(maxlen=window)
+    step = max(1, len(packets) // checks)
+    worst = 0.0
+    for i, packet_info in enumerate(packets):
+        baseline.update(packet_info)
+        byte_counts.append(packet_info.packet_size)
+        if len(byte_counts) >= 10 and (i % step == step - 1 or i == len(packets) - 1):
+            expected = legacy_stats(byte_counts)
+            actual = baseline.get_byte_rate_stats()
+            for key in expected:
+                worst = max(worst, abs(actual[key] - expected[key]) / max(1.0, abs(expected[key])))
+    return worst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NetworkBaseline statistics across window sizes")
+    parser.add_argument('--packets', type=int, default=20000, help='Packets measured per window size')
+    parser.add_argument('--windows', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--legacy-max-window', type=int, default=10000,
+                        help='Largest window to time the previous implementation on')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    packets = make_packets(max(args.windows) + args.packets, rng)
+
+    print(f"{'window':>8} {'streaming':>14} {'previous':>14} {'max rel. error':>15}")
+    worst_error = 0.0
+    for window in args.windows:
+        stream = packets[:window + args.packets]
+        streaming = run_streaming(window, stream)
+        if window <= args.legacy_max_window:
+            legacy = f"{run_legacy(window, stream[:window + min(args.packets, 200)]) * 1e6:11.1f} us"
+        else:
+            legacy = f"{'skipped':>14}"
+        error = check_equivalence(window, stream)
+        worst_error = max(worst_error, error)
+        print(f"{window:>8} {streaming * 1e6:11.2f} us {legacy} {error:15.2e}")
+
+    sys.exit(0 if worst_error < 1e-9 and not math.isnan(worst_error) else 1)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Kernel Capture Filter Check for IDS/IPS
+Runs compiled BPF filters in a small interpreter against the Python filter
+path over the decoder corpus plus randomly mutated frames, checks that
+combine_programs() accepts exactly what both of its programs accept, then
+(as root on Linux) attaches every program to a real packet socket to
+confirm the kernel accepts them
+"""
+
+import sys
+import random
+import socket
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketSniffer
+from packet_capture.packet_decoder import decode_frame
+from packet_capture.bpf_filter import (compile_capture_filter, combine_programs, attach_filter, detach_filter,
+                                       BPF_MAXINSNS)
+from decoder_benchmark import load_corpus
+
+FILTER_CONFIGS = [
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP']},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP', 'Unknown']},
+    {'protocols_to_capture': ['TCP']},
+    {'protocols_to_capture': ['UDP', 'Unknown']},
+    {'protocols_to_capture': []},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP'],
+     'ip_whitelist': ['192.168.1.10', '10.0.0.1', '2001:db8::1', 'fe80::1']},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP', 'Unknown'],
+     'ip_whitelist': ['Unknown', '192.168.1.1']},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP', 'Unknown'],
+     'ip_blacklist': ['192.168.1.10', '2001:db8::2', 'Unknown']},
+    {'protocols_to_capture': ['TCP', 'UDP'], 'port_ranges': [(1, 1024)]},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'Unknown'],
+     'port_ranges': [(0, 80), (443, 443), (5000, 70000)]},
+    {'protocols_to_capture': ['TCP', 'UDP', 'ICMP', 'ARP'],
+     'ip_whitelist': ['10.0.0.%d' % i for i in range(300)] + ['192.168.1.10'],
+     'ip_blacklist': ['10.0.0.5'], 'port_ranges': [(53, 53), (80, 80)]},
+]
+
+# Filter expression programs as `tcpdump -ddd` prints them, to combine with the configs above
+EXPRESSION_PROGRAMS = {
+    'ip': [(40, 0, 0, 12), (21, 0, 1, 2048), (6, 0, 0, 262144), (6, 0, 0, 0)],
+    'ip and udp port 53': [
+        (40, 0, 0, 12), (21, 0, 10, 2048), (48, 0, 0, 23), (21, 0, 8, 17), (40, 0, 0, 20),
+        (69, 6, 0, 8191), (177, 0, 0, 14), (72, 0, 0, 14), (21, 2, 0, 53), (72, 0, 0, 16),
+        (21, 0, 1, 53), (6, 0, 0, 262144), (6, 0, 0, 0)],
+    # Returns A (96 bytes of IPv4 frames, all of others) after a forward jump
+    'snap ip at 96': [(40, 0, 0, 12), (21, 0, 2, 2048), (0, 0, 0, 96), (5, 0, 0, 1), (128, 0, 0, 0),
+                      (22, 0, 0, 0)],
+    # Returns A = 0
+    'drop all': [(0, 0, 0, 0), (22, 0, 0, 0)],
+}
+
+# (expression, config index, corpus frame, accepted): the combined filter on single frames
+COMBINED_CASES = [
+    ('ip and udp port 53', 0, 'ipv4_udp_dns_query', True),
+    ('ip and udp port 53', 2, 'ipv4_udp_dns_query', False),  # config keeps TCP only
+    ('ip and udp port 53', 0, 'ipv4_tcp_syn', False),  # expression rejects it
+    ('ip and udp port 53', 8, 'vlan_ipv4_udp_ntp', False),  # VLAN tag hides IPv4 from the expression
+    ('ip', 2, 'ipv4_tcp_syn', True),
+    ('ip', 2, 'ipv6_tcp_syn', False),
+    ('ip', 5, 'ipv4_tcp_syn', True),  # whitelisted 10.0.0.1
+    ('snap ip at 96', 0, 'ipv6_tcp_syn', True),
+    ('snap ip at 96', 0, 'truncated_frame', False),
+    ('drop all', 0, 'ipv4_tcp_syn', False),
+]
+
+
+def run_program(program, packet: bytes) -> int:
+    """Interpret a classic BPF program (returns the accept length, 0 = drop)"""
+    a = x = 0
+    mem = [0] * 16
+    pc = 0
+    length = len(packet)
+
+    def load(offset, size):
+        if offset < 0 or offset + size > length:
+            raise IndexError
+        return int.from_bytes(packet[offset:offset + size], 'big')
+
+    try:
+        while True:
+            code, jt, jf, k = program[pc]
+            pc += 1
+            cls = code & 0x07
+            if cls in (0x00, 0x01):  # LD / LDX
+                size = {0x00: 4, 0x08: 2, 0x10: 1}[code & 0x18]
+                mode = code & 0xE0
+                if mode == 0x00:
+                    value = k
+                elif mode == 0xA0:  # ldxb 4*([k]&0xf)
+                    value = (load(k, 1) & 0x0F) * 4
+                elif mode == 0x20:
+                    value = load(k, size)
+                elif mode == 0x40:
+                    value = load(x + k, size)
+                elif mode == 0x60:
+                    value = mem[k]
+                elif mode == 0x80:
+                    value = length
+                else:
+                    raise ValueError(f"unsupported load {code:#x}")
+                if cls == 0x00:
+                    a = value
+                else:
+                    x = value
+            elif cls == 0x02:
+                mem[k] = a
+            elif cls == 0x03:
+                mem[k] = x
+            elif cls == 0x04:
+                operand = x if code & 0x08 else k
+                op = code & 0xF0
+                if op == 0x00:
+                    a = (a + operand) & 0xFFFFFFFF
+                elif op == 0x50:
+                    a &= operand
+                elif op == 0x60:
+                    a = (a << operand) & 0xFFFFFFFF
+                elif op == 0x70:
+                    a >>= operand
+                else:
+                    raise ValueError(f"unsupported alu {code:#x}")
+            elif cls == 0x05:
+                op = code & 0xF0
+                if op == 0x00:
+                    pc += k
+                    continue
+                operand = x if code & 0x08 else k
+                taken = {0x10: a == operand, 0x20: a > operand,
+                         0x30: a >= operand, 0x40: bool(a & operand)}[op]
+                pc += jt if taken else jf
+            elif cls == 0x06:
+                return a if code & 0x10 else k
+            elif cls == 0x07:
+                if code & 0x80:
+                    a = x
+                else:
+                    x = a
+    except IndexError:
+        return 0
+
+
+def mutate(frame: bytes, rng: random.Random) -> bytes:
+    """Flip, truncate or extend a frame to reach unusual header combinations"""
+    data = bytearray(frame)
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        if choice < 0.5 and data:
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        elif choice < 0.7 and data:
+            del data[rng.randrange(len(data)):]
+        elif choice < 0.85:
+            data += bytes(rng.randrange(256) for _ in range(rng.randint(1, 16)))
+        else:
+            # Insert a VLAN tag after the MAC addresses
+            data[12:12] = bytes((0x81, 0x00, rng.randrange(256), rng.randrange(256)))
+    return bytes(data)
+
+
+def describe(config) -> str:
+    """Short description of a filter config (long lists are summarized)"""
+    parts = []
+    for key, value in config.items():
+        if isinstance(value, list) and len(value) > 5:
+            value = f"[{len(value)} entries]"
+        parts.append(f"{key}={value}")
+    return ", ".join(parts)
+
+
+def check(iterations: int, seed: int) -> int:
+    """Compare BPF decisions with _should_capture_packet for every config"""
+    rng = random.Random(seed)
+    base = [frame for _, frame, _ in load_corpus()]
+    frames = base + [mutate(rng.choice(base), rng) for _ in range(iterations)]
+
+    failures = 0
+    sniffer = PacketSniffer()
+    for config in FILTER_CONFIGS:
+        settings = {'ip_whitelist': None, 'ip_blacklist': None, 'port_ranges': None}
+        settings.update(config)
+        sniffer.config.update(settings)
+        program = compile_capture_filter(settings['protocols_to_capture'], settings['ip_whitelist'],
+                                         settings['ip_blacklist'], settings['port_ranges'])
+        assert len(program) <= BPF_MAXINSNS
+
+        mismatches = 0
+        for frame in frames:
+            src_ip, dst_ip, src_port, dst_port, protocol, _, _ = decode_frame(frame)
+            expected = sniffer._should_capture_packet(src_ip, dst_ip, src_port, dst_port, protocol)
+            if bool(run_program(program, frame)) != expected:
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"❌ {config}: {frame.hex()} expected {expected}")
+        failures += mismatches
+        print(f"{len(program):5d} instructions, {mismatches} mismatches: {describe(config)}")
+    return failures
+
+
+def compiled(config):
+    settings = {'ip_whitelist': None, 'ip_blacklist': None, 'port_ranges': None}
+    settings.update(config)
+    return compile_capture_filter(settings['protocols_to_capture'], settings['ip_whitelist'],
+                                  settings['ip_blacklist'], settings['port_ranges'])
+
+
+def combine_check(iterations: int, seed: int) -> int:
+    """combine_programs(first, second) must return what second returns, where first accepts"""
+    rng = random.Random(seed)
+    corpus = {name: frame for name, frame, _ in load_corpus()}
+    frames = list(corpus.values()) + [mutate(rng.choice(list(corpus.values())), rng) for _ in range(iterations)]
+
+    failures = 0
+    for expression, config_index, name, accepted in COMBINED_CASES:
+        program = combine_programs(EXPRESSION_PROGRAMS[expression], compiled(FILTER_CONFIGS[config_index]))
+        if bool(run_program(program, corpus[name])) != accepted:
+            failures += 1
+            print(f"❌ {expression!r} + config {config_index} on {name}: expected accepted={accepted}")
+
+    mismatches = 0
+    pairs = [(expression, first, compiled(config)) for expression, first in EXPRESSION_PROGRAMS.items()
+             for config in FILTER_CONFIGS]
+    pairs += [(f"{a} + {b}", EXPRESSION_PROGRAMS[a], EXPRESSION_PROGRAMS[b])
+              for a in EXPRESSION_PROGRAMS for b in EXPRESSION_PROGRAMS]
+    for description, first, second in pairs:
+        program = combine_programs(first, second)
+        for frame in frames:
+            expected = run_program(second, frame) if run_program(first, frame) else 0
+            if run_program(program, frame) != expected:
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"❌ combined {description}: {frame.hex()} expected {expected}")
+    print(f"Combined programs: {len(COMBINED_CASES)} sample frames, {len(pairs)} pairs over {len(frames)} frames, "
+          f"{failures + mismatches} mismatches")
+    return failures + mismatches
+
+
+def attach_check() -> bool:
+    """Attach a compiled program to a real packet socket"""
+    if not hasattr(socket, "AF_PACKET"):
+        print("Kernel attach: skipped (AF_PACKET not available)")
+        return True
+    try:
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(3))
+    except PermissionError:
+        print("Kernel attach: skipped (needs root)")
+        return True
+
+    try:
+        programs = [compiled(config) for config in FILTER_CONFIGS]
+        programs += [combine_programs(first, programs[-1]) for first in EXPRESSION_PROGRAMS.values()]
+        for program in programs:
+            attach_filter(sock, program)
+        detach_filter(sock)
+        print(f"Kernel attach: {len(programs)} programs accepted")
+        return True
+    except OSError as e:
+        print(f"❌ Kernel attach failed: {e}")
+        return False
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check compiled BPF capture filters")
+    parser.add_argument('--iterations', type=int, default=5000,
+                        help="Number of mutated frames to test")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    failures = check(args.iterations, args.seed)
+    failures += combine_check(args.iterations // 5, args.seed)
+    attached = attach_check()
+    sys.exit(1 if failures or not attached else 0)
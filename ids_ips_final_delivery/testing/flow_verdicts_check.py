@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Flow Verdict Table Check for IDS/IPS
+Drives the flow verdict table on event time through each verdict class
+(undecided, alerted, trusted, byte-allowance bypass), their TTLs and idle
+expiry, expiry with mixed TTLs (a long-lived verdict must not hold up the
+others) and eviction at capacity
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from packet_capture.flow_verdicts import (FlowVerdictTable, VERDICT_INSPECT, VERDICT_ALERTED,
+                                          VERDICT_TRUSTED, VERDICT_BYPASS)
+from detection_engine.clock import EventClock
+
+START = 1_700_000_000.0
+CLIENT, SERVER = "10.0.0.1", "10.0.1.1"
+failures = 0
+
+
+def expect(description: str, actual, expected):
+    global failures
+    if actual == expected:
+        print(f"ok  {description}")
+    else:
+        failures += 1
+        print(f"❌  {description}: got {actual!r}, expected {expected!r}")
+
+
+def packet(t: float, port: int, payload: int = 100, reply: bool = False) -> PacketInfo:
+    """A packet of flow CLIENT:port <-> SERVER:80 at START + t seconds"""
+    src, dst, src_port, dst_port = (SERVER, CLIENT, 80, port) if reply else (CLIENT, SERVER, port, 80)
+    return PacketInfo(timestamp=START + t, src_ip=src, dst_ip=dst, src_port=src_port, dst_port=dst_port,
+                      protocol="TCP", packet_size=payload + 40, flags="ACK", payload_size=payload)
+
+
+def inspected(table: FlowVerdictTable, *packets: PacketInfo) -> int:
+    return len(table.filter_batch(list(packets)))
+
+
+def verdict(table: FlowVerdictTable, port: int):
+    """The flow's verdict, None when it is not tracked (undecided flows read as inspect)"""
+    value = table.get_verdict(CLIENT, SERVER, port, 80, "TCP")
+    return None if value == VERDICT_INSPECT else value
+
+
+def check_verdict_classes():
+    table = FlowVerdictTable(clock=EventClock(), clean_bypass_bytes=1000)
+
+    expect("undecided flow is inspected", inspected(table, packet(0, 1)), 1)
+
+    table.mark_alerted(CLIENT, SERVER, 1, 80, "TCP")
+    expect("alerted flow is skipped, both directions",
+           inspected(table, packet(1, 1), packet(1, 1, reply=True)), 0)
+    table.mark_trusted(SERVER, CLIENT, 80, 2, "TCP")
+    expect("trusted flow is skipped (set from the reply side)", inspected(table, packet(2, 2)), 0)
+
+    kept = [inspected(table, packet(3 + i, 3, payload=400)) for i in range(4)]
+    expect("byte allowance: the packet crossing 1000 bytes is still inspected", kept, [1, 1, 1, 0])
+    expect("flow over its allowance is bypassed", verdict(table, 3), VERDICT_BYPASS)
+
+    table.bypass_after(CLIENT, SERVER, 4, 80, "TCP", 150)
+    expect("bypass_after() allowance applies to that flow",
+           [inspected(table, packet(7 + i, 4)) for i in range(3)], [1, 1, 0])
+
+    expect("clear_verdict() returns a flow to inspection",
+           (table.clear_verdict(CLIENT, SERVER, 1, 80, "TCP"), inspected(table, packet(10, 1))), (True, 1))
+    expect("a flow without a verdict reads as inspect",
+           table.get_verdict(CLIENT, SERVER, 99, 80, "TCP"), VERDICT_INSPECT)
+
+    stats = table.get_stats()
+    expect("skips counted per verdict", (stats['bypassed_by_verdict'][VERDICT_ALERTED],
+                                         stats['bypassed_by_verdict'][VERDICT_TRUSTED],
+                                         stats['bypassed_by_verdict'][VERDICT_BYPASS]), (2, 1, 2))
+
+    default = FlowVerdictTable(clock=EventClock())
+    inspected(default, *(packet(i, 5, payload=100000) for i in range(50)))
+    expect("no byte allowance by default: bulk flows stay inspected and untracked",
+           (default.get_stats()['packets_inspected'], len(default)), (50, 0))
+
+
+def check_ttls():
+    table = FlowVerdictTable(clock=EventClock(), clean_bypass_bytes=100, idle_timeout=120,
+                             alerted_ttl=300, trusted_ttl=3600)
+    inspected(table, packet(0, 1), packet(0, 2), packet(0, 3, payload=200), packet(0, 4, payload=200))
+    table.mark_alerted(CLIENT, SERVER, 1, 80, "TCP")
+    table.mark_trusted(CLIENT, SERVER, 2, 80, "TCP")
+
+    # Keep bypassed flow 3 active; bypassed flow 4 goes idle
+    for t in range(60, 3700, 60):
+        inspected(table, packet(t, 3, payload=200))
+        if t == 180:
+            expect("idle bypassed flow expires after idle_timeout", verdict(table, 4), None)
+        if t == 240:
+            expect("alerted flow lives until alerted_ttl", verdict(table, 1), VERDICT_ALERTED)
+        if t == 300:
+            expect("alerted flow expires at alerted_ttl", verdict(table, 1), None)
+        if t == 3540:
+            expect("trusted flow lives until trusted_ttl", verdict(table, 2), VERDICT_TRUSTED)
+    expect("trusted flow expires at trusted_ttl", verdict(table, 2), None)
+    expect("active bypassed flow is kept past idle_timeout", verdict(table, 3), VERDICT_BYPASS)
+
+    inspected(table, packet(3900, 9))
+    expect("bypassed flow expires once idle", verdict(table, 3), None)
+
+
+def check_mixed_expiry():
+    table = FlowVerdictTable(clock=EventClock(), clean_bypass_bytes=10**9, idle_timeout=120)
+    inspected(table, packet(0, 1))
+    table.mark_trusted(CLIENT, SERVER, 1, 80, "TCP")  # oldest entry, expires in an hour
+    inspected(table, *(packet(1 + i * 0.01, 100 + i) for i in range(1000)))
+    expect("tracked flows", len(table), 1001)
+
+    inspected(table, packet(200, 5000))
+    expect("idle flows expire behind a long-lived verdict", (len(table), table.get_stats()['expired']),
+           (2, 1000))
+    expect("the long-lived verdict stays", verdict(table, 1), VERDICT_TRUSTED)
+
+
+def check_eviction():
+    table = FlowVerdictTable(clock=EventClock(), clean_bypass_bytes=50, max_flows=10)
+    for port in range(5):
+        table.mark_alerted(CLIENT, SERVER, port, 80, "TCP")
+    inspected(table, *(packet(i, 100 + i) for i in range(5)))
+    inspected(table, *(packet(10 + i, 200 + i) for i in range(3)))
+    expect("table stays within max_flows", (len(table), table.get_stats()['evicted']), (10, 3))
+    expect("least recently seen idle-timeout flows are evicted first",
+           [verdict(table, port) is not None for port in (100, 101, 102, 103, 104, 202)],
+           [False, False, False, True, True, True])
+    expect("alerted flows are kept while idle-timeout ones can go",
+           all(verdict(table, port) == VERDICT_ALERTED for port in range(5)), True)
+
+
+if __name__ == "__main__":
+    check_verdict_classes()
+    check_ttls()
+    check_mixed_expiry()
+    check_eviction()
+    print(f"{failures} failures")
+    sys.exit(1 if failures else 0)
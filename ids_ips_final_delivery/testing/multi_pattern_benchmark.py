@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Multi-Pattern Matcher Benchmark for IDS/IPS
+Checks the Aho-Corasick matcher against per-pattern substring tests on
+random payloads and compares their speed with a large literal rule set
+"""
+
+import sys
+import time
+import random
+import string
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from detection_engine.multi_pattern import MultiPatternMatcher
+
+ALPHABET = string.ascii_lowercase + string.digits + "/._-=%<>' "
+
+
+def make_patterns(count: int, rng: random.Random):
+    """Random literal patterns of 3-24 characters, including overlapping and repeated ones"""
+    patterns = []
+    for i in range(count):
+        if patterns and rng.random() < 0.1:
+            # Prefix/suffix of an existing pattern to exercise failure links
+            base = rng.choice(patterns)[0]
+            cut = rng.randint(1, len(base))
+            pattern = base[:cut] if rng.random() < 0.5 else base[-cut:]
+        else:
+            pattern = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 24)))
+        patterns.append((pattern, f"SIG_{i:05d}"))
+    return patterns
+
+
+def make_payloads(count: int, patterns, rng: random.Random):
+    """Random payloads of up to 1500 characters, most with a few embedded patterns"""
+    payloads = []
+    for _ in range(count):
+        parts = ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 1500)))]
+        for _ in range(rng.randint(0, 3)):
+            position = rng.randint(0, len(parts[0]))
+            needle = rng.choice(patterns)[0]
+            parts[0] = parts[0][:position] + needle + parts[0][position:]
+        payloads.append(parts[0])
+    return payloads
+
+
+def naive_search(patterns, text: str):
+    return {value for pattern, value in patterns if pattern in text}
+
+
+def check(patterns, payloads) -> int:
+    """Compare matcher results with substring tests"""
+    matcher = MultiPatternMatcher(patterns)
+    failures = 0
+    for text in payloads:
+        expected = naive_search(patterns, text)
+        actual = matcher.search(text)
+        if actual != expected:
+            failures += 1
+            if failures <= 3:
+                print(f"❌ missing {sorted(expected - actual)[:5]}, extra {sorted(actual - expected)[:5]}")
+    print(f"Correctness: {len(payloads)} payloads, {len(patterns)} patterns, {failures} mismatches")
+    return failures
+
+
+def benchmark(patterns, payloads):
+    """Time building the automaton and scanning with both methods"""
+    start = time.perf_counter()
+    matcher = MultiPatternMatcher(patterns)
+    build = time.perf_counter() - start
+    print(f"Build: {build * 1000:.0f} ms, {matcher.get_stats()}")
+
+    start = time.perf_counter()
+    for text in payloads:
+        matcher.search(text)
+    cold = time.perf_counter() - start
+
+    # Second pass runs with the failure transitions cached
+    start = time.perf_counter()
+    for text in payloads:
+        matcher.search(text)
+    automaton = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in payloads:
+        naive_search(patterns, text)
+    naive = time.perf_counter() - start
+
+    print(f"substring loop: {len(payloads) / naive:>10,.0f} payloads/s")
+    print(f"aho-corasick:   {len(payloads) / cold:>10,.0f} payloads/s  ({naive / cold:.1f}x, first pass)")
+    print(f"aho-corasick:   {len(payloads) / automaton:>10,.0f} payloads/s  ({naive / automaton:.1f}x, cached)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the multi-pattern matcher")
+    parser.add_argument('--patterns', type=int, default=10000)
+    parser.add_argument('--payloads', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patterns = make_patterns(args.patterns, rng)
+    payloads = make_payloads(args.payloads, patterns, rng) + ["", patterns[0][0]]
+
+    failures = check(patterns, payloads)
+    benchmark(patterns, payloads)
+    sys.exit(1 if failures else 0)
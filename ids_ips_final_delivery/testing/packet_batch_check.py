@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Packet Batch Check for IDS/IPS
+Round-trips PacketInfo lists through PacketBatch and back: hand-built
+packets with the values that overflow the columns (IPv6 and "Unknown"
+addresses, unlisted protocols, ports and flags where the protocol has none,
+missing versus empty raw bytes) and the decoder corpus as the sniffer
+delivers it, with and without raw capture
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo, PacketSniffer
+from packet_capture.packet_batch import PacketBatch, NUMPY_AVAILABLE
+from decoder_benchmark import load_corpus
+
+failures = 0
+
+
+def expect(description: str, actual, expected):
+    global failures
+    if actual == expected:
+        print(f"ok  {description}")
+    else:
+        failures += 1
+        print(f"❌  {description}: got {actual!r:.300}, expected {expected!r:.300}")
+
+
+def packet(**fields) -> PacketInfo:
+    values = dict(timestamp=1_700_000_000.25, src_ip="10.0.0.1", dst_ip="10.0.1.1", src_port=40000,
+                  dst_port=80, protocol="TCP", packet_size=60, flags="SYN", payload_size=0)
+    values.update(fields)
+    return PacketInfo(**values)
+
+
+EDGE_CASES = {
+    "TCP with payload": packet(flags="PSH|ACK", packet_size=74, payload_size=20, raw_packet=b"x" * 74),
+    "TCP with no flags set": packet(flags=""),
+    "TCP with no flags field": packet(flags=None),
+    "TCP flag string outside the table": packet(flags="ACK|SYN"),
+    "UDP": packet(protocol="UDP", flags=None, dst_port=53),
+    "ICMP without ports": packet(protocol="ICMP", src_port=None, dst_port=None, flags=None),
+    "ICMP with ports": packet(protocol="ICMP", src_port=8, dst_port=0, flags=None),
+    "UDP with flags": packet(protocol="UDP", flags="SYN"),
+    "IPv6 addresses": packet(src_ip="2001:db8::10", dst_ip="fe80::1"),
+    "unknown addresses": packet(src_ip="Unknown", dst_ip="Unknown", protocol="Unknown", src_port=None,
+                                dst_port=None, flags=None),
+    "ARP": packet(protocol="ARP", src_port=None, dst_port=None, flags=None, src_ip="192.168.1.10"),
+    "unlisted protocol": packet(protocol="SCTP", src_port=5000, dst_port=5001, flags=None),
+    "missing raw bytes": packet(raw_packet=None),
+    "empty raw bytes": packet(raw_packet=b""),
+    "broadcast address": packet(src_ip="0.0.0.0", dst_ip="255.255.255.255", protocol="UDP", flags=None),
+    "zero timestamp": packet(timestamp=0.0),
+}
+
+
+def round_trip(packets):
+    return PacketBatch.from_packet_infos(packets).to_packet_infos()
+
+
+def check_edge_cases():
+    for description, original in EDGE_CASES.items():
+        expect(f"{description} comes back unchanged", round_trip([original]), [original])
+
+    originals = list(EDGE_CASES.values())
+    expect(f"a batch of all {len(originals)} comes back unchanged, in order", round_trip(originals), originals)
+    raw = [restored.raw_packet for restored in round_trip([EDGE_CASES["missing raw bytes"],
+                                                           EDGE_CASES["empty raw bytes"]])]
+    expect("empty raw bytes stay distinct from missing ones", raw, [None, b""])
+    expect("an empty batch comes back empty", (len(PacketBatch.from_packet_infos([])), round_trip([])), (0, []))
+
+
+def check_corpus():
+    frames = [(name, frame) for name, frame, _ in load_corpus()]
+    for raw_capture in (True, False):
+        sniffer = PacketSniffer()
+        sniffer.configure(protocols_to_capture=['TCP', 'UDP', 'ICMP', 'ARP', 'Unknown'],
+                          enable_raw_capture=raw_capture)
+        packets = [sniffer._extract_frame_info(frame, 1_700_000_000.0 + i) for i, (_, frame) in enumerate(frames)]
+        restored = round_trip(packets)
+        mismatched = [name for (name, _), before, after in zip(frames, packets, restored) if before != after]
+        expect(f"decoder corpus, raw capture {'on' if raw_capture else 'off'}: {len(packets)} packets unchanged",
+               mismatched, [])
+
+
+if __name__ == "__main__":
+    print(f"Columns: {'NumPy' if NUMPY_AVAILABLE else 'array.array'}")
+    check_edge_cases()
+    check_corpus()
+    print(f"{failures} failures")
+    sys.exit(1 if failures else 0)
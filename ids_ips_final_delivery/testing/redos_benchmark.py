@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ReDoS Benchmark for IDS/IPS
+Replays benign traffic mixed with payloads crafted to make backtracking
+regexes blow up, and compares per-packet latency of unguarded regex
+matching, the stdlib scan budget and (when installed) the RE2 backend;
+then checks that a rule suspended for overrunning it resumes after
+regex_suspend_seconds of packet time, however fast the packets replay
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.regex_backend import RE2_AVAILABLE
+from detection_engine.signature_detector import Signature, SignatureDatabase, SignatureDetector
+
+# (signature ID, pattern, crafted payload): classic catastrophic-backtracking rules
+REDOS_CORPUS = [
+    ("REDOS_NESTED", r"(a+)+$", b"a" * 18 + b"!"),
+    ("REDOS_DIGITS", r"(\d+)*z$", b"z" + b"1" * 19 + b"!"),
+    ("REDOS_GROUPS", r"^(([a-z])+.)+[A-Z]([a-z])+$", b"x" * 24 + b"!"),
+    ("XSS_001", None, b"<script>" * 180),  # default rule, quadratic on repeated open tags
+]
+
+BENIGN_PAYLOADS = [
+    b"GET /index.html HTTP/1.1\r\nHost: example.com\r\nAccept: */*\r\n\r\n",
+    b"POST /api/login HTTP/1.1\r\nContent-Type: application/json\r\n\r\n{\"user\": \"alice\"}",
+    b"HTTP/1.1 200 OK\r\nContent-Length: 512\r\n\r\n" + b"<html><body>hello</body></html>" * 8,
+    b"GET /search?q=union+select+password HTTP/1.1\r\nHost: example.com\r\n\r\n",
+    b"GET /item?id=1 UNION SELECT password FROM users HTTP/1.1\r\nHost: example.com\r\n\r\n",
+]
+
+
+def make_packets(count: int, crafted_ratio: float, rng: random.Random):
+    packets = []
+    for _ in range(count):
+        if rng.random() < crafted_ratio:
+            payload = rng.choice(REDOS_CORPUS)[2]
+        else:
+            payload = rng.choice(BENIGN_PAYLOADS)
+        packets.append(PacketInfo(
+            timestamp=0.0, src_ip=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", dst_ip="10.0.0.1",
+            src_port=rng.randint(1024, 65535), dst_port=80, protocol="TCP",
+            packet_size=len(payload) + 54, flags="PSH|ACK", payload_size=len(payload), raw_packet=payload
+        ))
+    return packets
+
+
+def make_detector(path: str, backend: str, guarded: bool) -> SignatureDetector:
+    db = SignatureDatabase(path, use_cache=False, regex_backend=backend)
+    db.add_signatures(Signature(id=signature_id, name=signature_id, description="", severity="HIGH",
+                                category="TEST", pattern=pattern, pattern_type="REGEX", protocol="TCP")
+                      for signature_id, pattern, _ in REDOS_CORPUS if pattern)
+    detector = SignatureDetector(db)
+    if not guarded:
+        detector.regex_max_scan_bytes = 1 << 30
+        detector.regex_search_budget = float('inf')
+        detector.regex_packet_budget = float('inf')
+    return detector
+
+
+def run(name: str, detector: SignatureDetector, packets):
+    latencies = []
+    detections = 0
+    for packet_info in packets:
+        start = time.perf_counter()
+        detections += len(detector.analyze_packet(packet_info))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{name:<18} total {sum(latencies):7.2f}s  p50 {percentile(0.5):7.3f} ms  "
+          f"p99 {percentile(0.99):8.3f} ms  p99.9 {percentile(0.999):8.2f} ms  "
+          f"max {latencies[-1] * 1000:8.2f} ms  detections {detections}")
+    budget = detector.get_regex_budget_stats()
+    if budget['flagged_rules']:
+        for signature_id, overrun in budget['flagged_rules'].items():
+            print(f"{'':<18} flagged {signature_id:<13} overruns {overrun['overruns']:>3}  "
+                  f"worst {overrun['worst_ms']:7.1f} ms  suspended {overrun['suspended']}")
+        print(f"{'':<18} {budget['searches_skipped']} searches skipped")
+    return percentile(0.99)
+
+
+def check_suspension_on_event_time(path: str) -> bool:
+    """A replay spanning five minutes in well under a second still resumes the suspended rule"""
+    detector = make_detector(path, "re", guarded=True)
+    detector.regex_search_budget = 0.0  # every search overruns
+    start = time.time() - 86400
+    payload = REDOS_CORPUS[0][2]
+
+    def suspended_at(t: float) -> bool:
+        detector.analyze_packet(PacketInfo(
+            timestamp=start + t, src_ip="10.0.0.2", dst_ip="10.0.0.1", src_port=40000, dst_port=80,
+            protocol="TCP", packet_size=len(payload) + 54, flags="PSH|ACK", payload_size=len(payload),
+            raw_packet=payload))
+        return "REDOS_NESTED" in detector.suspended_regex_rules
+
+    states = [suspended_at(t) for t in range(detector.regex_suspend_after)]
+    states += [suspended_at(detector.regex_suspend_seconds - 1), suspended_at(detector.regex_suspend_seconds + 10)]
+    expected = [False] * (detector.regex_suspend_after - 1) + [True, True, False]
+    status = "ok" if states == expected else "FAIL"
+    print(f"suspension on packet time: {states}  {status}")
+    return status == "ok"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark regex matching latency under ReDoS payloads")
+    parser.add_argument('--packets', type=int, default=5000)
+    parser.add_argument('--crafted', type=float, default=0.03, help='Share of crafted payloads')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    packets = make_packets(args.packets, args.crafted, rng)
+    crafted = sum(1 for packet in packets if packet.raw_packet not in BENIGN_PAYLOADS)
+    print(f"{len(packets)} packets, {crafted} crafted, RE2 {'available' if RE2_AVAILABLE else 'not installed'}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "signatures.json")
+        unguarded = run("re, unguarded", make_detector(path, "re", guarded=False), packets)
+        guarded = run("re, scan budget", make_detector(path, "re", guarded=True), packets)
+        if RE2_AVAILABLE:
+            run("re2", make_detector(path, "re2", guarded=True), packets)
+        suspension_ok = check_suspension_on_event_time(path)
+
+    print(f"p99 with scan budget: {guarded:.3f} ms vs {unguarded:.3f} ms unguarded")
+    sys.exit(0 if suspension_ok else 1)
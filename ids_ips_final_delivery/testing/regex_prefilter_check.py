@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Regex Prefilter Check for IDS/IPS
+Generates random regular expressions and texts and checks that whenever a
+regex matches ASCII text, one of its extracted literal factors occurs in the
+lowercased text; also reports the factors of the default signatures
+"""
+
+import re
+import sys
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from detection_engine.regex_prefilter import extract_literal_factors
+from detection_engine.signature_detector import SignatureDatabase
+
+TEXT_ALPHABET = "abcAB .-"
+
+
+def random_regex(rng: random.Random, depth: int = 0) -> str:
+    """Random regex over a small alphabet using groups, classes, repeats, anchors and lookarounds"""
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        if choice < 0.35 or depth >= 2:
+            atom = rng.choice("abcAB.- ")
+            atom = re.escape(atom) if atom != "." or rng.random() < 0.5 else "."
+        elif choice < 0.45:
+            atom = "[" + "".join(rng.sample("abcAB", rng.randint(1, 3))) + "]"
+        elif choice < 0.5:
+            atom = rng.choice([r"\b", "^", "$", r"\s", r"\w", "[^a]"])
+        elif choice < 0.6:
+            atom = "(?=" + random_regex(rng, depth + 1) + ")"
+        elif choice < 0.65:
+            atom = "(?!" + random_regex(rng, depth + 1) + ")"
+        else:
+            branches = [random_regex(rng, depth + 1) for _ in range(rng.randint(1, 3))]
+            if rng.random() < 0.2:
+                branches.append("")
+            atom = "(" + "|".join(branches) + ")"
+
+        quantifier = rng.random()
+        if atom in (r"\b", "^", "$") or atom.startswith("(?"):
+            pass  # zero-width items cannot be repeated
+        elif atom.startswith("(") and depth < 1 and quantifier >= 0.1:
+            # No unbounded repeats around groups that may hold repeats themselves
+            # (keeps backtracking in the random regexes bounded)
+            if quantifier < 0.2:
+                atom += "{%d}" % rng.randint(0, 2)
+        elif quantifier < 0.1:
+            atom += "?"
+        elif quantifier < 0.2:
+            atom += "*"
+        elif quantifier < 0.3:
+            atom += "+"
+        elif quantifier < 0.35:
+            low = rng.randint(0, 3)
+            atom += "{%d,%d}" % (low, low + rng.randint(0, 2))
+        elif quantifier < 0.4:
+            atom += "{%d}" % rng.randint(0, 3)
+        parts.append(atom)
+
+    prefix = "(?i)" if depth == 0 and rng.random() < 0.3 else ""
+    return prefix + "".join(parts)
+
+
+def check(regexes: int, texts: int, seed: int) -> int:
+    """Every match must contain a factor; returns the number of violations"""
+    rng = random.Random(seed)
+    corpus = ["".join(rng.choice(TEXT_ALPHABET) for _ in range(rng.randint(0, 16)))
+              for _ in range(texts)]
+
+    violations = with_factors = matches = skipped = 0
+    for _ in range(regexes):
+        pattern = random_regex(rng)
+        compiled = re.compile(pattern)
+        factors = extract_literal_factors(pattern)
+        if not factors:
+            continue
+        with_factors += 1
+        for text in corpus:
+            lowered = text.lower()
+            present = any(factor in lowered for factor in factors)
+            if compiled.search(text):
+                matches += 1
+                if not present:
+                    violations += 1
+                    if violations <= 5:
+                        print(f"❌ {pattern!r} matched {text!r} but factors {sorted(factors)} are absent")
+            elif not present:
+                skipped += 1
+
+    checked = with_factors * len(corpus)
+    print(f"Soundness: {regexes} regexes ({with_factors} with factors) x {len(corpus)} texts, "
+          f"{matches} matches, {violations} violations")
+    if checked:
+        print(f"Prefilter would skip {skipped / checked:.0%} of regex evaluations")
+    return violations
+
+
+def show_default_signatures():
+    """Print the factors extracted for the default REGEX signatures"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = SignatureDatabase(str(Path(directory) / "signatures.json"))
+        for signature in db.signatures.values():
+            if signature.pattern_type == "REGEX":
+                factors = db.regex_factors.get(signature.id)
+                print(f"{signature.id:<10} {sorted(factors) if factors else 'always evaluated'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check regex literal factor extraction")
+    parser.add_argument('--regexes', type=int, default=3000)
+    parser.add_argument('--texts', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    violations = check(args.regexes, args.texts, args.seed)
+    show_default_signatures()
+    sys.exit(1 if violations else 0)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Ruleset Cache Benchmark for IDS/IPS
+Compares SignatureDatabase startup with and without the compiled ruleset
+cache, end to end (startup plus the first packets, where anything left to
+compile lands), and checks that both rulesets detect the same things
+"""
+
+import gc
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.signature_detector import Signature, SignatureDatabase, SignatureDetector
+
+KEYWORDS = ["select", "union", "script", "passwd", "admin", "login", "shell", "exec", "eval", "cmd"]
+
+
+def make_signatures(count: int, rng: random.Random):
+    """A mix of REGEX, STRING and HEX signatures like a large imported rule set"""
+    signatures = []
+    for i in range(count):
+        kind = rng.random()
+        keyword = rng.choice(KEYWORDS)
+        if kind < 0.6:
+            pattern_type = "REGEX"
+            pattern = rf"(?i){keyword}[\s/=]+(x{i}|y{i}[a-f0-9]{{2,8}})\b"
+        elif kind < 0.9:
+            pattern_type = "STRING"
+            pattern = f"{keyword}-{i}"
+        else:
+            pattern_type = "HEX"
+            pattern = f"{i:08x}" + "".join(rng.choice("0123456789abcdef") for _ in range(8))
+        signatures.append(Signature(
+            id=f"BENCH_{i:05d}",
+            name=f"Benchmark rule {i}",
+            description="",
+            severity="MEDIUM",
+            category="TEST",
+            pattern=pattern,
+            pattern_type=pattern_type,
+            protocol="TCP",
+            dst_port=rng.choice([None, 80, 443, 8080])
+        ))
+    return signatures
+
+
+def make_packets(count: int, signatures, rng: random.Random):
+    packets = []
+    for _ in range(count):
+        sample = rng.choice(signatures)
+        if sample.pattern_type == "REGEX":
+            number = sample.id.split("_")[1].lstrip("0") or "0"
+            payload = f"GET /?q={rng.choice(KEYWORDS)}=x{number} HTTP/1.1".encode()
+        elif sample.pattern_type == "HEX":
+            payload = b"\x00\x01" + bytes.fromhex(sample.pattern) + b"\xff"
+        else:
+            payload = f"POST /{sample.pattern.upper()}".encode()
+        packets.append(PacketInfo(
+            timestamp=0.0, src_ip="10.0.0.1", dst_ip="10.0.0.2",
+            src_port=rng.randint(1024, 65535), dst_port=rng.choice([80, 443, 8080]),
+            protocol="TCP", packet_size=len(payload) + 54, flags="PSH|ACK",
+            payload_size=len(payload), raw_packet=payload
+        ))
+    return packets
+
+
+def timed_start(path: str, **kwargs):
+    start = time.perf_counter()
+    db = SignatureDatabase(path, **kwargs)
+    return db, time.perf_counter() - start
+
+
+def detector_for(db: SignatureDatabase) -> SignatureDetector:
+    detector = SignatureDetector(db)
+    detector.configure_alert_limits(cache_timeout=0, max_detections_per_window=10**9)  # count every match
+    return detector
+
+
+def interleaved_scan(detectors, packets, chunk: int = 50):
+    """
+    Scan the packets with each detector, alternating in chunks so machine
+    noise and drift fall on every detector alike; returns per detector the
+    scan seconds and the sorted signature IDs detected per packet
+    """
+    seconds = [0.0] * len(detectors)
+    results = [[] for _ in detectors]
+    for i in range(0, len(packets), chunk):
+        for n, detector in enumerate(detectors):
+            start = time.perf_counter()
+            batch = detector.analyze_batch(packets[i:i + chunk])
+            seconds[n] += time.perf_counter() - start
+            results[n].extend(sorted(result.signature_id for result in detections) for detections in batch)
+    return seconds, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold versus cached signature database startup")
+    parser.add_argument('--signatures', type=int, default=10000)
+    parser.add_argument('--packets', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "signatures.json")
+        signatures = make_signatures(args.signatures, rng)
+        db = SignatureDatabase(path, use_cache=False)
+        db.add_signatures(signatures)
+        db.save_signatures()
+        del db
+        packets = make_packets(args.packets, signatures, rng)
+
+        gc.collect()
+        cold, cold_time = timed_start(path, use_cache=False)
+        gc.collect()
+        writer, write_time = timed_start(path)
+        del writer
+        gc.collect()
+        cached, cached_time = timed_start(path)
+        cache_size = os.path.getsize(cached.cache_path)
+        compiled_at_start = cached.generation.get_stats()['regexes_compiled']
+
+        print(f"Ruleset: {len(cold.signatures)} signatures, cache file {cache_size / 1024:.0f} KiB")
+        print(f"cold start:            {cold_time * 1000:8.0f} ms")
+        print(f"cold start + write:    {write_time * 1000:8.0f} ms")
+        print(f"cached start:          {cached_time * 1000:8.0f} ms  ({cold_time / cached_time:.1f}x)")
+        print(f"cache: {cached.get_stats()['cache']}")
+
+        # Anything the cached start left uncompiled is compiled during this scan
+        (cold_scan, cached_scan), (expected, actual) = interleaved_scan(
+            [detector_for(cold), detector_for(cached)], packets)
+        stats = cached.generation.get_stats()
+        print(f"first {len(packets)} packets: cold {cold_scan * 1000:.0f} ms, cached {cached_scan * 1000:.0f} ms "
+              f"({compiled_at_start}/{stats['regexes']} regexes compiled at start, "
+              f"{stats['regexes_compiled'] - compiled_at_start} during the scan)")
+        cold_total = cold_time + cold_scan
+        cached_total = cached_time + cached_scan
+        print(f"end to end: cold {cold_total * 1000:.0f} ms, cached {cached_total * 1000:.0f} ms "
+              f"({cold_total / cached_total:.2f}x)")
+
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+        matched = sum(1 for result in expected if result)
+        print(f"Equivalence: {len(packets)} packets ({matched} with detections), {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
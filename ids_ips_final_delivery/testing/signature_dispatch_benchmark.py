@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Signature Dispatch Benchmark for IDS/IPS
+Checks the dispatch index against a full _matches_signature_criteria scan
+and compares the per-packet cost of both with a large rule set
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.signature_detector import (Signature, SignatureDatabase, SignatureDetector,
+                                                 LITERAL_PATTERN_TYPES)
+from detection_engine.signature_index import packet_direction
+
+PROTOCOLS = ['TCP', 'UDP', 'ICMP', None]
+COMMON_PORTS = [21, 22, 25, 53, 80, 110, 143, 443, 445, 3306, 3389, 8080]
+
+
+def make_signatures(count: int, rng: random.Random):
+    """REGEX signatures with a realistic spread of protocols, ports and directions"""
+    signatures = []
+    for i in range(count):
+        signatures.append(Signature(
+            id=f"BENCH_{i:05d}",
+            name=f"Benchmark rule {i}",
+            description="",
+            severity="LOW",
+            category="TEST",
+            pattern=f"bench{i}x",
+            pattern_type="REGEX",
+            protocol=rng.choice(PROTOCOLS),
+            dst_port=rng.choice(COMMON_PORTS + [rng.randint(1, 65535)]) if rng.random() < 0.8 else None,
+            src_port=rng.choice(COMMON_PORTS) if rng.random() < 0.05 else None,
+            direction=rng.choice(["ANY", "ANY", "INBOUND", "OUTBOUND"]),
+            enabled=rng.random() < 0.95
+        ))
+    return signatures
+
+
+def make_packets(count: int, rng: random.Random):
+    packets = []
+    for _ in range(count):
+        packet = PacketInfo(
+            timestamp=0.0,
+            src_ip="10.0.0.1",
+            dst_ip="10.0.0.2",
+            src_port=rng.choice(COMMON_PORTS + [rng.randint(1024, 65535)] * 4),
+            dst_port=rng.choice(COMMON_PORTS + [rng.randint(1, 65535)]),
+            protocol=rng.choice(['TCP', 'UDP', 'ICMP']),
+            packet_size=100,
+            flags=None,
+            payload_size=0
+        )
+        packets.append(packet)
+    return packets
+
+
+def full_scan(detector: SignatureDetector, signatures, packet_info):
+    """The pre-index candidate selection: every enabled signature through the criteria check"""
+    return [sig for sig in signatures
+            if sig.enabled and detector._matches_signature_criteria(packet_info, sig)]
+
+
+def check(detector: SignatureDetector, signatures, packets) -> int:
+    index = detector.signature_db.get_dispatch_index()
+    failures = 0
+    for packet_info in packets:
+        expected = [sig.id for sig in full_scan(detector, signatures, packet_info)]
+        actual = [sig.id for sig in index.candidates(
+            packet_info.protocol, packet_info.src_port, packet_info.dst_port,
+            packet_direction(packet_info)) if sig.enabled]
+        if actual != expected:
+            failures += 1
+            if failures <= 3:
+                print(f"❌ {packet_info}: expected {len(expected)} candidates, got {len(actual)}")
+    print(f"Index check: {len(packets)} packets, {failures} mismatches")
+    return failures
+
+
+def benchmark(detector: SignatureDetector, signatures, packets):
+    index = detector.signature_db.get_dispatch_index()
+    candidates = 0
+
+    start = time.perf_counter()
+    for packet_info in packets:
+        full_scan(detector, signatures, packet_info)
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for packet_info in packets:
+        candidates += len(index.candidates(packet_info.protocol, packet_info.src_port,
+                                           packet_info.dst_port, packet_direction(packet_info)))
+    indexed = time.perf_counter() - start
+
+    print(f"Index: {index.get_stats()}, {candidates / len(packets):.0f} candidates/packet")
+    print(f"criteria scan:  {scan / len(packets) * 1e6:10.1f} µs/packet")
+    print(f"dispatch index: {indexed / len(packets) * 1e6:10.1f} µs/packet  ({scan / indexed:.0f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the signature dispatch index")
+    parser.add_argument('--signatures', type=int, default=10000)
+    parser.add_argument('--packets', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db = SignatureDatabase(str(Path(directory) / "signatures.json"))
+        db.add_signatures(make_signatures(args.signatures, rng))
+        detector = SignatureDetector(db)
+        signatures = [sig for sig in db.signatures.values()
+                      if sig.pattern_type not in LITERAL_PATTERN_TYPES]
+        packets = make_packets(args.packets, rng)
+
+        failures = check(detector, signatures, packets)
+        benchmark(detector, signatures, packets)
+    sys.exit(1 if failures else 0)
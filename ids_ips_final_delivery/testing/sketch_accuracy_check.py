@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Sketch Accuracy Check for IDS/IPS
+Measures the HyperLogLog's bias and spread at the counts the anomaly
+thresholds sit at and well beyond, the Count-Min sketch's over-count
+against its error bound, and the memory each tracked source takes in exact
+and sketch mode; then checks that sketch mode reports the port scans exact
+mode reports at the medium threshold
+"""
+
+import sys
+import random
+import logging
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.packet_sniffer import PacketInfo
+from detection_engine.anomaly_detector import AnomalyDetector
+from detection_engine.clock import EventClock
+from detection_engine.sketches import HyperLogLog, CountMinSketch
+
+START = 1_700_000_000.0
+failures = 0
+
+
+def expect(description: str, actual, expected):
+    global failures
+    if actual == expected:
+        print(f"ok  {description}")
+    else:
+        failures += 1
+        print(f"❌  {description}: got {actual!r}, expected {expected!r}")
+
+
+def check_hll(precision: int, trials: int, rng: random.Random):
+    relative_error = HyperLogLog(precision).relative_error
+    print(f"HyperLogLog, precision {precision} ({1 << precision} bytes, standard error {relative_error:.1%}):")
+    print(f"{'items':>8} {'mean':>10} {'bias':>8} {'spread':>8} {'min':>8} {'max':>8}")
+    for n in (10, 20, 25, 50, 100, 1000, 100000):
+        runs = trials if n <= 1000 else max(trials // 25, 5)
+        estimates = []
+        for _ in range(runs):
+            sketch = HyperLogLog(precision)
+            base = rng.getrandbits(48)
+            for item in range(n):
+                sketch.add(base + item)
+            estimates.append(sketch.count())
+        mean = statistics.fmean(estimates)
+        spread = statistics.pstdev(estimates) / n
+        print(f"{n:>8} {mean:>10.1f} {(mean - n) / n:>+8.1%} {spread:>8.1%} {min(estimates):>8} {max(estimates):>8}")
+        # A third of the standard error, plus three standard errors of the mean of these runs
+        tolerance = relative_error / 3 + 3 * spread / runs ** 0.5
+        expect(f"HLL mean bias at {n} items is within {tolerance:.1%}", abs(mean - n) / n <= tolerance, True)
+        expect(f"HLL spread at {n} items is within 1.5x the standard error", spread <= 1.5 * relative_error, True)
+
+
+def check_cms(width: int, depth: int, rng: random.Random):
+    sketch = CountMinSketch(width, depth)
+    counts = {}
+    for _ in range(200000):
+        key = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.1:{rng.randint(0, 3)}"
+        counts[key] = counts.get(key, 0) + 1
+        sketch.add(key)
+    over = [sketch.estimate(key) - count for key, count in counts.items()]
+    within = sum(1 for value in over if value <= sketch.error_bound) / len(over)
+    print(f"Count-Min, {width}x{depth} ({sketch.memory_bytes // 1024} KiB): {len(counts)} keys, "
+          f"{sketch.total} counted, error bound {sketch.error_bound:.0f}; over-count mean "
+          f"{statistics.fmean(over):.1f}, max {max(over)}, {within:.2%} within the bound")
+    expect("CMS never under-counts", min(over) >= 0, True)
+    expect(f"CMS over-count within its bound for at least {sketch.confidence:.1%} of keys",
+           within >= sketch.confidence, True)
+
+
+def syn(t: float, src_ip: str, dst_port: int) -> PacketInfo:
+    return PacketInfo(timestamp=START + t, src_ip=src_ip, dst_ip="10.0.1.1", src_port=40000,
+                      dst_port=dst_port, protocol="TCP", packet_size=60, flags="SYN", payload_size=0)
+
+
+def detector(mode: str) -> AnomalyDetector:
+    return AnomalyDetector(learning_period=0, tracking_mode=mode, clock=EventClock())
+
+
+def check_memory(sources: int, ports: int):
+    print(f"Memory per source ({ports} ports each):")
+    per_source = {}
+    for mode in ("exact", "sketch"):
+        engine = detector(mode)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for i in range(sources):
+            src_ip = f"10.{i >> 8 & 255}.{i & 255}.1"
+            for port in range(ports):
+                engine._check_port_scan_anomalies(syn(0, src_ip, 1 + port))
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        per_source[mode] = growth / sources
+        print(f"  {mode:<7} {per_source[mode]:8.0f} bytes")
+    expect("a sketch-mode source stays under 1 KiB", per_source['sketch'] < 1024, True)
+    expect(f"with {ports} ports a sketch-mode source is smaller than an exact one",
+           per_source['sketch'] < per_source['exact'], True)
+
+
+def detected_scans(mode: str, sources: int, ports: int, rng: random.Random) -> int:
+    """Sources with `ports` distinct SYN ports in a minute that raise a port scan"""
+    engine = detector(mode)
+    found = 0
+    for i in range(sources):
+        src_ip = f"10.{i >> 8 & 255}.{i & 255}.2"
+        targets = rng.sample(range(1, 65536), ports)
+        for n, port in enumerate(targets):
+            engine.analyze_packet(syn(i * 100 + n, src_ip, port))
+        # The first packet after the window closes evaluates it
+        anomalies = engine.analyze_packet(syn(i * 100 + 61, src_ip, targets[0]))
+        found += any(anomaly.anomaly_type == "PORT_SCAN" for anomaly in anomalies)
+    return found
+
+
+def check_threshold_parity(sources: int, rng: random.Random):
+    medium = detector("exact").thresholds['port_scan']['medium']
+    exact = detected_scans("exact", sources, medium, random.Random(rng.random()))
+    sketch = detected_scans("sketch", sources, medium, random.Random(rng.random()))
+    print(f"Port scans of exactly {medium} ports: exact mode reports {exact}/{sources}, sketch mode {sketch}/{sources}")
+    expect("exact mode reports every scan at the medium threshold", exact, sources)
+    expect("sketch mode reports at least 98% of them", sketch >= 0.98 * sources, True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check sketch accuracy and memory")
+    parser.add_argument('--trials', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    check_hll(8, args.trials, rng)
+    check_hll(12, args.trials // 5, rng)
+    check_cms(2048, 4, rng)
+    check_memory(2000, 200)
+    check_threshold_parity(args.trials, rng)
+    print(f"{failures} failures")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+SPSC Ring Benchmark for IDS/IPS
+Moves items from a producer thread to a consumer thread through queue.Queue
+and through SPSCRing (single and bulk operations), checking that every item
+arrives once and in order
+"""
+
+import sys
+import time
+import argparse
+import threading
+from queue import Queue, Full
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from packet_capture.spsc_ring import SPSCRing
+
+
+def run_single(channel, items: int) -> float:
+    """Blocking put/get one item at a time (the pipeline's current usage)"""
+    received = []
+
+    def consume():
+        get = channel.get
+        append = received.append
+        for _ in range(items):
+            append(get())
+
+    consumer = threading.Thread(target=consume)
+    start = time.perf_counter()
+    consumer.start()
+    put = channel.put
+    for i in range(items):
+        put(i)
+    consumer.join()
+    elapsed = time.perf_counter() - start
+
+    assert received == list(range(items)), "items lost or reordered"
+    return elapsed
+
+
+def run_bulk(ring: SPSCRing, items: int, chunk: int) -> float:
+    """put_many/get_many in chunks, retrying whatever did not fit"""
+    received = []
+
+    def consume():
+        while len(received) < items:
+            received.extend(ring.get_many(chunk, timeout=1))
+
+    consumer = threading.Thread(target=consume)
+    start = time.perf_counter()
+    consumer.start()
+    for base in range(0, items, chunk):
+        pending = list(range(base, min(base + chunk, items)))
+        while pending:
+            accepted = ring.put_many(pending)
+            pending = pending[accepted:]
+            if pending:
+                time.sleep(0)
+    consumer.join()
+    elapsed = time.perf_counter() - start
+
+    assert received == list(range(items)), "items lost or reordered"
+    return elapsed
+
+
+def check_drops(maxsize: int) -> bool:
+    """Fill a ring past capacity and check the drop and high-water counters"""
+    ring = SPSCRing(maxsize)
+    for i in range(maxsize + 10):
+        try:
+            ring.put_nowait(i)
+        except Full:
+            pass
+    overflow = ring.put_many(range(5))
+    ring.get_many(maxsize)
+    stats = ring.get_stats()
+
+    ok = (stats['dropped'] == 15 and overflow == 0 and stats['high_watermark'] == maxsize
+          and stats['size'] == 0 and stats['enqueued'] == maxsize)
+    print(f"Counter check: {stats} {'✅' if ok else '❌'}")
+    return ok
+
+
+def report(name: str, items: int, elapsed: float, baseline: float = None):
+    line = f"{name:<22} {items / elapsed:>12,.0f} items/s ({elapsed:.2f} s)"
+    if baseline:
+        line += f"  {baseline / elapsed:.1f}x"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SPSCRing against queue.Queue")
+    parser.add_argument('--items', type=int, default=1_000_000,
+                        help="Number of items passed from producer to consumer")
+    parser.add_argument('--maxsize', type=int, default=10000,
+                        help="Queue/ring capacity")
+    parser.add_argument('--chunk', type=int, default=256,
+                        help="Chunk size for the bulk run")
+    args = parser.parse_args()
+
+    ok = check_drops(args.maxsize)
+
+    queue_elapsed = run_single(Queue(maxsize=args.maxsize), args.items)
+    report("queue.Queue", args.items, queue_elapsed)
+    report("SPSCRing put/get", args.items, run_single(SPSCRing(args.maxsize), args.items), queue_elapsed)
+    report("SPSCRing bulk", args.items, run_bulk(SPSCRing(args.maxsize), args.items, args.chunk),
+           queue_elapsed)
+
+    sys.exit(0 if ok else 1)